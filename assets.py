@@ -0,0 +1,112 @@
+from typing import Dict, Optional
+import hashlib
+import mimetypes
+import os
+import re
+from fastapi import Request
+from fastapi.responses import Response
+from jinja2 import FileSystemLoader
+from response_cache import CachedBody, choose_encoding, etag_matches
+from jsonlog import log
+
+STATIC_DIR = "static"
+STATIC_PREFIX = "/static/"
+ASSET_PREFIX = "/assets/"
+
+# Files whose references to other static files are rewritten and which are worth compressing
+TEXT_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+REWRITE_EXTENSIONS = {".css", ".js"}
+
+STATIC_REFERENCE = re.compile(r"/static/[A-Za-z0-9_.\-/]+")
+
+# Fingerprinted names change whenever the content does, so browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StaticAssets:
+    """Content-hashed, precompressed copies of the static files, built in memory at startup.
+
+    Every file under static/ is served from /assets/ with a hash of its
+    content in the name, e.g. /static/js/home.js becomes
+    /assets/js/home.1a2b3c4d5e.js. References to static files in templates,
+    CSS and JS are rewritten to the hashed names.
+    """
+
+    def __init__(self, static_dir: str = STATIC_DIR):
+        self.static_dir = static_dir
+        # /static/... URL -> /assets/... URL
+        self.manifest: Dict[str, str] = {}
+        # path under /assets/ -> body with compressed variants
+        self.files: Dict[str, CachedBody] = {}
+
+    def build(self) -> None:
+        manifest: Dict[str, str] = {}
+        files: Dict[str, CachedBody] = {}
+        paths = []
+        for root, _, names in os.walk(self.static_dir):
+            for name in names:
+                paths.append(os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, "/"))
+
+        # Files that can reference others (CSS, JS) go last so they see the final names
+        paths.sort(key=lambda path: (os.path.splitext(path)[1] in REWRITE_EXTENSIONS, path))
+        for path in paths:
+            with open(os.path.join(self.static_dir, path), 'rb') as f:
+                content = f.read()
+
+            base, extension = os.path.splitext(path)
+            if extension in REWRITE_EXTENSIONS:
+                content = rewrite_references(content.decode("utf-8"), manifest).encode("utf-8")
+
+            digest = hashlib.blake2b(content, digest_size=5).hexdigest()
+            hashed_path = f"{base}.{digest}{extension}"
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            files[hashed_path] = CachedBody(
+                content,
+                media_type,
+                f'"{digest}"',
+                compress=extension in TEXT_EXTENSIONS
+            )
+            manifest[STATIC_PREFIX + path] = ASSET_PREFIX + hashed_path
+
+        self.manifest = manifest
+        self.files = files
+        log.info("assets_built", files=len(files))
+
+    def url(self, static_url: str) -> str:
+        """Return the fingerprinted URL for a /static/ URL, or the URL itself if it is unknown."""
+        return self.manifest.get(static_url, static_url)
+
+    def response(self, request: Request, path: str) -> Optional[Response]:
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+
+        headers = {"ETag": entry.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if etag_matches(request, entry.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = entry.body
+        encoding = choose_encoding(request, entry)
+        if encoding is not None:
+            body = entry.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=entry.media_type, headers=headers)
+
+
+def rewrite_references(text: str, manifest: Dict[str, str]) -> str:
+    return STATIC_REFERENCE.sub(lambda match: manifest.get(match.group(0), match.group(0)), text)
+
+
+class AssetTemplateLoader(FileSystemLoader):
+    """Template loader that points /static/ references at the fingerprinted assets."""
+
+    def __init__(self, searchpath: str, assets: StaticAssets):
+        super().__init__(searchpath)
+        self.assets = assets
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return rewrite_references(source, self.assets.manifest), filename, uptodate
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,53 @@
+from typing import List, Optional
+import time
+from probes import run_probe
+
+# Reference targets are probed with a plain TCP connect: it needs working DNS
+# and routing but nothing from the target beyond accepting the connection.
+CANARY_PROBE = "tcp"
+CANARY_TIMEOUT = 3
+
+# Used when the config does not set canary_targets: public anycast resolvers
+# that also accept connections on 443. An empty list turns the check off.
+DEFAULT_CANARY_TARGETS = ["1.1.1.1:443", "8.8.8.8:443", "9.9.9.9:443"]
+
+# How long a successful check is trusted before failing sites trigger another,
+# and how often the targets are retried while the runner is offline
+CANARY_RECHECK_SECONDS = 5
+
+
+class ConnectivityCanary:
+    """
+    Tells a failure of the monitored sites apart from the runner host losing its
+    own network. The reference targets are only probed when a site is unreachable,
+    so a healthy runner does not send them any traffic.
+    """
+
+    def __init__(self, recheck_interval: float = CANARY_RECHECK_SECONDS):
+        self.recheck_interval = recheck_interval
+        self.online = True
+        self.checked_at = 0.0
+        # When connectivity was lost, and when it last came back
+        self.lost_at: Optional[float] = None
+        self.restored_at = 0.0
+
+    def check(self, targets: List[str], timeout: float = CANARY_TIMEOUT, force: bool = False) -> bool:
+        """
+        Return True if any reference target is reachable. Without targets the
+        check is disabled and always passes.
+        """
+        now = time.time()
+        if not targets:
+            online = True
+        elif not force and self.online and now - self.checked_at < self.recheck_interval:
+            return True
+        else:
+            self.checked_at = now
+            online = any(run_probe(CANARY_PROBE, target, timeout).reachable for target in targets)
+
+        if online and not self.online:
+            self.restored_at = now
+        elif not online and self.online:
+            self.lost_at = now
+        self.online = online
+        return online
@@ -0,0 +1,245 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models.models as models
+from jsonlog import log
+
+# Column holding the time spent in each status
+STATUS_COLUMNS = {
+    "up": "up_seconds",
+    "slow": "slow_seconds",
+    "down": "down_seconds",
+    "token_alert": "token_alert_seconds",
+    "unknown": "unknown_seconds",
+}
+
+# Statuses in which the site is serving, they count towards availability
+OPERATING_STATUSES = ("up", "slow", "token_alert")
+
+COUNTER_COLUMNS = list(STATUS_COLUMNS.values()) + ["incidents", "recoveries", "repair_seconds"]
+
+# Sites per query when rebuilding or summing a selection of sites
+SITE_CHUNK = 500
+
+# (site_id, day) -> column -> amount to add
+Increments = Dict[Tuple[str, str], Dict[str, float]]
+
+
+def day_of(timestamp: float) -> str:
+    return date.fromtimestamp(timestamp).isoformat()
+
+
+def split_by_day(start: float, end: float) -> Iterator[Tuple[str, float]]:
+    """Split the period from start to end (epoch seconds) at local midnights into (day, seconds)."""
+    while start < end:
+        day = date.fromtimestamp(start)
+        next_midnight = datetime.combine(day + timedelta(days=1), time()).timestamp()
+        chunk_end = min(end, next_midnight)
+        yield day.isoformat(), chunk_end - start
+        start = chunk_end
+
+
+def add_increment(increments: Increments, site_id: str, day: str, column: str, amount: float) -> None:
+    counters = increments.setdefault((site_id, day), {})
+    counters[column] = counters.get(column, 0) + amount
+
+
+def merge_increments(target: Increments, source: Increments) -> None:
+    for (site_id, day), counters in source.items():
+        for column, amount in counters.items():
+            add_increment(target, site_id, day, column, amount)
+
+
+def period_increments(
+    site_id: str,
+    status: str,
+    start: float,
+    end: float,
+    next_status: Optional[str] = None,
+    increments: Optional[Increments] = None
+) -> Increments:
+    """Counters for a period spent in status, ended by a change to next_status.
+
+    Without next_status the period is still running and only its time is
+    counted. Going down counts an incident and coming back up counts a
+    recovery with the length of the outage, both on the day of the change.
+    """
+    if increments is None:
+        increments = {}
+    column = STATUS_COLUMNS.get(status, "unknown_seconds")
+    for day, seconds in split_by_day(start, end):
+        add_increment(increments, site_id, day, column, seconds)
+
+    if next_status is not None and next_status != status:
+        change_day = day_of(end)
+        if next_status == "down":
+            add_increment(increments, site_id, change_day, "incidents", 1)
+        if status == "down":
+            add_increment(increments, site_id, change_day, "recoveries", 1)
+            add_increment(increments, site_id, change_day, "repair_seconds", end - start)
+    return increments
+
+
+def write_increments(db: Session, increments: Increments) -> None:
+    """Add the counters to the stored daily rows, creating missing ones. The caller commits."""
+    if not increments:
+        return
+    rows = []
+    for (site_id, day), counters in increments.items():
+        row = {"site_id": site_id, "day": day}
+        for column in COUNTER_COLUMNS:
+            row[column] = counters.get(column, 0)
+        rows.append(row)
+
+    table = models.SiteDailyStats.__table__
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=["site_id", "day"],
+        set_={column: table.c[column] + statement.excluded[column] for column in COUNTER_COLUMNS}
+    )
+    db.execute(statement, rows)
+
+
+def chunked(values: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every daily row from the status history and return the number of rows written.
+
+    Each site's newest log row is its running period, which the runner
+    counts once it ends, so only its status change is counted here. Run it
+    while the runner is stopped, it replaces what the runner has added.
+    """
+    log = models.RunnerSiteLog
+    site_ids = list(db.execute(select(log.site_id).where(log.site_id.isnot(None)).distinct()).scalars())
+    db.execute(delete(models.SiteDailyStats))
+
+    written = 0
+    for chunk in chunked(site_ids, SITE_CHUNK):
+        rows = db.execute(
+            select(log.site_id, log.status, log.created_at)
+            .where(log.site_id.in_(chunk))
+            .order_by(log.site_id, log.created_at)
+        ).all()
+
+        increments: Increments = {}
+        for current, following in zip(rows, rows[1:]):
+            if current.site_id != following.site_id:
+                continue
+            period_increments(
+                current.site_id,
+                current.status,
+                current.created_at.timestamp(),
+                following.created_at.timestamp(),
+                following.status,
+                increments
+            )
+        write_increments(db, increments)
+        written += len(increments)
+
+    db.commit()
+    return written
+
+
+def is_empty(db: Session) -> bool:
+    return db.execute(select(models.SiteDailyStats.site_id).limit(1)).first() is None
+
+
+def load_totals(
+    db: Session,
+    start_day: str,
+    end_day: str,
+    site_id: Optional[str] = None,
+    site_ids: Optional[List[str]] = None
+) -> Dict[Any, Dict[str, float]]:
+    """Sum the daily rows from start_day to end_day (inclusive).
+
+    Totals are per site, of every site or only of site_ids, or per day when
+    site_id is given.
+    """
+    stats = models.SiteDailyStats
+    key = stats.day if site_id is not None else stats.site_id
+    query = select(key, *[func.sum(getattr(stats, column)) for column in COUNTER_COLUMNS]).where(
+        stats.day >= start_day,
+        stats.day <= end_day
+    )
+    if site_id is not None:
+        query = query.where(stats.site_id == site_id)
+
+    if site_ids is None:
+        queries = [query]
+    else:
+        queries = [query.where(stats.site_id.in_(chunk)) for chunk in chunked(site_ids, SITE_CHUNK)]
+
+    totals = {}
+    for chunk_query in queries:
+        for row in db.execute(chunk_query.group_by(key)):
+            totals[row[0]] = dict(zip(COUNTER_COLUMNS, row[1:]))
+    return totals
+
+
+def add_running_periods(
+    totals: Dict[Any, Dict[str, float]],
+    states: Iterable[Dict[str, Any]],
+    start_day: str,
+    end_day: str,
+    by_day: bool = False
+) -> None:
+    """Add the time each site has spent in its current status so far, from the runner snapshot."""
+    for state in states:
+        running = period_increments(state["site_id"], state["status"], state["created_at"], state["last_scan_time"])
+        for (site_id, day), counters in running.items():
+            if not start_day <= day <= end_day:
+                continue
+            target = totals.setdefault(day if by_day else site_id, {})
+            for column, amount in counters.items():
+                target[column] = (target.get(column) or 0) + amount
+
+
+def summarize(counters: Dict[str, float]) -> Dict[str, Any]:
+    """Availability, MTTR and MTBF from summed counters.
+
+    Availability is the share of time spent serving out of the time the
+    site's status was known. MTTR is the mean length of the outages that
+    ended, MTBF the serving time per incident.
+    """
+    seconds = {status: counters.get(column) or 0 for status, column in STATUS_COLUMNS.items()}
+    operating = sum(seconds[status] for status in OPERATING_STATUSES)
+    observed = operating + seconds["down"]
+    incidents = int(counters.get("incidents") or 0)
+    recoveries = int(counters.get("recoveries") or 0)
+    return {
+        "availability": round(operating / observed * 100, 4) if observed else None,
+        "incidents": incidents,
+        "recoveries": recoveries,
+        "mttr_seconds": round((counters.get("repair_seconds") or 0) / recoveries, 1) if recoveries else None,
+        "mtbf_seconds": round(operating / incidents, 1) if incidents else None,
+        "seconds": {status: round(value, 1) for status, value in seconds.items()},
+    }
+
+
+def backfill_if_empty() -> None:
+    """Build the daily rows from the existing history the first time the runner starts with them."""
+    db = SessionLocal()
+    try:
+        if is_empty(db):
+            written = rebuild(db)
+            if written:
+                log.info("daily_stats_backfilled", rows=written)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # Rebuild the daily rows from scratch, e.g. after history was edited
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild(db)} daily stats rows")
+    finally:
+        db.close()
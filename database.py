@@ -1,9 +1,113 @@
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+import asyncio
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+# Threads that run the web app's blocking database work. Each holds at most one
+# connection, so the engine's pool is sized to match and a thread never waits for one.
+DB_THREADS = 8
 
 SQLALCHEMY_DATA_URL = 'sqlite:///./data/simple_site_monitor.db'
-engine = create_engine(SQLALCHEMY_DATA_URL, connect_args={'check_same_thread': False})
+engine = create_engine(
+    SQLALCHEMY_DATA_URL,
+    connect_args={'check_same_thread': False},
+    pool_size=DB_THREADS,
+    max_overflow=DB_THREADS
+)
 SessionLocal = sessionmaker(autocommit=False,autoflush=False,bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+
+async def run_db(function, *args, **kwargs):
+    """Run blocking database work on the database threads, keeping the event loop free."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(function, *args, **kwargs))
+
+
+def offload(function):
+    """
+    Turn a blocking route function into a coroutine that runs it with run_db.
+    The wrapper keeps the function's signature, so FastAPI sees the same parameters.
+    Requests beyond DB_THREADS wait in the executor's queue instead of on the loop.
+    """
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await run_db(function, *args, **kwargs)
+    return wrapper
+
+
+def upgrade_schema():
+    """Add columns and indexes that were added to the models after their tables were created."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        # The heartbeat table only holds the latest ping per site and was first
+        # keyed by name, recreate it keyed by site ID (jobs simply ping again)
+        if inspector.has_table("heartbeat") and "site_id" not in {column["name"] for column in inspector.get_columns("heartbeat")}:
+            connection.execute(text("DROP TABLE heartbeat"))
+            Base.metadata.tables["heartbeat"].create(connection)
+            inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+    convert_log_ids()
+    number_webhooks_once()
+
+
+def rebuild_table(connection, name: str, id_expression: str = "id") -> None:
+    """
+    Recreate a table from its model and copy its rows over, with id_expression
+    as each row's new id. SQLite cannot change a column's type in place.
+    """
+    table = Base.metadata.tables[name]
+    columns = ", ".join(column.name for column in table.columns if column.name != "id")
+    connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_old")
+    # The indexes moved with the table and keep their names, which the new table needs
+    old_indexes = connection.exec_driver_sql(
+        f"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = '{name}_old' AND sql IS NOT NULL"
+    ).scalars().all()
+    for index_name in old_indexes:
+        connection.exec_driver_sql(f'DROP INDEX "{index_name}"')
+    table.create(connection)
+    connection.exec_driver_sql(f"INSERT INTO {name} (id, {columns}) SELECT {id_expression}, {columns} FROM {name}_old")
+    connection.exec_driver_sql(f"DROP TABLE {name}_old")
+
+
+def convert_log_ids():
+    """
+    Rebuild runner_run_log if its id column still has the UUID type it was
+    created with. That type gave the column NUMERIC affinity, so SQLite turned
+    the odd all-digit (or digits and one "e") hex ID into a number, losing it.
+    Those rows get a new ID, the others keep theirs as CHAR(32) text.
+    """
+    with engine.begin() as connection:
+        # Taken before checking, so the web app and the runner starting
+        # together convert the table once
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        id_type = connection.exec_driver_sql("SELECT type FROM pragma_table_info('runner_run_log') WHERE name = 'id'").scalar()
+        if id_type is None or id_type.upper() != "UUID":
+            return
+        rebuild_table(connection, "runner_run_log", "CASE WHEN typeof(id) = 'text' THEN id ELSE lower(hex(randomblob(16))) END")
+
+
+def number_webhooks_once():
+    """
+    Rebuild the webhook table with AUTOINCREMENT if it was created without.
+    Destinations are addressed by ID, and without it SQLite hands the ID of
+    the last deleted destination to the next one added.
+    """
+    with engine.begin() as connection:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        sql = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'webhook'").scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        rebuild_table(connection, "webhook")
@@ -0,0 +1,104 @@
+from typing import List, Sequence, Tuple
+from bisect import bisect_left, bisect_right
+
+DOWNSAMPLE_METHODS = ["lttb", "minmax"]
+
+# LTTB runs on min/max preselected candidates, this many per output point
+LTTB_CANDIDATE_RATIO = 4
+
+
+def bucket_bounds(count: int, buckets: int) -> List[int]:
+    """Split range(count) into buckets of (nearly) equal size, returning buckets + 1 boundaries."""
+    return [count * bucket // buckets for bucket in range(buckets + 1)]
+
+
+def minmax(
+    xs_low: Sequence,
+    ys_low: Sequence,
+    xs_high: Sequence,
+    ys_high: Sequence,
+    buckets: int
+) -> Tuple[List, List]:
+    """Keep the lowest and the highest point of every bucket of items, in x order.
+
+    Each item has a low and a high point: a raw sample is both, a rollup
+    block has its minimum and maximum. Buckets are slices, so the scanning
+    is done by min, max and index rather than a Python loop over the items.
+    """
+    count = len(xs_low)
+    xs: List = []
+    ys: List = []
+    bounds = bucket_bounds(count, max(1, min(buckets, count)))
+    for low, high in zip(bounds, bounds[1:]):
+        lows = ys_low[low:high]
+        highs = ys_high[low:high]
+        lowest = low + lows.index(min(lows))
+        highest = low + highs.index(max(highs))
+        bottom = (xs_low[lowest], ys_low[lowest])
+        top = (xs_high[highest], ys_high[highest])
+        for x, y in sorted({bottom, top}):
+            xs.append(x)
+            ys.append(y)
+    return xs, ys
+
+
+def lttb(xs: Sequence, ys: Sequence, points: int) -> Tuple[List, List]:
+    """Largest-Triangle-Three-Buckets: keep the points that best preserve the shape of the line.
+
+    The first and last points are always kept and every bucket in between
+    keeps the point forming the largest triangle with the point kept before
+    it and the average of the next bucket. points must be at least 3.
+    """
+    count = len(xs)
+    if count <= points:
+        return list(xs), list(ys)
+
+    bounds = [1 + bound for bound in bucket_bounds(count - 2, points - 2)]
+    selected = [0]
+    previous = 0
+    for bucket in range(points - 2):
+        low, high = bounds[bucket], bounds[bucket + 1]
+        # Average of the next bucket, or the last point for the final bucket
+        next_high = bounds[bucket + 2] if bucket + 2 < len(bounds) else count
+        average_x = sum(xs[high:next_high]) / (next_high - high)
+        average_y = sum(ys[high:next_high]) / (next_high - high)
+
+        ax, ay = xs[previous], ys[previous]
+        best_area = -1.0
+        best = low
+        for index in range(low, high):
+            area = abs((ax - average_x) * (ys[index] - ay) - (ax - xs[index]) * (average_y - ay))
+            if area > best_area:
+                best_area = area
+                best = index
+        selected.append(best)
+        previous = best
+    selected.append(count - 1)
+    return [xs[index] for index in selected], [ys[index] for index in selected]
+
+
+def worst_outcome(outcomes: bytes) -> int:
+    # Outcomes are ordered from best to worst, and a byte search beats max() on long runs
+    for outcome in (3, 2, 1):
+        if outcome in outcomes:
+            return outcome
+    return 0
+
+
+def span_outcomes(item_starts: Sequence, item_outcomes: bytes, xs: Sequence, start: float) -> List[int]:
+    """For each kept point, the worst outcome among the items it stands for.
+
+    A point stands for the items that start between it and the next kept
+    point (the first one from the start of the range), so an outage between
+    kept points still shows.
+    """
+    outcomes = []
+    for position, x in enumerate(xs):
+        low = bisect_left(item_starts, start if position == 0 else x)
+        high = bisect_left(item_starts, xs[position + 1]) if position + 1 < len(xs) else len(item_starts)
+        if low >= high:
+            # No item starts here, use the one the point falls in
+            low = max(0, bisect_right(item_starts, x) - 1)
+            high = low + 1
+        outcomes.append(worst_outcome(item_outcomes[low:high]))
+    return outcomes
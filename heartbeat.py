@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import threading
+import time
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from database import SessionLocal, run_db
+import models.models as models
+from probes import HEARTBEAT_PROBE
+from jsonlog import log
+
+HEARTBEAT_STATUSES = ["up", "down"]
+
+
+class HeartbeatBuffer:
+    """Collects pings in memory on the web side and writes them in batches.
+
+    Repeated pings for the same site between flushes collapse into a single
+    row update, so ingest cost does not depend on how often jobs check in.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = 1.0):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        # site ID -> [last ping time, reported status, pings since last flush]
+        self.pending: Dict[str, List] = {}
+        # Pings arrive on the database threads while the flush runs on the event loop
+        self.lock = threading.Lock()
+
+    def ping(self, site_id: str, status: str = "up") -> None:
+        with self.lock:
+            entry = self.pending.get(site_id)
+            if entry is None:
+                self.pending[site_id] = [time.time(), status, 1]
+            else:
+                entry[0] = time.time()
+                entry[1] = status
+                entry[2] += 1
+
+    def take(self) -> Dict[str, List]:
+        """Swap out the pending pings so new ones can be buffered while writing."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def write(self, pending: Dict[str, List]) -> None:
+        if not pending:
+            return
+
+        rows = [
+            {
+                "site_id": site_id,
+                "status": status,
+                "last_ping": datetime.fromtimestamp(last_ping),
+                "ping_count": count,
+            }
+            for site_id, (last_ping, status, count) in pending.items()
+        ]
+        # Evaluated inside the insert, under the write lock, so a later commit
+        # always gets a higher seq
+        next_seq = select(func.coalesce(func.max(models.Heartbeat.seq), 0) + 1).scalar_subquery()
+        statement = insert(models.Heartbeat).values(seq=next_seq)
+        statement = statement.on_conflict_do_update(
+            index_elements=[models.Heartbeat.site_id],
+            set_={
+                "status": statement.excluded.status,
+                "last_ping": statement.excluded.last_ping,
+                "ping_count": models.Heartbeat.ping_count + statement.excluded.ping_count,
+                "seq": statement.excluded.seq,
+            }
+        )
+
+        db = self.session_factory()
+        try:
+            db.execute(statement, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.error("heartbeat_write_failed", error=str(e))
+        finally:
+            db.close()
+
+    def flush(self) -> None:
+        self.write(self.take())
+
+    async def run(self) -> None:
+        """Flush buffered pings every flush_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await run_db(self.write, self.take())
+
+
+class HeartbeatTracker:
+    """Runner-side view of the latest ping for each heartbeat site.
+
+    Only rows written since the previous refresh are read, using the index
+    on seq. The first refresh reads every row.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.pings: Dict[str, Tuple[float, str]] = {}
+        self.cursor: Optional[int] = None
+
+    def refresh(self) -> None:
+        db = self.session_factory()
+        try:
+            query = db.query(
+                models.Heartbeat.site_id,
+                models.Heartbeat.status,
+                models.Heartbeat.last_ping,
+                models.Heartbeat.seq
+            )
+            if self.cursor is not None:
+                query = query.filter(models.Heartbeat.seq > self.cursor)
+
+            cursor = self.cursor or 0
+            for site_id, status, last_ping, seq in query:
+                self.pings[site_id] = (last_ping.timestamp(), status)
+                # Rows from before the seq column have none, and are only read by the first refresh
+                cursor = max(cursor, seq or 0)
+            self.cursor = cursor
+        except Exception as e:
+            log.error("heartbeat_read_failed", error=str(e))
+        finally:
+            db.close()
+
+
+heartbeat_buffer = HeartbeatBuffer()
@@ -0,0 +1,319 @@
+from typing import Any, Dict, Iterator, List, Optional, Set
+from array import array
+from datetime import datetime, timedelta
+import csv
+import heapq
+import io
+import itertools
+import json
+import struct
+import sys
+import uuid
+from sqlalchemy import and_, or_, select, tuple_
+from database import SessionLocal
+from models.models import RunnerSiteLog
+from registry import SiteRegistry
+
+EXPORT_FORMATS = ["csv", "ndjson", "columnar"]
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/octet-stream",
+}
+EXPORT_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "columnar": "ssmc"}
+
+# Rows read per query. Each batch is its own short read, resumed after the
+# last (created_at, id) seen, so a long export never holds SQLite's read lock
+# against the runner's writer and memory stays flat whatever the row count.
+EXPORT_BATCH_ROWS = 5000
+
+# Sites per query when a tag filter selects many, each ID and name is a bound
+# parameter and SQLite limits how many one query can have (999 on older builds).
+# The queries are read side by side and their rows merged, each reading at
+# least MIN_QUERY_BATCH_ROWS at a time.
+EXPORT_SITE_CHUNK = 400
+MIN_QUERY_BATCH_ROWS = 200
+
+# Dashboard names for statuses, accepted in the status filter
+STATUS_ALIASES = {"healthy": "up", "expiring": "token_alert", "pending": "unknown"}
+
+EXPORT_COLUMNS = [
+    ("id", "uuid"),
+    ("site_id", "dict"),
+    ("name", "dict"),
+    ("status", "dict"),
+    ("response_time", "float64"),
+    ("attempt_count", "int32"),
+    ("created_at", "timestamp_us"),
+    ("last_scan_time", "timestamp_us"),
+    ("ssl_days_remaining", "int32"),
+]
+
+# Columnar format: "SSMC", u16 version, u32 header length, JSON header, then
+# row groups of u32 row count followed by one u32 length-prefixed chunk per
+# column. A row count of 0 ends the file. All numbers are little-endian.
+COLUMNAR_MAGIC = b"SSMC"
+COLUMNAR_VERSION = 1
+NULL_INT32 = -2 ** 31
+NULL_INDEX = 0xFFFFFFFF
+
+
+def parse_time(value: str, end_of_day: bool = False) -> datetime:
+    """Parse an ISO date, ISO datetime or epoch seconds into a naive local datetime like the stored ones."""
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    try:
+        if seconds is not None:
+            return datetime.fromtimestamp(seconds)
+
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        # A bare date as the end of a range includes that whole day
+        if end_of_day and len(value) == 10:
+            parsed += timedelta(days=1)
+        return parsed
+    except (OverflowError, OSError):
+        # inf, 1e300 or the last representable day: valid numbers, but no datetime
+        raise ValueError(f"time out of range: {value}")
+
+
+def split_values(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def build_filters(
+    registry: SiteRegistry,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    sites: Optional[str] = None,
+    tags: Optional[str] = None,
+    statuses: Optional[str] = None
+) -> List[List[Any]]:
+    """Turn the export query parameters into the SQL conditions of each query to run.
+
+    A row matches a time range when the period it covers overlaps it. Sites
+    are given by ID or name, tags is a tag expression, statuses match any
+    of the listed values, and the different filters are combined with AND.
+    A tag filter selecting more than EXPORT_SITE_CHUNK sites gives one query
+    per chunk of them, otherwise there is a single query.
+    Raises ValueError for unparseable times or tag expressions.
+    """
+    conditions = []
+    if start:
+        conditions.append(RunnerSiteLog.last_scan_time >= parse_time(start))
+    if end:
+        conditions.append(RunnerSiteLog.created_at < parse_time(end, end_of_day=True))
+
+    site_keys = split_values(sites)
+    if site_keys:
+        # Keys that are not configured sites any more still match old rows by ID or name
+        site_ids: Set[str] = set(site_keys)
+        names: Set[str] = set(site_keys)
+        for key in site_keys:
+            site = registry.resolve(key)
+            if site is not None:
+                site_ids.add(site["id"])
+                names.add(site["name"])
+        conditions.append(or_(RunnerSiteLog.site_id.in_(site_ids), RunnerSiteLog.name.in_(names)))
+
+    status_names = [STATUS_ALIASES.get(status.lower(), status.lower()) for status in split_values(statuses)]
+    if status_names:
+        conditions.append(RunnerSiteLog.status.in_(status_names))
+
+    if tags and tags.strip():
+        selected = registry.select(tags)
+        return [
+            conditions + [site_condition(selected[start:start + EXPORT_SITE_CHUNK])]
+            for start in range(0, max(len(selected), 1), EXPORT_SITE_CHUNK)
+        ]
+    return [conditions]
+
+
+def site_condition(sites: List[Dict[str, Any]]) -> Any:
+    """Rows of the given sites: by ID, or by name for rows written before logs had a site ID."""
+    return or_(
+        RunnerSiteLog.site_id.in_([site["id"] for site in sites]),
+        and_(RunnerSiteLog.site_id.is_(None), RunnerSiteLog.name.in_([site["name"] for site in sites]))
+    )
+
+
+def iter_batches(queries: List[List[Any]], session_factory=SessionLocal, batch_size: int = EXPORT_BATCH_ROWS) -> Iterator[List[Any]]:
+    """Yield the rows matching any of the queries oldest first, batch_size rows at a time."""
+    if len(queries) == 1:
+        yield from query_batches(queries[0], session_factory, batch_size)
+        return
+
+    # The queries select different sites, so merging their ordered rows gives each row once
+    query_batch_size = max(batch_size // len(queries), MIN_QUERY_BATCH_ROWS)
+    rows = heapq.merge(
+        *(itertools.chain.from_iterable(query_batches(conditions, session_factory, query_batch_size)) for conditions in queries),
+        key=export_order
+    )
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_order(row: Any) -> Any:
+    """The (created_at, id) order rows are read in, IDs being stored as hex text."""
+    return (row[6], row[0].hex)
+
+
+def query_batches(conditions: List[Any], session_factory=SessionLocal, batch_size: int = EXPORT_BATCH_ROWS) -> Iterator[List[Any]]:
+    """Yield the rows matching one query oldest first, batch_size rows at a time."""
+    columns = [getattr(RunnerSiteLog, name) for name, _ in EXPORT_COLUMNS]
+    last_key = None
+    while True:
+        query = select(*columns).where(*conditions)
+        if last_key is not None:
+            query = query.where(tuple_(RunnerSiteLog.created_at, RunnerSiteLog.id) > tuple_(*last_key))
+        query = query.order_by(RunnerSiteLog.created_at, RunnerSiteLog.id).limit(batch_size)
+
+        db = session_factory()
+        try:
+            rows = db.execute(query).all()
+        finally:
+            db.close()
+
+        if not rows:
+            return
+        last_key = (rows[-1].created_at, rows[-1].id)
+        yield [tuple(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def format_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def export_csv(batches: Iterator[List[Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for rows in batches:
+        for row in rows:
+            writer.writerow(["" if value is None else format_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(batches: Iterator[List[Any]]) -> Iterator[str]:
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, map(format_value, row))), separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+
+def little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_column(column_type: str, values: List[Any]) -> bytes:
+    if column_type == "uuid":
+        # Unreadable IDs are written as the nil UUID
+        return b"".join(b"\0" * 16 if value is None else value.bytes for value in values)
+    if column_type == "float64":
+        return little_endian(array("d", values))
+    if column_type == "int32":
+        return little_endian(array("i", [NULL_INT32 if value is None else value for value in values]))
+    if column_type == "timestamp_us":
+        return little_endian(array("q", [int(value.timestamp() * 1_000_000) for value in values]))
+
+    # dict: the distinct strings of this row group, then one index per row
+    dictionary: Dict[str, int] = {}
+    indexes = array("I", [
+        NULL_INDEX if value is None else dictionary.setdefault(value, len(dictionary))
+        for value in values
+    ])
+    parts = [struct.pack("<I", len(dictionary))]
+    for value in dictionary:
+        encoded = value.encode("utf-8")
+        parts.append(struct.pack("<H", len(encoded)))
+        parts.append(encoded)
+    parts.append(little_endian(indexes))
+    return b"".join(parts)
+
+
+def export_columnar(batches: Iterator[List[Any]]) -> Iterator[bytes]:
+    """Yield the columnar format, one row group per batch."""
+    header = json.dumps({
+        "columns": [{"name": name, "type": column_type} for name, column_type in EXPORT_COLUMNS],
+        "null_int32": NULL_INT32,
+        "null_index": NULL_INDEX,
+    }).encode("utf-8")
+    yield COLUMNAR_MAGIC + struct.pack("<HI", COLUMNAR_VERSION, len(header)) + header
+
+    for rows in batches:
+        parts = [struct.pack("<I", len(rows))]
+        for position, (_, column_type) in enumerate(EXPORT_COLUMNS):
+            chunk = encode_column(column_type, [row[position] for row in rows])
+            parts.append(struct.pack("<I", len(chunk)))
+            parts.append(chunk)
+        yield b"".join(parts)
+    yield struct.pack("<I", 0)
+
+
+def decode_column(column_type: str, data: bytes, row_count: int) -> List[Any]:
+    if column_type == "uuid":
+        return [uuid.UUID(bytes=data[offset:offset + 16]) for offset in range(0, row_count * 16, 16)]
+    if column_type in ("float64", "int32", "timestamp_us"):
+        values = array({"float64": "d", "int32": "i", "timestamp_us": "q"}[column_type])
+        values.frombytes(data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        if column_type == "int32":
+            return [None if value == NULL_INT32 else value for value in values]
+        if column_type == "timestamp_us":
+            return [datetime.fromtimestamp(value / 1_000_000) for value in values]
+        return values.tolist()
+
+    (size,) = struct.unpack_from("<I", data, 0)
+    offset = 4
+    dictionary = []
+    for _ in range(size):
+        (length,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        dictionary.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    indexes = array("I")
+    indexes.frombytes(data[offset:])
+    if sys.byteorder == "big":
+        indexes.byteswap()
+    return [None if index == NULL_INDEX else dictionary[index] for index in indexes]
+
+
+def read_columnar(stream) -> Iterator[Dict[str, List[Any]]]:
+    """Read a columnar export from a binary file object, yielding each row group as column lists."""
+    if stream.read(4) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar history export")
+    _, header_length = struct.unpack("<HI", stream.read(6))
+    columns = json.loads(stream.read(header_length))["columns"]
+
+    while True:
+        (row_count,) = struct.unpack("<I", stream.read(4))
+        if row_count == 0:
+            return
+        group = {}
+        for column in columns:
+            (length,) = struct.unpack("<I", stream.read(4))
+            group[column["name"]] = decode_column(column["type"], stream.read(length), row_count)
+        yield group
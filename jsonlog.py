@@ -0,0 +1,182 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, TextIO, Tuple
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+DEFAULT_LEVEL = "info"
+
+# Lines waiting for the writer thread. If it falls behind, new lines are
+# dropped (and counted in a later "log_dropped" line) instead of blocking
+LOG_QUEUE_SIZE = 10000
+# Lines joined into one write at most
+WRITE_BATCH = 500
+CLOSE_TIMEOUT = 5
+
+# How often periodic summaries are logged
+SUMMARY_SECONDS = 60
+
+LogRecord = Tuple[float, str, str, Dict[str, Any]]
+
+
+def parse_sample_rates(text: str) -> Dict[str, int]:
+    """Parse "event=N,event=N" into the number of events of each kind that one logged line stands for."""
+    rates = {}
+    for part in text.split(","):
+        event, _, rate = part.partition("=")
+        if event.strip() and rate.strip().isdigit() and int(rate) > 1:
+            rates[event.strip()] = int(rate)
+    return rates
+
+
+class JsonLogger:
+    """
+    Writes one JSON object per line from a background thread. Logging only
+    checks the level and sampling and queues the record, so it never waits
+    for the output. The level comes from LOG_LEVEL and sampling from
+    LOG_SAMPLE (e.g. "scan=10" keeps every 10th scan line), both environment
+    variables.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        level: Optional[str] = None,
+        sample_rates: Optional[Dict[str, int]] = None,
+        max_queue: int = LOG_QUEUE_SIZE
+    ):
+        # None writes to whatever sys.stdout is at the time
+        self.stream = stream
+        self.level = LEVELS.get((level or os.environ.get("LOG_LEVEL") or DEFAULT_LEVEL).lower(), LEVELS[DEFAULT_LEVEL])
+        self.sample_rates = sample_rates if sample_rates is not None else parse_sample_rates(os.environ.get("LOG_SAMPLE", ""))
+        self.sample_counts: Dict[str, int] = {}
+        self.queue: "queue.Queue[Optional[LogRecord]]" = queue.Queue(max_queue)
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def log(self, level: str, event: str, **fields: Any) -> None:
+        if LEVELS[level] < self.level:
+            return
+        rate = self.sample_rates.get(event)
+        if rate:
+            # Counted under the lock, the runner, notifier and probe threads all log
+            with self.lock:
+                count = self.sample_counts.get(event, 0)
+                self.sample_counts[event] = count + 1
+            if count % rate:
+                return
+            fields["sampled"] = rate
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((time.time(), level, event, fields))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def debug(self, event: str, **fields: Any) -> None:
+        if self.level <= LEVELS["debug"]:
+            self.log("debug", event, **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        if self.level <= LEVELS["info"]:
+            self.log("info", event, **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        if self.level <= LEVELS["warning"]:
+            self.log("warning", event, **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        if self.level <= LEVELS["error"]:
+            self.log("error", event, **fields)
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    @staticmethod
+    def format(record: LogRecord) -> str:
+        timestamp, level, event, fields = record
+        line = {
+            "time": datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds"),
+            "level": level,
+            "event": event,
+            **fields
+        }
+        return json.dumps(line, default=str, separators=(",", ":")) + "\n"
+
+    def run(self) -> None:
+        while True:
+            records = [self.queue.get()]
+            while len(records) < WRITE_BATCH:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in records
+            lines = [self.format(record) for record in records if record is not None]
+            with self.lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(self.format((time.time(), "warning", "log_dropped", {"count": dropped})))
+            if lines:
+                stream = self.stream or sys.stdout
+                try:
+                    stream.write("".join(lines))
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            if stop:
+                return
+
+    def close(self) -> None:
+        """Write out the queued lines and stop the writer."""
+        thread = self.thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=CLOSE_TIMEOUT)
+        except queue.Full:
+            return
+        thread.join(CLOSE_TIMEOUT)
+
+
+class PeriodicSummary:
+    """Adds up counters and logs them as a single line once per interval, in place of a line per occurrence."""
+
+    def __init__(self, logger: JsonLogger, event: str, interval: float = SUMMARY_SECONDS):
+        self.logger = logger
+        self.event = event
+        self.interval = interval
+        self.counts: Dict[str, float] = {}
+        self.started_at = time.time()
+
+    def add(self, **counts: float) -> None:
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def flush(self, force: bool = False, **fields: Any) -> None:
+        """Log the counters if the interval has passed (or force is set), along with fields describing the current state."""
+        now = time.time()
+        if not force and now - self.started_at < self.interval:
+            return
+        if self.counts or force:
+            self.logger.info(self.event, seconds=round(now - self.started_at, 1), **self.counts, **fields)
+        self.counts = {}
+        self.started_at = now
+
+
+log = JsonLogger()
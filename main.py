@@ -1,17 +1,42 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from routes import home
-from database import engine
+from routes import home, heartbeat, bulk, assets, history, stats, series, admin
+from database import engine, upgrade_schema
+from heartbeat import heartbeat_buffer
+from site_store import import_config_file
+from assets import static_assets
 import models.models as models
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flush_task = asyncio.create_task(heartbeat_buffer.run())
+    yield
+    flush_task.cancel()
+    heartbeat_buffer.flush()
+
+
 app = FastAPI(
     title="Simple Site Monitor",
     description="A simple site monitor for monitoring website availability and performance",
-    version="0.1.6"
+    version="0.1.6",
+    lifespan=lifespan
 )
 
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema()
+import_config_file(home.CONFIG_PATH)
+static_assets.build()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-app.include_router(home.router)
\ No newline at end of file
+app.include_router(assets.router)
+app.include_router(bulk.router)
+app.include_router(home.router)
+app.include_router(heartbeat.router)
+app.include_router(history.router)
+app.include_router(stats.router)
+app.include_router(series.router)
+app.include_router(admin.router)
\ No newline at end of file
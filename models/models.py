@@ -2,7 +2,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import Base
-from sqlalchemy import Column, String, DateTime, UUID, Integer, Float, Boolean
+from sqlalchemy import Column, String, DateTime, Uuid, Integer, Float, Boolean, Text
 from datetime import datetime, timezone
 import uuid
 
@@ -10,11 +10,85 @@ import uuid
 class RunnerSiteLog(Base):
     __tablename__ = 'runner_run_log'
 
-    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    # Uuid is stored as CHAR(32); a plain UUID column gets NUMERIC affinity in
+    # SQLite, which turns the odd all-digit hex id into a number. Tables created
+    # with UUID are rebuilt by database.convert_log_ids.
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    site_id = Column(String, nullable=True, index=True)
     name = Column(String, nullable=False)
     status = Column(String, nullable=False)   # healthy, slow, down, token_alert, unknown
     response_time = Column(Float, nullable=False)
     attempt_count = Column(Integer, nullable=False)
-    created_at = Column(DateTime, nullable=False)
-    last_scan_time = Column(DateTime, nullable=False)
-    ssl_days_remaining = Column(Integer, nullable=True, default=0)
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False, index=True)
+    last_scan_time = Column(DateTime, nullable=False, index=True)
+    ssl_days_remaining = Column(Integer, nullable=True, default=0)
+
+class Heartbeat(Base):
+    __tablename__ = 'heartbeat'
+
+    site_id = Column(String, primary_key=True)
+    status = Column(String, nullable=False)   # up, down (as reported by the last ping)
+    last_ping = Column(DateTime, nullable=False)
+    ping_count = Column(Integer, nullable=False, default=0)
+    # Write order of the rows, set from the table's highest seq by each upsert.
+    # The runner reads what changed by seq, as last_ping comes from the web
+    # process clocks and flushes may commit out of ping order.
+    seq = Column(Integer, nullable=True, index=True)
+
+class Site(Base):
+    __tablename__ = 'site'
+
+    id = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, index=True)   # display order
+    name = Column(String, nullable=False, unique=True)
+    url = Column(String, nullable=False)
+    probe = Column(String, nullable=False, default="get")
+    priority = Column(String, nullable=False, default="normal")   # critical, normal, low
+    scan_interval = Column(Integer, nullable=False, default=0)
+    timeout = Column(Integer, nullable=False, default=0)
+    trigger_type = Column(String, nullable=False)   # status_code, text
+    trigger_value = Column(String, nullable=False)
+    monitor_expiring_token = Column(Boolean, nullable=False, default=False)
+    webhook = Column(Boolean, nullable=False, default=False)
+    method = Column(String, nullable=True)
+    content_type = Column(String, nullable=True)
+    body = Column(Text, nullable=True)
+
+class SiteTag(Base):
+    __tablename__ = 'site_tag'
+
+    site_id = Column(String, primary_key=True)
+    tag = Column(String, primary_key=True, index=True)
+
+class Webhook(Base):
+    __tablename__ = 'webhook'
+    # IDs address destinations in the API, so a deleted one's is never given out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)   # destinations are listed in ID order
+    type = Column(String, nullable=False, default="")   # discord, slack
+    url = Column(String, nullable=False, default="")
+    enabled = Column(Boolean, nullable=False, default=False)
+    name = Column(String, nullable=True)
+    tags = Column(String, nullable=True)       # tag expression of the sites routed here, all sites when empty
+    statuses = Column(String, nullable=True)   # comma separated statuses routed here, all when empty
+
+class ConfigSequence(Base):
+    __tablename__ = 'config_sequence'
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)   # bumped on every site or webhook change
+
+class SiteDailyStats(Base):
+    __tablename__ = 'site_daily_stats'
+
+    site_id = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)   # local date, YYYY-MM-DD
+    up_seconds = Column(Float, nullable=False, default=0)
+    slow_seconds = Column(Float, nullable=False, default=0)
+    down_seconds = Column(Float, nullable=False, default=0)
+    token_alert_seconds = Column(Float, nullable=False, default=0)
+    unknown_seconds = Column(Float, nullable=False, default=0)
+    incidents = Column(Integer, nullable=False, default=0)   # times the site went down
+    recoveries = Column(Integer, nullable=False, default=0)   # down periods that ended
+    repair_seconds = Column(Float, nullable=False, default=0)   # total length of those down periods
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import urlparse
+import time
+from probes import ProbeResult, conditional_headers, conditional_result, run_probe
+from jsonlog import log
+
+try:
+    import httpx
+    import h2  # noqa: F401, httpx only speaks HTTP/2 with it installed
+except ImportError:
+    # Both are optional, without them every probe goes through requests over HTTP/1.1
+    httpx = None
+
+MULTIPLEX_PROBE_TYPES = {"get", "head", "headers"}
+# An origin needs this many due probes before they are sent together
+MIN_GROUP_SIZE = 2
+# Streams in flight at once, HTTP/2 servers commonly allow 100 per connection
+MAX_STREAMS = 32
+# Origins that answered over HTTP/1.1 are probed through requests again, and
+# only retried over HTTP/2 after this long
+HTTP1_RETRY_SECONDS = 3600
+
+# (key, probe type, URL, timeout, text trigger value)
+ProbeRequest = Tuple[Hashable, str, str, float, Optional[str]]
+
+
+def origin(url: str) -> Optional[str]:
+    """The scheme, host and port probes can share a connection for. Only https, HTTP/2 is negotiated during the TLS handshake."""
+    parsed = urlparse(url)
+    if parsed.scheme != "https" or not parsed.hostname:
+        return None
+    return f"https://{parsed.hostname}:{parsed.port or 443}"
+
+
+class MultiplexProber:
+    """
+    Sends the due probes of an origin together over one HTTP/2 connection,
+    each on its own stream and timed separately, instead of one after the
+    other. Origins that do not speak HTTP/2 and requests that fail for other
+    reasons than the site being unreachable fall back to the HTTP/1.1 probes.
+    """
+
+    def __init__(self, verify: Any = True):
+        # Passed to httpx, an SSL context trusts other certificates than the system's
+        self.verify = verify
+        self.client = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.http1_origins: Dict[str, float] = {}
+
+    @property
+    def available(self) -> bool:
+        return httpx is not None
+
+    def start(self) -> None:
+        if self.client is None:
+            self.client = httpx.Client(http2=True, verify=self.verify, follow_redirects=True, limits=httpx.Limits(max_connections=None, max_keepalive_connections=100))
+            self.executor = ThreadPoolExecutor(max_workers=MAX_STREAMS, thread_name_prefix="h2-probe")
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.executor.shutdown(wait=True)
+            self.client.close()
+            self.client = None
+            self.executor = None
+
+    def groups(self, requests: List[ProbeRequest]) -> List[List[ProbeRequest]]:
+        """Split probes into groups worth multiplexing, leaving out those that are not."""
+        now = time.time()
+        by_origin: Dict[str, List[ProbeRequest]] = {}
+        for request in requests:
+            key, probe_type, url, timeout, expect_text = request
+            site_origin = origin(url)
+            if probe_type not in MULTIPLEX_PROBE_TYPES or site_origin is None:
+                continue
+            if now - self.http1_origins.get(site_origin, 0) < HTTP1_RETRY_SECONDS:
+                continue
+            by_origin.setdefault(site_origin, []).append(request)
+        return [group for group in by_origin.values() if len(group) >= MIN_GROUP_SIZE]
+
+    def probe(self, requests: List[ProbeRequest]) -> Dict[Hashable, ProbeResult]:
+        """Probe every group of same origin requests concurrently. Requests that are not multiplexed get no result."""
+        groups = self.groups(requests)
+        if not groups:
+            return {}
+        self.start()
+        batch = [request for group in groups for request in group]
+        return dict(zip((request[0] for request in batch), self.executor.map(self.probe_one, batch)))
+
+    def probe_one(self, request: ProbeRequest) -> ProbeResult:
+        key, probe_type, url, timeout, expect_text = request
+        start_time = time.time()
+        try:
+            if probe_type == "get":
+                headers = conditional_headers(url, expect_text)
+                response = self.client.get(url, headers=headers, timeout=timeout)
+                result = conditional_result(url, response, time.time() - start_time, headers, expect_text)
+            elif probe_type == "head":
+                response = self.client.head(url, timeout=timeout)
+                result = ProbeResult(
+                    reachable=True,
+                    response_time=time.time() - start_time,
+                    status_code=response.status_code,
+                    content_type=response.headers.get("Content-Type")
+                )
+            else:
+                # Leaving the block resets the stream without reading the body
+                with self.client.stream("GET", url, timeout=timeout) as response:
+                    result = ProbeResult(
+                        reachable=True,
+                        response_time=time.time() - start_time,
+                        status_code=response.status_code,
+                        content_type=response.headers.get("Content-Type")
+                    )
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            return ProbeResult(
+                reachable=False,
+                response_time=time.time() - start_time,
+                detail=str(e)
+            )
+        except Exception as e:
+            log.warning("http2_probe_failed", url=url, error=str(e))
+            return run_probe(probe_type, url, timeout, conditional=True, expect_text=expect_text)
+
+        if response.http_version != "HTTP/2":
+            self.http1_origins[origin(url)] = time.time()
+        return result
@@ -0,0 +1,210 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import json
+import queue
+import threading
+import time
+import requests
+from jsonlog import log
+
+# Notifications waiting for one destination. A destination that stays slow or
+# down drops its oldest notifications instead of holding up the others.
+DESTINATION_QUEUE_SIZE = 1000
+DELIVERY_TIMEOUT = 5
+# A rate limited delivery is retried once, after at most this long
+MAX_RETRY_AFTER = 30
+CLOSE_TIMEOUT = 10
+
+
+@dataclass
+class Event:
+    """A notification, rendered at most once per webhook type however many destinations receive it."""
+    title: str
+    color: int
+    message: str
+    timestamp: float = field(default_factory=time.time)
+    payloads: Dict[str, bytes] = field(default_factory=dict)
+
+    def payload(self, webhook_type: str) -> bytes:
+        body = self.payloads.get(webhook_type)
+        if body is None:
+            body = json.dumps(PAYLOAD_BUILDERS[webhook_type](self)).encode("utf-8")
+            self.payloads[webhook_type] = body
+        return body
+
+
+def discord_payload(event: Event) -> Dict[str, Any]:
+    return {
+        "embeds": [
+            {
+                "title": event.title,
+                "description": event.message,
+                "color": event.color,
+                "timestamp": datetime.fromtimestamp(event.timestamp).isoformat()
+            }
+        ]
+    }
+
+
+def slack_payload(event: Event) -> Dict[str, Any]:
+    return {
+        "attachments": [
+            {
+                "color": f"#{event.color:06x}",
+                "title": event.title,
+                "text": event.message,
+                "ts": event.timestamp
+            }
+        ]
+    }
+
+
+PAYLOAD_BUILDERS = {
+    "discord": discord_payload,
+    "slack": slack_payload,
+}
+
+
+class DestinationWorker:
+    """Delivers the notifications of one webhook URL in order, on its own thread and connections."""
+
+    def __init__(self, name: str, url: str, max_queue: int = DESTINATION_QUEUE_SIZE):
+        self.name = name
+        self.url = url
+        self.session = requests.Session()
+        self.queue: "queue.Queue[Optional[bytes]]" = queue.Queue(max_queue)
+        self.thread = threading.Thread(target=self.run, name=f"webhook-{name}", daemon=True)
+        self.thread.start()
+
+    def send(self, body: Optional[bytes]) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(body)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    log.warning("webhook_queue_full", destination=self.name)
+                except queue.Empty:
+                    pass
+
+    def run(self) -> None:
+        while True:
+            body = self.queue.get()
+            if body is None:
+                break
+            self.deliver(body)
+        self.session.close()
+
+    def deliver(self, body: bytes) -> None:
+        for attempt in range(2):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                    timeout=DELIVERY_TIMEOUT
+                )
+            except Exception as e:
+                log.error("webhook_failed", destination=self.name, error=str(e))
+                return
+            if response.status_code == 429 and attempt == 0:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1
+                time.sleep(min(max(retry_after, 0), MAX_RETRY_AFTER))
+                continue
+            if response.status_code < 200 or response.status_code >= 300:
+                log.error("webhook_rejected", destination=self.name, status_code=response.status_code, body=response.text[:500])
+            return
+
+    def close(self) -> None:
+        """Stop after the notifications already queued."""
+        self.send(None)
+
+
+@dataclass
+class Route:
+    """An enabled destination with its filters resolved against the current sites."""
+    destination: Dict[str, Any]
+    worker: DestinationWorker
+    site_ids: Optional[FrozenSet[str]]   # None routes every site
+    statuses: Optional[FrozenSet[str]]   # None routes every status
+
+    def matches(self, site_id: str, status: str) -> bool:
+        return (self.site_ids is None or site_id in self.site_ids) and (self.statuses is None or status in self.statuses)
+
+
+class NotificationRouter:
+    """
+    Routes notifications to the configured webhook destinations. Every
+    destination has its own worker, so a slow one only delays itself.
+    """
+
+    def __init__(self):
+        self.version: Any = None
+        self.routes: List[Route] = []
+        self.workers: Dict[Tuple[str, str], DestinationWorker] = {}
+
+    def configure(self, registry) -> None:
+        """Follow the destinations and sites of a SiteRegistry, only rebuilding when its version moved."""
+        if self.version == registry.version and self.version is not None:
+            return
+        self.version = registry.version
+
+        routes = []
+        workers = {}
+        for destination in registry.config.get("webhooks", []):
+            if not destination.get("enabled") or destination.get("type") not in PAYLOAD_BUILDERS:
+                continue
+            key = (destination["type"], destination["url"])
+            worker = workers.get(key) or self.workers.get(key)
+            if worker is None:
+                worker = DestinationWorker(destination.get("name") or destination["type"], destination["url"])
+            workers[key] = worker
+
+            site_ids = None
+            if destination.get("tags"):
+                try:
+                    site_ids = frozenset(site["id"] for site in registry.select(destination["tags"]))
+                except ValueError as e:
+                    log.warning("webhook_tags_invalid", destination=worker.name, error=str(e))
+                    site_ids = frozenset()
+            statuses = frozenset(destination["statuses"]) if destination.get("statuses") else None
+            routes.append(Route(destination, worker, site_ids, statuses))
+
+        for key, worker in self.workers.items():
+            if key not in workers:
+                worker.close()
+        self.workers = workers
+        self.routes = routes
+
+    @property
+    def active(self) -> bool:
+        return bool(self.routes)
+
+    def route(self, alerts: List[Dict[str, Any]]) -> List[Tuple[Route, List[Dict[str, Any]]]]:
+        """Group site alerts (with "site_id" and "status") by the destinations they go to."""
+        grouped = []
+        for route in self.routes:
+            matching = [alert for alert in alerts if route.matches(alert["site_id"], alert["status"])]
+            if matching:
+                grouped.append((route, matching))
+        return grouped
+
+    def send(self, route: Route, event: Event) -> None:
+        route.worker.send(event.payload(route.destination["type"]))
+
+    def broadcast(self, event: Event) -> None:
+        """Send an event that is not about one site, like the runner losing its network, to every destination."""
+        for route in self.routes:
+            self.send(route, event)
+
+    def close(self) -> None:
+        """Stop every worker, waiting (up to CLOSE_TIMEOUT each) for queued notifications to go out."""
+        for worker in self.workers.values():
+            worker.close()
+        for worker in self.workers.values():
+            worker.thread.join(CLOSE_TIMEOUT)
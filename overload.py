@@ -0,0 +1,240 @@
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import time
+from probes import HEARTBEAT_PROBE, get_probe_type
+from jsonlog import log
+
+# Sites are probed critical first. When the runner cannot keep up, low sites are
+# stretched and shed before normal ones, critical sites keep their interval.
+PRIORITIES = ("critical", "normal", "low")
+DEFAULT_PRIORITY = "normal"
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# How late (in seconds) a probe may start before the runner counts as overloaded.
+# It is also how long a pass runs before it stops starting non-critical probes,
+# so a critical site never waits much longer than this behind the others.
+DEFAULT_SCAN_LAG_BUDGET = 30
+
+# Share of the measured capacity that stretched intervals aim to fill
+CAPACITY_HEADROOM = 0.9
+# Overload ends once the configured intervals need less than this share of the
+# capacity and the last pass stayed within the lag budget
+RECOVERY_UTILIZATION = 0.85
+# Intervals are stretched to at most this many times their configured value
+MAX_STRETCH = 10
+# Weight of each new probe in the moving average of probe durations
+PROBE_TIME_SMOOTHING = 0.1
+
+LOAD_STATUS_PATH = "data/runner_load.json"
+# The status file is rewritten whenever overload starts or ends, otherwise at most this often
+LOAD_PUBLISH_SECONDS = 10
+
+
+def site_priority(site: Dict[str, Any]) -> str:
+    return site.get("priority") or DEFAULT_PRIORITY
+
+
+def priority_rank(site: Dict[str, Any]) -> int:
+    return PRIORITY_RANK.get(site_priority(site), PRIORITY_RANK[DEFAULT_PRIORITY])
+
+
+class LoadModel:
+    """
+    Compares the rate the runner can probe at, measured from its own probes,
+    with the rate the configured intervals ask for, and stretches the intervals
+    of the less important tiers while it cannot keep up.
+    """
+
+    def __init__(self, lag_budget: float = DEFAULT_SCAN_LAG_BUDGET):
+        self.lag_budget = lag_budget
+        self.version: Any = None
+        # Sites in probing order, and the probes per second each tier asks for
+        self.sites: List[Dict[str, Any]] = []
+        self.demand: Dict[str, float] = dict.fromkeys(PRIORITIES, 0.0)
+        self.probe_seconds: Optional[float] = None
+        self.stretch: Dict[str, float] = dict.fromkeys(PRIORITIES, 1.0)
+        # Worst lag per tier and probes shed, for the last pass and the one running
+        self.lag: Dict[str, float] = dict.fromkeys(PRIORITIES, 0.0)
+        self.shed = 0
+        self.pass_lag: Dict[str, float] = dict.fromkeys(PRIORITIES, 0.0)
+        self.pass_shed = 0
+        self.overloaded = False
+        self.changed_at = time.time()
+        # Lag is counted from here at the earliest, time the runner was stopped
+        # or offline does not make its sites late
+        self.lag_since = time.time()
+        self.previous_duration = 0.0
+        self.published_at = 0.0
+
+    def prepare(self, registry, default_interval: float) -> None:
+        """Order the sites by priority and sum each tier's probe rate, once per config version."""
+        if registry.version == self.version and self.version is not None:
+            return
+        self.version = registry.version
+        self.sites = sorted(registry.sites, key=priority_rank)
+        demand = dict.fromkeys(PRIORITIES, 0.0)
+        for site in registry.sites:
+            # Heartbeat sites are only compared against their deadline, they cost no probe
+            if get_probe_type(site) != HEARTBEAT_PROBE:
+                demand[site_priority(site)] += 1 / max(site["scan_interval"] or default_interval, 1)
+        self.demand = demand
+
+    @property
+    def capacity(self) -> Optional[float]:
+        """Probes per second the runner manages, unknown until it has probed something."""
+        if not self.probe_seconds:
+            return None
+        return 1 / self.probe_seconds
+
+    @property
+    def utilization(self) -> float:
+        """Demand at the configured intervals as a share of the capacity."""
+        capacity = self.capacity
+        if capacity is None:
+            return 0.0
+        return sum(self.demand.values()) / capacity
+
+    def interval(self, priority: str, interval: float) -> float:
+        return interval * self.stretch.get(priority, 1.0)
+
+    def order(self, last_scan_time: Callable[[Dict[str, Any]], float]) -> List[Dict[str, Any]]:
+        """
+        The sites in the order of the next pass. After a pass that shed probes
+        the longest waiting sites of each tier go first, so the same ones are
+        not shed every time.
+        """
+        if not self.shed:
+            return self.sites
+        return sorted(self.sites, key=lambda site: (priority_rank(site), last_scan_time(site)))
+
+    def start_pass(self) -> None:
+        self.pass_lag = dict.fromkeys(PRIORITIES, 0.0)
+        self.pass_shed = 0
+
+    def record_probe(self, seconds: float) -> None:
+        if self.probe_seconds is None:
+            self.probe_seconds = seconds
+        else:
+            self.probe_seconds += PROBE_TIME_SMOOTHING * (seconds - self.probe_seconds)
+
+    def resume(self, at: float) -> None:
+        """Start counting lag again from at, after the runner was offline."""
+        self.lag_since = max(self.lag_since, at)
+
+    def record_lag(self, priority: str, last_scan_time: float, interval: float, now: float) -> None:
+        """Record how late a probe started, measured from lag_since for sites last scanned before it."""
+        lag = now - max(last_scan_time, self.lag_since) - interval
+        if lag > self.pass_lag.get(priority, 0.0):
+            self.pass_lag[priority] = lag
+
+    def record_shed(self) -> None:
+        self.pass_shed += 1
+
+    def finish_pass(self) -> Optional[bool]:
+        """
+        Update the overload state from the pass that just ended and plan the
+        next one. Returns True when overload started, False when it ended and
+        None when nothing changed.
+        """
+        self.lag = self.pass_lag
+        self.shed = self.pass_shed
+        worst_lag = max(self.lag.values())
+        utilization = self.utilization
+
+        change = None
+        if not self.overloaded and (utilization > 1 or worst_lag > self.lag_budget):
+            change = True
+        elif self.overloaded and utilization < RECOVERY_UTILIZATION and worst_lag <= self.lag_budget and not self.shed:
+            change = False
+        if change is not None:
+            now = time.time()
+            self.previous_duration = now - self.changed_at
+            self.changed_at = now
+            self.overloaded = change
+
+        self.stretch = self.plan_stretch()
+        return change
+
+    def plan_stretch(self) -> Dict[str, float]:
+        """Stretch low, then normal intervals until the demand fits the capacity, critical ones never."""
+        stretch = dict.fromkeys(PRIORITIES, 1.0)
+        capacity = self.capacity
+        if not self.overloaded or capacity is None:
+            return stretch
+
+        available = capacity * CAPACITY_HEADROOM - self.demand["critical"]
+        stretched = ("low", "normal")
+        for index, priority in enumerate(stretched):
+            demand = self.demand[priority]
+            if not demand:
+                continue
+            # The more important tiers keep their configured rate if they can
+            leftover = available - sum(self.demand[other] for other in stretched[index + 1:])
+            needed = demand / leftover if leftover > 0 else MAX_STRETCH
+            stretch[priority] = min(max(needed, 1.0), MAX_STRETCH)
+            available -= demand / stretch[priority]
+        return stretch
+
+    def status(self) -> Dict[str, Any]:
+        capacity = self.capacity
+        return {
+            "overloaded": self.overloaded,
+            "since": self.changed_at,
+            "utilization": round(self.utilization, 3),
+            "capacity": round(capacity, 3) if capacity is not None else None,
+            "demand": {priority: round(rate, 3) for priority, rate in self.demand.items()},
+            "probe_seconds": round(self.probe_seconds, 3) if self.probe_seconds is not None else None,
+            "lag": {priority: round(lag, 1) for priority, lag in self.lag.items()},
+            "lag_budget": self.lag_budget,
+            "stretch": {priority: round(factor, 2) for priority, factor in self.stretch.items()},
+            "shed": self.shed,
+            "updated_at": time.time(),
+        }
+
+    def publish(self, force: bool = False, path: str = LOAD_STATUS_PATH) -> None:
+        """Atomically write the load status for the web process, at most every LOAD_PUBLISH_SECONDS unless forced."""
+        now = time.time()
+        if not force and now - self.published_at < LOAD_PUBLISH_SECONDS:
+            return
+        self.published_at = now
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.status(), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+class LoadReader:
+    """Cached view of the runner's load status, re-read only when the file was replaced."""
+
+    def __init__(self, path: str = LOAD_STATUS_PATH):
+        self.path = path
+        self.status: Optional[Dict[str, Any]] = None
+        self._file_key = None
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """Return the last published status, None until the runner has published one."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.status
+
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key == self._file_key:
+            return self.status
+
+        try:
+            with open(self.path, 'r') as f:
+                self.status = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("load_read_failed", error=str(e))
+            return self.status
+        self._file_key = file_key
+        return self.status
+
+    def overloaded(self) -> bool:
+        status = self.read()
+        return bool(status and status["overloaded"])
+
+
+load_reader = LoadReader()
@@ -0,0 +1,349 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+import hashlib
+import socket
+import ssl
+import threading
+import time
+import requests
+
+# Probe types that can be selected per site. "get" is the original full
+# download and the only probe that exposes the response body, so it is the
+# only one usable with a "text" trigger. Heartbeat sites are never probed,
+# they are marked up or down by check-ins sent to the web app.
+PROBE_TYPES = ["get", "head", "headers", "tcp", "tls", "dns", "heartbeat"]
+DEFAULT_PROBE_TYPE = "get"
+HEARTBEAT_PROBE = "heartbeat"
+HTTP_PROBE_TYPES = {"get", "head", "headers"}
+TEXT_PROBE_TYPES = {"get"}
+
+# Shared session so repeated probes against the same host reuse connections
+session = requests.Session()
+
+# URLs whose validators and trigger results are remembered for conditional probes
+RESPONSE_CACHE_SIZE = 10000
+# Text trigger results kept per URL, more only appear when a trigger keeps being edited
+MAX_CACHED_MATCHES = 32
+
+# getaddrinfo has no timeout of its own, so DNS probes wait for it on these
+# threads for at most the site's timeout. A lookup that hangs keeps its thread
+# until the system resolver gives up, later lookups queue behind it.
+RESOLVER_THREADS = 4
+resolver_executor = ThreadPoolExecutor(max_workers=RESOLVER_THREADS, thread_name_prefix="resolver")
+
+
+@dataclass
+class ProbeResult:
+    reachable: bool
+    response_time: float = 0.0
+    status_code: Optional[int] = None
+    text: Optional[str] = None
+    content_type: Optional[str] = None
+    ssl_days_remaining: Optional[int] = None
+    detail: str = ""
+    # Set by conditional probes given a text trigger, which may reuse an earlier
+    # result instead of decoding and searching the body
+    text_found: Optional[bool] = None
+    not_modified: bool = False
+
+
+@dataclass
+class CachedResponse:
+    """What a conditional probe needs of the last successful GET of a URL."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    status_code: int
+    content_type: Optional[str]
+    body_hash: bytes
+    # Text trigger value -> whether the body contains it
+    matches: Dict[str, bool] = field(default_factory=dict)
+
+    def validators(self, expect_text: Optional[str]) -> Dict[str, str]:
+        """
+        Conditional request headers. None are sent when a text trigger has not
+        been evaluated against this body yet, as a 304 would leave nothing to
+        evaluate it on.
+        """
+        if expect_text is not None and expect_text not in self.matches:
+            return {}
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Validators (ETag, Last-Modified), a hash of the body and the trigger results
+    of the last successful GET per URL. Lets the runner skip downloading pages
+    that did not change, and skip decoding and searching bodies that are the
+    same as last time even when the server sends no validators. HTTP/2 probes
+    use it from several threads at once, so changes take a lock.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: Dict[str, CachedResponse] = {}
+        self.lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        return self.entries.get(url)
+
+    def store(self, url: str, response: Any, body_hash: bytes) -> CachedResponse:
+        """Remember a successful response (from requests or httpx), keeping the trigger results if the body did not change."""
+        with self.lock:
+            previous = self.entries.pop(url, None)
+            matches = previous.matches if previous is not None and previous.body_hash == body_hash else {}
+            if len(matches) > MAX_CACHED_MATCHES:
+                matches = {}
+            entry = CachedResponse(
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                status_code=response.status_code,
+                content_type=response.headers.get("Content-Type"),
+                body_hash=body_hash,
+                matches=matches
+            )
+            # Oldest entries go first, dicts keep insertion order
+            if len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            self.entries[url] = entry
+            return entry
+
+    def remember_match(self, entry: CachedResponse, expect_text: str, found: bool) -> None:
+        with self.lock:
+            entry.matches[expect_text] = found
+
+    def drop(self, url: str) -> None:
+        with self.lock:
+            self.entries.pop(url, None)
+
+
+# Only used by the runner, probes run from the web app always download the page
+response_cache = ResponseCache()
+
+
+def get_probe_type(site: Dict) -> str:
+    """Return the probe type configured for a site, falling back to the default."""
+    probe_type = site.get("probe") or DEFAULT_PROBE_TYPE
+    if probe_type not in PROBE_TYPES:
+        return DEFAULT_PROBE_TYPE
+    return probe_type
+
+
+def validate_probe(probe_type: str, trigger_type: str) -> Optional[str]:
+    """Return an error message if the probe/trigger combination is not usable."""
+    if probe_type not in PROBE_TYPES:
+        return f"Unknown probe type '{probe_type}'. Supported: {', '.join(PROBE_TYPES)}"
+    if trigger_type == "text" and probe_type not in TEXT_PROBE_TYPES:
+        return "Text triggers need the response body and require the 'get' probe"
+    return None
+
+
+def host_and_port(url: str):
+    """Split a URL into hostname and port, defaulting the port from the scheme."""
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    port = parsed.port
+    if port is None:
+        port = 80 if parsed.scheme == "http" else 443
+    return parsed.hostname, port
+
+
+def cert_days_remaining(cert: Dict) -> int:
+    expire_date = datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
+    return (expire_date - datetime.now()).days
+
+
+def probe_get(url: str, timeout: float) -> ProbeResult:
+    start_time = time.time()
+    response = session.get(url, timeout=timeout)
+    response_time = time.time() - start_time
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        status_code=response.status_code,
+        text=response.text,
+        content_type=response.headers.get("Content-Type")
+    )
+
+
+def probe_get_conditional(url: str, timeout: float, expect_text: Optional[str] = None) -> ProbeResult:
+    """
+    GET the URL with the validators of its last successful response. A 304
+    reports the cached status and text trigger result with the measured
+    latency. A full response whose body hashes the same as last time reuses
+    the text trigger result too, only a changed body is decoded and searched.
+    """
+    headers = conditional_headers(url, expect_text)
+    start_time = time.time()
+    response = session.get(url, timeout=timeout, headers=headers)
+    return conditional_result(url, response, time.time() - start_time, headers, expect_text)
+
+
+def conditional_headers(url: str, expect_text: Optional[str] = None) -> Dict[str, str]:
+    cached = response_cache.get(url)
+    return cached.validators(expect_text) if cached is not None else {}
+
+
+def conditional_result(url: str, response: Any, response_time: float, headers: Dict[str, str], expect_text: Optional[str] = None) -> ProbeResult:
+    """Turn the response to a conditional GET (from requests or httpx) into a probe result and update the cache."""
+    cached = response_cache.get(url)
+    if response.status_code == 304 and headers and cached is not None:
+        return ProbeResult(
+            reachable=True,
+            response_time=response_time,
+            status_code=cached.status_code,
+            content_type=cached.content_type,
+            text_found=cached.matches.get(expect_text) if expect_text is not None else None,
+            not_modified=True,
+            detail="Not modified since the last probe"
+        )
+
+    result = ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        status_code=response.status_code,
+        content_type=response.headers.get("Content-Type")
+    )
+    if 200 <= response.status_code < 300:
+        cached = response_cache.store(url, response, hashlib.blake2b(response.content, digest_size=16).digest())
+    else:
+        response_cache.drop(url)
+        cached = None
+
+    if expect_text is not None:
+        if cached is not None and expect_text in cached.matches:
+            result.text_found = cached.matches[expect_text]
+        else:
+            result.text = response.text
+            result.text_found = expect_text in result.text
+            if cached is not None:
+                response_cache.remember_match(cached, expect_text, result.text_found)
+    return result
+
+
+def probe_head(url: str, timeout: float) -> ProbeResult:
+    start_time = time.time()
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    response_time = time.time() - start_time
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        status_code=response.status_code,
+        content_type=response.headers.get("Content-Type")
+    )
+
+
+def probe_headers(url: str, timeout: float) -> ProbeResult:
+    """GET the URL but close the connection as soon as the headers arrive."""
+    start_time = time.time()
+    response = session.get(url, timeout=timeout, stream=True)
+    response_time = time.time() - start_time
+    # Closing without reading drops the connection instead of draining the body
+    response.close()
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        status_code=response.status_code,
+        content_type=response.headers.get("Content-Type")
+    )
+
+
+def probe_tcp(url: str, timeout: float) -> ProbeResult:
+    hostname, port = host_and_port(url)
+    start_time = time.time()
+    with socket.create_connection((hostname, port), timeout=timeout):
+        response_time = time.time() - start_time
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        detail=f"TCP connect to {hostname}:{port} succeeded"
+    )
+
+
+def probe_tls(url: str, timeout: float) -> ProbeResult:
+    hostname, port = host_and_port(url)
+    context = ssl.create_default_context()
+    start_time = time.time()
+    with socket.create_connection((hostname, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=hostname) as ssock:
+            response_time = time.time() - start_time
+            days_remaining = cert_days_remaining(ssock.getpeercert())
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        ssl_days_remaining=days_remaining,
+        detail=f"TLS handshake with {hostname}:{port} succeeded, certificate expires in {days_remaining} days"
+    )
+
+
+def probe_dns(url: str, timeout: float) -> ProbeResult:
+    hostname, port = host_and_port(url)
+    start_time = time.time()
+    lookup = resolver_executor.submit(socket.getaddrinfo, hostname, port, proto=socket.IPPROTO_TCP)
+    try:
+        addresses = lookup.result(timeout)
+    except FutureTimeoutError:
+        lookup.cancel()
+        raise TimeoutError(f"Resolving {hostname} timed out after {timeout} seconds")
+    response_time = time.time() - start_time
+    resolved = sorted({address[4][0] for address in addresses})
+    return ProbeResult(
+        reachable=True,
+        response_time=response_time,
+        detail=f"{hostname} resolved to {', '.join(resolved)}"
+    )
+
+
+PROBES = {
+    "get": probe_get,
+    "head": probe_head,
+    "headers": probe_headers,
+    "tcp": probe_tcp,
+    "tls": probe_tls,
+    "dns": probe_dns,
+}
+
+
+def run_probe(probe_type: str, url: str, timeout: float, conditional: bool = False, expect_text: Optional[str] = None) -> ProbeResult:
+    """Run a probe, returning an unreachable result instead of raising.
+
+    With conditional, GET probes go through the response cache and evaluate
+    expect_text (the value of a text trigger) themselves.
+    """
+    probe = PROBES.get(probe_type, probe_get)
+    start_time = time.time()
+    try:
+        if conditional and probe is probe_get:
+            return probe_get_conditional(url, timeout, expect_text)
+        return probe(url, timeout)
+    except Exception as e:
+        return ProbeResult(
+            reachable=False,
+            response_time=time.time() - start_time,
+            detail=str(e)
+        )
+
+
+def trigger_met(result: ProbeResult, trigger_type: str, trigger_value: str) -> bool:
+    """Evaluate a site's trigger against a probe result.
+
+    Probes without an HTTP status (tcp, tls, dns) treat a successful probe as
+    meeting a status_code trigger.
+    """
+    if not result.reachable:
+        return False
+    if trigger_type == "text":
+        if result.text_found is not None:
+            return result.text_found
+        return result.text is not None and trigger_value in result.text
+    if trigger_type == "status_code":
+        if result.status_code is None:
+            return True
+        return result.status_code == int(trigger_value)
+    return False
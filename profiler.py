@@ -0,0 +1,234 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from types import CodeType, FrameType
+from datetime import datetime
+import os
+import re
+import sys
+import threading
+import time
+from jsonlog import log
+
+# 100 samples a second: walking every thread's stack takes tens of microseconds,
+# so the profiled process loses well under 1% to sampling
+DEFAULT_INTERVAL = 0.01
+MIN_INTERVAL = 0.001
+MAX_PROFILE_SECONDS = 300
+
+PROFILES_DIR = "data/profiles"
+# Creating this file (optionally holding a number of seconds) makes the runner
+# profile itself, as does sending it SIGUSR1
+RUNNER_PROFILE_REQUEST = "data/profile_runner"
+DEFAULT_RUNNER_PROFILE_SECONDS = 30
+PROFILE_NAME = re.compile(r"[A-Za-z0-9_.-]+\.collapsed")
+
+# Innermost frames of threads that are waiting rather than working. Leaving them
+# out keeps idle pool and worker threads from burying the busy ones.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+}
+
+# Pool threads are numbered, their stacks are merged under one name
+THREAD_NUMBER = re.compile(r"[-_]\d+$")
+
+
+def is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread at a fixed interval and counts
+    identical stacks. Nothing is traced, so code runs at full speed between
+    samples, and the counts stay small however long the window is.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, include_idle: bool = False):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.include_idle = include_idle
+        # (thread name, code objects from innermost to outermost) -> samples
+        self.counts: Dict[Tuple[str, Tuple[CodeType, ...]], int] = {}
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.labels: Dict[CodeType, str] = {}
+
+    def start(self, duration: Optional[float] = None, on_finish: Optional[Callable[["SamplingProfiler"], None]] = None) -> None:
+        """Start sampling, for at most duration seconds. on_finish is called from the sampling thread when it ends."""
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self.run, args=(duration, on_finish), name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def run(self, duration: Optional[float], on_finish) -> None:
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + duration if duration else None
+        thread_names: Dict[int, str] = {}
+        next_sample = time.perf_counter()
+
+        while not self.stop_event.is_set():
+            frames = sys._current_frames()
+            if any(ident not in thread_names for ident in frames):
+                thread_names = {thread.ident: THREAD_NUMBER.sub("", thread.name) for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own_ident or (not self.include_idle and is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                key = (thread_names.get(ident, str(ident)), tuple(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                break
+            # Keep a steady rate, without catching up on samples missed while the process was busy
+            next_sample = max(next_sample + self.interval, now)
+            self.stop_event.wait(next_sample - now)
+
+        self.stopped_at = time.time()
+        if on_finish is not None:
+            on_finish(self)
+
+    def label(self, code: CodeType) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            path = code.co_filename
+            relative = os.path.relpath(path) if os.path.isabs(path) else path
+            if relative.startswith(".."):
+                # Outside the app: the last two path components are enough to recognise the module
+                relative = "/".join(path.replace("\\", "/").split("/")[-2:])
+            # Semicolons separate frames in the collapsed format
+            label = f"{code.co_name} ({relative}:{code.co_firstlineno})".replace(";", ":")
+            self.labels[code] = label
+        return label
+
+    def stacks(self) -> List[Tuple[List[str], int]]:
+        """Every sampled stack as frame labels from the thread name down to the innermost function, most frequent first."""
+        merged: Dict[Tuple[str, ...], int] = {}
+        for (thread_name, codes), count in list(self.counts.items()):
+            key = (thread_name, *(self.label(code) for code in reversed(codes)))
+            merged[key] = merged.get(key, 0) + count
+        return sorted(((list(key), count) for key, count in merged.items()), key=lambda item: -item[1])
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one "frame;frame;frame count" line per stack, as read by flamegraph.pl and speedscope."""
+        return "".join(f"{';'.join(frames)} {count}\n" for frames, count in self.stacks())
+
+    def tree(self) -> Dict[str, Any]:
+        """The same stacks as a nested {"name", "value", "children"} tree, the format of d3-flame-graph."""
+        root: Dict[str, Any] = {"name": "all", "value": 0, "children": {}}
+        for frames, count in self.stacks():
+            node = root
+            node["value"] += count
+            for frame in frames:
+                node = node["children"].setdefault(frame, {"name": frame, "value": 0, "children": {}})
+                node["value"] += count
+
+        def listed(node: Dict[str, Any]) -> Dict[str, Any]:
+            return {**node, "children": [listed(child) for child in node["children"].values()]}
+
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "root": listed(root),
+        }
+
+
+def write_profile(profiler: SamplingProfiler, prefix: str, profiles_dir: str = PROFILES_DIR) -> str:
+    """Save a finished profile's collapsed stacks and return the file path."""
+    os.makedirs(profiles_dir, exist_ok=True)
+    stamp = datetime.fromtimestamp(profiler.started_at or time.time()).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(profiles_dir, f"{prefix}-{stamp}.collapsed")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(profiler.collapsed())
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_profiles(profiles_dir: str = PROFILES_DIR) -> List[Dict[str, Any]]:
+    try:
+        names = [name for name in os.listdir(profiles_dir) if PROFILE_NAME.fullmatch(name)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        stat = os.stat(os.path.join(profiles_dir, name))
+        profiles.append({"name": name, "size": stat.st_size, "modified": stat.st_mtime})
+    return profiles
+
+
+class ProfileControl:
+    """
+    Starts profiling windows in a long running process on request, one at a
+    time, and saves each one to PROFILES_DIR when it ends.
+    """
+
+    def __init__(self, prefix: str, request_path: Optional[str] = None, default_seconds: float = DEFAULT_RUNNER_PROFILE_SECONDS):
+        self.prefix = prefix
+        self.request_path = request_path
+        self.default_seconds = default_seconds
+        self.profiler: Optional[SamplingProfiler] = None
+        self.lock = threading.Lock()
+
+    def start(self, seconds: Optional[float] = None) -> bool:
+        """Start a window of seconds (the default when None). Returns False if one is already running."""
+        with self.lock:
+            if self.profiler is not None:
+                return False
+            seconds = min(max(seconds or self.default_seconds, 1), MAX_PROFILE_SECONDS)
+            self.profiler = SamplingProfiler()
+            self.profiler.start(seconds, self.finish)
+        log.info("profile_started", process=self.prefix, seconds=seconds)
+        return True
+
+    def finish(self, profiler: SamplingProfiler) -> None:
+        try:
+            path = write_profile(profiler, self.prefix)
+            log.info("profile_written", process=self.prefix, path=path, samples=profiler.samples)
+        except OSError as e:
+            log.error("profile_write_failed", error=str(e))
+        with self.lock:
+            self.profiler = None
+
+    def check_request(self) -> None:
+        """Start a window if the request file exists, then remove it. Costs one failed stat when it does not."""
+        if self.request_path is None:
+            return
+        try:
+            with open(self.request_path, 'r') as f:
+                content = f.read().strip()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.error("profile_request_failed", error=str(e))
+            return
+        try:
+            os.remove(self.request_path)
+        except OSError:
+            pass
+        try:
+            seconds = float(content) if content else None
+        except ValueError:
+            seconds = None
+        self.start(seconds)
+
+    def handle_signal(self, signum, frame) -> None:
+        # The interrupted code may hold the lock, so the window is started from another thread
+        threading.Thread(target=self.start, name="profile-request", daemon=True).start()
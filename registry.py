@@ -0,0 +1,101 @@
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+import time
+import uuid
+from tag_query import evaluate, parse_tag_query
+
+# Distinct tag expressions whose results each registry keeps
+MAX_CACHED_SELECTIONS = 256
+
+# Namespace for IDs given to sites that were configured before sites had IDs.
+# Deriving them from the name means the web app and the runner assign the
+# same ID even if both see the old config at the same time.
+SITE_ID_NAMESPACE = uuid.UUID("6f1b0c52-8f0e-4f53-9a52-3e8a3c8e6d10")
+
+
+def new_site_id() -> str:
+    return uuid.uuid4().hex
+
+
+def ensure_site_ids(config: Dict[str, Any]) -> bool:
+    """Give every site without an ID a stable one. Returns True if any were added."""
+    changed = False
+    for site in config.get("sites", []):
+        if not site.get("id"):
+            site["id"] = uuid.uuid5(SITE_ID_NAMESPACE, site["name"]).hex
+            changed = True
+    return changed
+
+
+class SiteRegistry:
+    """Indexes over the configured sites, built once per config version."""
+
+    def __init__(self, config: Dict[str, Any], version: Any = None):
+        self.config = config
+        self.version = version
+        self.sites: List[Dict[str, Any]] = config["sites"]
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.by_tag: Dict[str, List[str]] = {}
+        self.positions: Dict[str, int] = {}
+
+        for position, site in enumerate(self.sites):
+            self.by_id[site["id"]] = site
+            self.by_name[site["name"]] = site
+            self.positions[site["id"]] = position
+            for tag in site.get("tags", []):
+                self.by_tag.setdefault(tag, []).append(site["id"])
+
+        # Inverted index for tag expressions
+        self.tag_index: Dict[str, FrozenSet[str]] = {tag: frozenset(ids) for tag, ids in self.by_tag.items()}
+        self.selections: Dict[str, List[Dict[str, Any]]] = {}
+
+    def resolve(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find a site by ID, falling back to its display name."""
+        return self.by_id.get(key) or self.by_name.get(key)
+
+    def select(self, expression: Optional[str]) -> List[Dict[str, Any]]:
+        """Return the sites matching a tag expression (all sites without one), in configured order.
+
+        Raises ValueError for a malformed expression.
+        """
+        if not expression or not expression.strip():
+            return self.sites
+        sites = self.selections.get(expression)
+        if sites is None:
+            ids = evaluate(parse_tag_query(expression), self.tag_index, self.by_id.keys())
+            sites = [self.by_id[site_id] for site_id in sorted(ids, key=self.positions.__getitem__)]
+            if len(self.selections) >= MAX_CACHED_SELECTIONS:
+                self.selections.clear()
+            self.selections[expression] = sites
+        return sites
+
+
+class RegistryCache:
+    """Keeps a SiteRegistry, rebuilt only when the config version changes."""
+
+    def __init__(self, load_config: Callable[[], Dict[str, Any]], load_version: Callable[[], Any], max_age: float = 0):
+        self.load_config = load_config
+        self.load_version = load_version
+        self.max_age = max_age
+        self.registry: Optional[SiteRegistry] = None
+        self.checked_at = 0.0
+
+    def get(self, max_age: Optional[float] = None) -> SiteRegistry:
+        """
+        The current registry. A registry whose version was checked max_age
+        seconds ago or less (the cache's own max_age by default) is reused as is.
+        """
+        if max_age is None:
+            max_age = self.max_age
+        if self.registry is not None and max_age and time.monotonic() - self.checked_at <= max_age:
+            return self.registry
+        checked_at = time.monotonic()
+        version = self.load_version()
+        if self.registry is None or self.registry.version != version:
+            self.registry = SiteRegistry(self.load_config(), version)
+        self.checked_at = checked_at
+        return self.registry
+
+    def invalidate(self) -> None:
+        """Check the version on the next get, after a change made in this process."""
+        self.checked_at = 0.0
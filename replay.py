@@ -0,0 +1,189 @@
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from samples import SAMPLE_RECORD, SAMPLES_DIR, read_records
+from state_engine import CHANGE, Thresholds, decide
+from uptime import OUTCOME_DOWN
+
+STATUSES = ("up", "slow", "down", "token_alert")
+
+# Synthetic streams: one probe every 30 seconds, mostly fast, with outages
+# and single failed probes mixed in
+SYNTHETIC_INTERVAL = 30
+SYNTHETIC_LATENCY = 0.3
+SYNTHETIC_OUTAGE_RATE = 0.0005
+SYNTHETIC_OUTAGE_PROBES = 20
+SYNTHETIC_BLIP_RATE = 0.005
+SYNTHETIC_SLOW_RATE = 0.01
+
+
+class ProbeStream(NamedTuple):
+    """Probe results of one site, oldest first. up is whether the trigger was met."""
+    name: str
+    timestamps: Sequence[float]
+    ups: Sequence[bool]
+    response_times: Sequence[float]
+
+
+class ReplayResult:
+    """What a stream would have done to a site's state under one set of thresholds."""
+
+    def __init__(self, thresholds: Thresholds):
+        self.thresholds = thresholds
+        self.events = 0
+        # Changes to each status, each one an alert for sites with webhooks on
+        self.changes: Dict[str, int] = dict.fromkeys(STATUSES, 0)
+        self.seconds: Dict[str, float] = dict.fromkeys(STATUSES + ("unknown",), 0.0)
+        self.transitions: List[Tuple[float, str]] = []
+
+    def merge(self, other: "ReplayResult") -> None:
+        self.events += other.events
+        for status, count in other.changes.items():
+            self.changes[status] += count
+        for status, seconds in other.seconds.items():
+            self.seconds[status] += seconds
+        self.transitions += other.transitions
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.thresholds._asdict(),
+            "events": self.events,
+            "alerts": sum(self.changes.values()),
+            "changes": self.changes,
+            "seconds": self.seconds,
+        }
+
+
+def replay(stream: ProbeStream, thresholds: Thresholds, keep_transitions: bool = False) -> ReplayResult:
+    """Feed a stream through the state engine, starting from an unknown site like the runner does."""
+    result = ReplayResult(thresholds)
+    status = "unknown"
+    attempt_count = 0
+    since = stream.timestamps[0] if stream.timestamps else 0
+    changes = result.changes
+    seconds = result.seconds
+
+    for timestamp, up, response_time in zip(stream.timestamps, stream.ups, stream.response_times):
+        # Recorded samples do not tell unreachable from a failed trigger, neither matters for the outcome
+        action, new_status, attempt_count = decide(status, attempt_count, up, up, response_time, thresholds)
+        if action == CHANGE:
+            seconds[status] += timestamp - since
+            since = timestamp
+            changes[new_status] += 1
+            if keep_transitions:
+                result.transitions.append((timestamp, new_status))
+            status = new_status
+
+    if stream.timestamps:
+        seconds[status] += stream.timestamps[-1] - since
+    result.events = len(stream.timestamps)
+    return result
+
+
+def recorded_streams(site_ids: Optional[List[str]] = None, samples_dir: str = SAMPLES_DIR) -> Iterator[ProbeStream]:
+    """The probe samples the runner recorded, per site. Without site_ids every recorded site."""
+    if site_ids is None:
+        try:
+            site_ids = sorted(name[:-4] for name in os.listdir(samples_dir) if name.endswith(".bin"))
+        except FileNotFoundError:
+            site_ids = []
+    for site_id in site_ids:
+        path = os.path.join(samples_dir, f"{site_id}.bin")
+        try:
+            count = os.path.getsize(path) // SAMPLE_RECORD.size
+        except FileNotFoundError:
+            print(f"No samples recorded for {site_id}")
+            continue
+        timestamps, latencies, outcomes = read_records(path, 0, count)
+        yield ProbeStream(
+            site_id,
+            timestamps.tolist(),
+            [outcome != OUTCOME_DOWN for outcome in outcomes],
+            [latency / 1000 for latency in latencies.tolist()]
+        )
+
+
+def synthetic_stream(name: str, count: int, seed: int = 0, start: float = 0) -> ProbeStream:
+    """A reproducible stream of count probes: mostly fast, with outages, single failures and slow responses."""
+    rng = random.Random(seed)
+    ups = []
+    response_times = []
+    outage_left = 0
+    for _ in range(count):
+        if outage_left == 0 and rng.random() < SYNTHETIC_OUTAGE_RATE:
+            outage_left = max(1, int(rng.expovariate(1 / SYNTHETIC_OUTAGE_PROBES)))
+        if outage_left:
+            outage_left -= 1
+            ups.append(False)
+            response_times.append(0.0)
+            continue
+        roll = rng.random()
+        if roll < SYNTHETIC_BLIP_RATE:
+            ups.append(False)
+            response_times.append(0.0)
+        elif roll < SYNTHETIC_BLIP_RATE + SYNTHETIC_SLOW_RATE:
+            ups.append(True)
+            response_times.append(rng.uniform(1, 6))
+        else:
+            ups.append(True)
+            response_times.append(rng.expovariate(1 / SYNTHETIC_LATENCY))
+    timestamps = [start + index * SYNTHETIC_INTERVAL for index in range(count)]
+    return ProbeStream(name, timestamps, ups, response_times)
+
+
+def sweep(streams: List[ProbeStream], grid: List[Thresholds]) -> List[ReplayResult]:
+    """Replay every stream under every set of thresholds, one combined result per set."""
+    results = []
+    for thresholds in grid:
+        combined = ReplayResult(thresholds)
+        for stream in streams:
+            combined.merge(replay(stream, thresholds))
+        results.append(combined)
+    return results
+
+
+def parse_values(text: str, cast) -> List[Any]:
+    return [cast(value) for value in text.split(",") if value.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay probe results through the state engine under different thresholds.")
+    parser.add_argument("--sites", help="Comma separated site IDs to replay from data/samples (default: every recorded site)")
+    parser.add_argument("--synthetic", type=int, metavar="SITES", help="Replay generated streams for this many sites instead")
+    parser.add_argument("--probes", type=int, default=100000, help="Probes per generated site")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slow", default="2", help="Slow thresholds in seconds, comma separated")
+    parser.add_argument("--attempts", default="3", help="Attempts before trigger, comma separated")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        streams = [synthetic_stream(f"synthetic-{index}", args.probes, args.seed + index) for index in range(args.synthetic)]
+    else:
+        streams = list(recorded_streams(parse_values(args.sites, str) if args.sites else None))
+    grid = [
+        Thresholds(slow, 0, attempts)
+        for slow, attempts in itertools.product(parse_values(args.slow, float), parse_values(args.attempts, int))
+    ]
+
+    started = time.perf_counter()
+    results = sweep(streams, grid)
+    elapsed = time.perf_counter() - started
+    events = sum(result.events for result in results)
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print(f"{'slow':>6} {'attempts':>8} {'alerts':>8} {'down':>6} {'slow':>6} {'up':>6} {'down time':>10}")
+        for result in results:
+            total = sum(result.seconds.values()) or 1
+            print(
+                f"{result.thresholds.slow_threshold:>6g} {result.thresholds.attempts_before_trigger:>8} "
+                f"{sum(result.changes.values()):>8} {result.changes['down']:>6} {result.changes['slow']:>6} "
+                f"{result.changes['up']:>6} {result.seconds['down'] / total:>10.3%}"
+            )
+    print(f"Replayed {events} probe results from {len(streams)} sites in {elapsed:.2f} seconds ({events / max(elapsed, 1e-9):,.0f} per second)")
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+import gzip
+import hashlib
+import threading
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, without it responses are only gzip compressed
+    brotli = None
+
+# Bodies smaller than this are sent as is, compressing them gains nothing
+MIN_COMPRESS_BYTES = 512
+
+
+class CachedBody:
+    """A rendered response body with its compressed variants."""
+    __slots__ = ("body", "media_type", "etag", "encoded")
+
+    def __init__(self, body: bytes, media_type: Optional[str], etag: str, compress: bool = True):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.encoded: Dict[str, bytes] = {}
+        if compress and len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body, quality=5)
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class ResponseCache:
+    """Bounded LRU of rendered responses keyed by route and content version."""
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: CachedBody) -> None:
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.total_bytes -= old_entry.size()
+            self.entries[key] = entry
+            self.total_bytes += entry.size()
+
+            # Evict least recently used entries, always keeping the newest one
+            while len(self.entries) > 1 and (
+                len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+            ):
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted.size()
+
+
+def make_etag(name: str, version: Any) -> str:
+    # Weak, because the same ETag is served for the plain and compressed bodies
+    digest = hashlib.blake2b(repr((name, version)).encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque_tag for tag in header.split(","))
+
+
+def choose_encoding(request: Request, entry: CachedBody) -> Optional[str]:
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and encoding in entry.encoded:
+            return encoding
+    return None
+
+
+def cached_response(request: Request, name: str, version: Any, render: Callable[[], Response]) -> Response:
+    """Serve the response for one content version, rendering it at most once per version.
+
+    Clients that already hold this version get an empty 304, everyone else
+    gets the cached body, compressed if they accept it.
+    """
+    etag = make_etag(name, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (name, version)
+    entry = response_cache.get(key)
+    if entry is None:
+        rendered = render()
+        entry = CachedBody(rendered.body, rendered.media_type, etag)
+        response_cache.put(key, entry)
+
+    body = entry.body
+    encoding = choose_encoding(request, entry)
+    if encoding is not None:
+        body = entry.encoded[encoding]
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=entry.media_type, headers=headers)
+
+
+response_cache = ResponseCache()
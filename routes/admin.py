@@ -0,0 +1,96 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
+import os
+import threading
+from database import offload
+from profiler import (
+    DEFAULT_INTERVAL,
+    DEFAULT_RUNNER_PROFILE_SECONDS,
+    MAX_PROFILE_SECONDS,
+    PROFILE_NAME,
+    PROFILES_DIR,
+    RUNNER_PROFILE_REQUEST,
+    SamplingProfiler,
+    list_profiles,
+)
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"]
+)
+
+PROFILE_FORMATS = ["collapsed", "json"]
+
+# One profile of the web app at a time, overlapping samplers would only slow each other down
+web_profile_lock = threading.Lock()
+
+
+@router.get("/profile")
+async def profile_web(
+    seconds: float = 10,
+    interval_ms: float = DEFAULT_INTERVAL * 1000,
+    format: str = "collapsed",
+    idle: bool = False
+):
+    """
+    Sample the web app's threads for `seconds` and return the stacks seen, while it keeps serving requests.
+    format is "collapsed" (text for flamegraph.pl or speedscope) or "json" (a d3-flame-graph tree).
+    idle=true also counts threads that are only waiting.
+    """
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(PROFILE_FORMATS)}")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if not web_profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    try:
+        profiler = SamplingProfiler(interval_ms / 1000, include_idle=idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    finally:
+        web_profile_lock.release()
+
+    if format == "json":
+        return JSONResponse(content=profiler.tree())
+    return PlainTextResponse(profiler.collapsed())
+
+
+@router.post("/profile/runner")
+@offload
+def profile_runner(seconds: float = DEFAULT_RUNNER_PROFILE_SECONDS):
+    """
+    Ask the runner to profile itself. It picks the request up at the start of its next
+    pass and saves the result to the profile list. Sending the runner SIGUSR1 does the same.
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    tmp_path = f"{RUNNER_PROFILE_REQUEST}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(seconds))
+    os.replace(tmp_path, RUNNER_PROFILE_REQUEST)
+    return JSONResponse(status_code=202, content={"message": "Runner profile requested"})
+
+
+@router.get("/profiles")
+@offload
+def get_profiles():
+    """List the saved runner profiles, newest first."""
+    return JSONResponse(content=list_profiles())
+
+
+@router.get("/profiles/{name}")
+@offload
+def get_profile(name: str):
+    """Get a saved profile as collapsed stacks."""
+    if not PROFILE_NAME.fullmatch(name):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    try:
+        with open(os.path.join(PROFILES_DIR, name), 'r') as f:
+            return PlainTextResponse(f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
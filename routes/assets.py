@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request, HTTPException
+from assets import static_assets
+
+router = APIRouter(
+    prefix="/assets",
+    tags=["assets"],
+    include_in_schema=False
+)
+
+
+@router.get("/{path:path}")
+async def get_asset(request: Request, path: str):
+    """Serve a fingerprinted static file with long-lived cache headers."""
+    response = static_assets.response(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return response
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Request, HTTPException, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, List, Optional
+import csv
+from database import SessionLocal, offload, run_db
+from snapshot import snapshot_reader
+from site_bulk import BULK_FORMATS, apply_site_rows, export_csv, export_ndjson, parse_rows
+from routes.home import config_changed, get_site_registry, select_sites
+
+# Included before the home router so /api/sites/export is not taken for a site ID
+router = APIRouter(
+    prefix="/api/sites",
+    tags=["bulk"]
+)
+
+
+def apply_rows(rows: List[Any], atomic: bool, dry_run: bool) -> JSONResponse:
+    db = SessionLocal()
+    try:
+        summary = apply_site_rows(db, rows, atomic=atomic, dry_run=dry_run)
+        if summary["applied"]:
+            db.commit()
+            config_changed()
+    finally:
+        db.close()
+    return JSONResponse(content=summary)
+
+
+@router.post("/import")
+async def import_sites(request: Request, format: Optional[str] = None, atomic: bool = False, dry_run: bool = False):
+    """
+    Create, update or delete many sites from an NDJSON or CSV body.
+    The format comes from ?format= or the Content-Type header. Returns a result for every row.
+    """
+    body_format = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if body_format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(BULK_FORMATS)}")
+
+    try:
+        text = (await request.body()).decode("utf-8-sig")
+        rows = parse_rows(text, body_format)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {body_format} body: {str(e)}")
+
+    return await run_db(apply_rows, rows, atomic, dry_run)
+
+
+@router.post("/batch")
+@offload
+def batch_sites(rows: List[Any] = Body(...), atomic: bool = False, dry_run: bool = False):
+    """
+    Apply a JSON list of site changes in one transaction.
+    Each item is a site object with an optional "op" of "upsert" (default) or "delete".
+    """
+    return apply_rows(rows, atomic, dry_run)
+
+
+@router.get("/export")
+@offload
+def export_sites(format: str = "ndjson", tags: Optional[str] = None):
+    """Stream every site, or those matching a tag expression, with its current state as NDJSON or CSV."""
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(BULK_FORMATS)}")
+
+    sites = select_sites(get_site_registry(), tags)
+    states = snapshot_reader.read()
+    if format == "csv":
+        return StreamingResponse(
+            export_csv(sites, states),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="sites.csv"'}
+        )
+    return StreamingResponse(
+        export_ndjson(sites, states),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="sites.ndjson"'}
+    )
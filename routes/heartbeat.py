@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, List, Optional, Union
+from database import offload
+from heartbeat import HEARTBEAT_PROBE, HEARTBEAT_STATUSES, heartbeat_buffer
+from registry import SiteRegistry
+from routes.home import get_site_registry
+
+# Check-ins can arrive many times a second, so the config version (a stat and a
+# query) is checked at most this often. A new heartbeat site answers 404 until then.
+REGISTRY_MAX_AGE = 5
+
+router = APIRouter(
+    prefix="/api",
+    tags=["heartbeat"]
+)
+
+
+def find_heartbeat_site(registry: SiteRegistry, key: str) -> Optional[Dict[str, Any]]:
+    """Find a heartbeat site by ID or name."""
+    site = registry.resolve(key)
+    if site is None or site.get("probe") != HEARTBEAT_PROBE:
+        return None
+    return site
+
+
+@router.api_route("/heartbeat/{key}", methods=["GET", "POST"])
+@offload
+def heartbeat(key: str, status: str = "up"):
+    """
+    Record a check-in from a cron job or worker, addressed by site ID or name.
+    GET is accepted so jobs can ping with a plain curl.
+    """
+    if status not in HEARTBEAT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {', '.join(HEARTBEAT_STATUSES)}")
+
+    site = find_heartbeat_site(get_site_registry(REGISTRY_MAX_AGE), key)
+    if site is None:
+        raise HTTPException(status_code=404, detail="Heartbeat site not found")
+
+    heartbeat_buffer.ping(site["id"], status)
+    return JSONResponse(content={"ok": True})
+
+
+@router.post("/heartbeats")
+@offload
+def heartbeats(pings: List[Union[str, dict]] = Body(...)):
+    """
+    Record several check-ins at once.
+    Each item is either a site ID or name, or {"id" | "name": ..., "status": "up" | "down"}.
+    """
+    registry = get_site_registry(REGISTRY_MAX_AGE)
+    accepted = 0
+    rejected: List[Any] = []
+
+    for ping in pings:
+        if isinstance(ping, str):
+            key, status = ping, "up"
+        else:
+            key, status = ping.get("id") or ping.get("name"), ping.get("status", "up")
+
+        site = find_heartbeat_site(registry, key) if isinstance(key, str) else None
+        if site is None or status not in HEARTBEAT_STATUSES:
+            rejected.append(ping)
+            continue
+
+        heartbeat_buffer.ping(site["id"], status)
+        accepted += 1
+
+    return JSONResponse(content={"accepted": accepted, "rejected": rejected})
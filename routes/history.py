@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from database import offload
+from history_export import (
+    EXPORT_EXTENSIONS,
+    EXPORT_FORMATS,
+    EXPORT_MEDIA_TYPES,
+    build_filters,
+    export_columnar,
+    export_csv,
+    export_ndjson,
+    iter_batches,
+)
+from routes.home import get_site_registry
+
+router = APIRouter(
+    prefix="/api/history",
+    tags=["history"]
+)
+
+EXPORTERS = {
+    "csv": export_csv,
+    "ndjson": export_ndjson,
+    "columnar": export_columnar,
+}
+
+
+@router.get("/export")
+@offload
+def export_history(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    site: Optional[str] = None,
+    tags: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """
+    Stream the full status history, oldest first.
+    start/end take ISO dates, datetimes or epoch seconds. site and status take
+    comma separated lists (sites by ID or name), tags a tag expression.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    try:
+        queries = build_filters(get_site_registry(), start, end, site, tags, status)
+    except (ValueError, OverflowError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+
+    return StreamingResponse(
+        EXPORTERS[format](iter_batches(queries)),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="history.{EXPORT_EXTENSIONS[format]}"'}
+    )
@@ -1,45 +1,81 @@
 from fastapi import APIRouter, Request, HTTPException, Body
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse
-import json
-import os
+import base64
 import requests
 import time
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from database import SessionLocal
+from functools import partial
+from sqlalchemy import or_
+from database import SessionLocal, offload
 from models.models import RunnerSiteLog
+from snapshot import snapshot_reader
+from uptime import DEFAULT_SAMPLES, LATENCY_BUCKETS_MS, OUTCOMES, uptime_reader
+from registry import RegistryCache, SiteRegistry, new_site_id
+from tag_query import parse_tag_query
+from response_cache import cached_response
+from assets import AssetTemplateLoader, static_assets
+import site_store
+from probes import DEFAULT_PROBE_TYPE, HEARTBEAT_PROBE, HTTP_PROBE_TYPES, PROBE_TYPES, run_probe, trigger_met, validate_probe
+from overload import DEFAULT_PRIORITY, PRIORITIES, load_reader
+from canary import DEFAULT_CANARY_TARGETS
+from jsonlog import log
 
 templates = Jinja2Templates(directory="templates")
+templates.env.loader = AssetTemplateLoader("templates", static_assets)
 CONFIG_PATH = "data/config.json"
 
+# Sites per query when the history page is filtered by tags
+HISTORY_SITE_CHUNK = 500
+
 router = APIRouter(
     prefix="",
     tags=["home"]
 )
 
 def read_config() -> Dict[str, Any]:
-    """Read the configuration from the JSON file."""
+    """Read the settings file together with the sites and webhooks from the database."""
+    db = SessionLocal()
     try:
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-            
-        # Check if sites have tags field, add if missing
-        for site in config["sites"]:
-            if "tags" not in site:
-                site["tags"] = []
-                
-        return config
+        return site_store.load_config(db, CONFIG_PATH)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading config: {str(e)}")
+    finally:
+        db.close()
 
 def write_config(config: Dict[str, Any]) -> None:
-    """Write the configuration to the JSON file."""
+    """Write the global settings to the JSON file. Sites and webhooks are saved through site_store."""
     try:
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(config, f, indent=4)
+        site_store.write_settings(config, CONFIG_PATH)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing config: {str(e)}")
+    config_changed()
+
+def config_changed() -> None:
+    """Make the next request see a change just committed by this process."""
+    site_registry.invalidate()
+
+# Indexed view of the config, rebuilt when config.json or the change sequence moves.
+# The dicts are shared between requests and must not be modified.
+# Checking the version costs a stat and a query, so requests reuse a check up
+# to REGISTRY_MAX_AGE seconds old. Changes made through this process are seen
+# at once (config_changed), those of other workers or hand edits within that.
+REGISTRY_MAX_AGE = 2
+site_registry = RegistryCache(read_config, partial(site_store.config_version, CONFIG_PATH), max_age=REGISTRY_MAX_AGE)
+
+def get_site_registry(max_age: Optional[float] = None):
+    try:
+        return site_registry.get(max_age)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error reading config: {str(e)}")
+
+def select_sites(registry: SiteRegistry, tags: Optional[str]) -> List[Dict[str, Any]]:
+    """The sites matching a tag expression, or all sites without one."""
+    try:
+        return registry.select(tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid tag expression: {str(e)}")
 
 def format_duration(seconds):
     """Format a duration in seconds to a human-readable string."""
@@ -63,171 +99,196 @@ def format_time_ago(dt):
     
     return format_duration(seconds) + " ago"
 
+# Pages show relative times ("2m ago") and history rows the runner may not have
+# flushed yet, so a cached page is also re-rendered once this many seconds pass
+PAGE_CACHE_SECONDS = 30
+
+def page_version(registry: SiteRegistry):
+    """Content version of a page: the config version, the runner's state version and a time bucket."""
+    snapshot_reader.read()
+    return (registry.version, snapshot_reader.version, int(time.time() // PAGE_CACHE_SECONDS))
+
 @router.get("/")
-async def get_home(request: Request):
-    """Render the home page with the current configuration."""
-    config = read_config()
+@offload
+def get_home(request: Request, tags: Optional[str] = None):
+    """Render the home page with the current configuration, optionally only the sites matching a tag expression."""
+    registry = get_site_registry()
+    sites = select_sites(registry, tags)
+    version = (*page_version(registry), load_reader.overloaded())
+    return cached_response(request, f"home?{tags or ''}", version, lambda: render_home(request, registry, sites, tags))
+
+def render_home(request: Request, registry: SiteRegistry, sites: List[Dict[str, Any]], tags: Optional[str] = None):
+    config = registry.config
     
-    # Get site data from database
-    db = SessionLocal()
-    try:
-        # Get the latest status for each site by name
-        site_names = {site['name'] for site in config["sites"]}
-        all_site_logs = []
-        unknown_sites_data = []  # To store sites with no logs yet
-        
-        for name in site_names:
-            # Get the most recent log for this site
-            latest_log = db.query(RunnerSiteLog).filter(
-                RunnerSiteLog.name == name
-            ).order_by(
-                RunnerSiteLog.last_scan_time.desc()
-            ).first()
-            
-            # Include all sites, even with unknown status
-            if latest_log:
-                all_site_logs.append(latest_log)
-            else:
-                # If no log exists yet, create a temporary dictionary with default values
-                # to represent an unknown status site
-                site_url = ""
-                for site in config["sites"]:
-                    if site["name"] == name:
-                        site_url = site["url"]
-                        break
-                
-                # Create a dummy log entry for display purposes only
-                unknown_sites_data.append({
-                    "id": "temp_" + name,
-                    "name": name,
-                    "url": site_url,
-                    "status": "unknown",
-                    "response_time": "0.00s",
-                    "created_at": "Just added",
-                    "last_scan": "Pending scan",
-                    "duration": "Pending scan",
-                    "ssl_days_remaining": None
-                })
-        
-        # Create stats for the status summary
-        total_sites = len(site_names)  # Use all sites from config
-        down_sites = sum(1 for log in all_site_logs if log.status == "down")
-        slow_sites = sum(1 for log in all_site_logs if log.status == "slow") 
-        token_alert_sites = sum(1 for log in all_site_logs if log.status == "token_alert")
-        healthy_sites = sum(1 for log in all_site_logs if log.status == "up" or log.status == "healthy")
-        unknown_sites = total_sites - down_sites - slow_sites - token_alert_sites - healthy_sites
+    # Site state comes from the runner's published snapshot, not the database
+    site_states = snapshot_reader.read()
+    
+    # Get the latest status for each configured site
+    all_site_logs = []
+    unknown_sites_data = []  # To store sites with no logs yet
+    
+    for site in sites:
+        latest_log = site_states.get(site["id"])
         
-        # Prepare site logs for display
-        display_logs = []
-        for log in all_site_logs:
-            # Calculate duration
-            duration_seconds = (log.last_scan_time - log.created_at).total_seconds()
-            human_duration = format_duration(duration_seconds)
-            
-            # Format times for display
-            created_at_display = format_time_ago(log.created_at)
-            last_scan_display = format_time_ago(log.last_scan_time)
-            
-            # Get the URL from the config for this site
-            site_url = ""
-            for site in config["sites"]:
-                if site["name"] == log.name:
-                    site_url = site["url"]
-                    break
-            
-            display_logs.append({
-                "id": str(log.id),
-                "name": log.name,
-                "url": site_url,
-                "status": log.status,
-                "response_time": f"{log.response_time:.2f}s",
-                "created_at": created_at_display,
-                "last_scan": last_scan_display,
-                "duration": human_duration,
-                "ssl_days_remaining": log.ssl_days_remaining,
-                "tags": next((site["tags"] for site in config["sites"] if site["name"] == log.name), [])
+        # Include all sites, even with unknown status
+        if latest_log:
+            all_site_logs.append((site, latest_log))
+        else:
+            # Create a dummy log entry for display purposes only
+            unknown_sites_data.append({
+                "id": "temp_" + site["id"],
+                "site_id": site["id"],
+                "name": site["name"],
+                "url": site["url"],
+                "status": "unknown",
+                "response_time": "0.00s",
+                "created_at": "Just added",
+                "last_scan": "Pending scan",
+                "duration": "Pending scan",
+                "ssl_days_remaining": None,
+                "tags": site["tags"]
             })
+    
+    # Create stats for the status summary
+    total_sites = len(sites)  # Use all selected sites from config
+    down_sites = sum(1 for _, log in all_site_logs if log["status"] == "down")
+    slow_sites = sum(1 for _, log in all_site_logs if log["status"] == "slow") 
+    token_alert_sites = sum(1 for _, log in all_site_logs if log["status"] == "token_alert")
+    healthy_sites = sum(1 for _, log in all_site_logs if log["status"] == "up" or log["status"] == "healthy")
+    unknown_sites = total_sites - down_sites - slow_sites - token_alert_sites - healthy_sites
+    
+    # Prepare site logs for display
+    display_logs = []
+    for site, log in all_site_logs:
+        created_at = datetime.fromtimestamp(log["created_at"])
+        last_scan_time = datetime.fromtimestamp(log["last_scan_time"])
         
-        # Add the unknown sites to the display logs
-        display_logs.extend(unknown_sites_data)
+        # Calculate duration
+        duration_seconds = (last_scan_time - created_at).total_seconds()
+        human_duration = format_duration(duration_seconds)
         
-        # Sort by status priority (healthy, down, slow, token_alert, unknown)
-        def status_priority(log):
-            if log["status"] == "up" or log["status"] == "healthy":
-                return 0  # Healthy sites first
-            elif log["status"] == "down":
-                return 1
-            elif log["status"] == "slow":
-                return 2
-            elif log["status"] == "token_alert":
-                return 3
-            elif log["status"] == "unknown":
-                return 4  # Unknown sites last
-            else:
-                return 0  # Default to healthy for any other status
-                
-        display_logs.sort(key=status_priority)
+        # Format times for display
+        created_at_display = format_time_ago(created_at)
+        last_scan_display = format_time_ago(last_scan_time)
         
-        return templates.TemplateResponse(
-            "home.html", 
-            {
-                "request": request, 
-                "config": config,
-                "logs": display_logs,
-                "stats": {
-                    "total": total_sites,
-                    "down": down_sites,
-                    "slow": slow_sites,
-                    "expiring": token_alert_sites,
-                    "healthy": healthy_sites,
-                    "unknown": unknown_sites
-                }
+        display_logs.append({
+            "id": log["id"],
+            "site_id": site["id"],
+            "name": site["name"],
+            "url": site["url"],
+            "status": log["status"],
+            "response_time": f"{log['response_time']:.2f}s",
+            "created_at": created_at_display,
+            "last_scan": last_scan_display,
+            "duration": human_duration,
+            "ssl_days_remaining": log["ssl_days_remaining"],
+            "tags": site["tags"]
+        })
+    
+    # Add the unknown sites to the display logs
+    display_logs.extend(unknown_sites_data)
+    
+    # Sort by status priority (healthy, down, slow, token_alert, unknown)
+    def status_priority(log):
+        if log["status"] == "up" or log["status"] == "healthy":
+            return 0  # Healthy sites first
+        elif log["status"] == "down":
+            return 1
+        elif log["status"] == "slow":
+            return 2
+        elif log["status"] == "token_alert":
+            return 3
+        elif log["status"] == "unknown":
+            return 4  # Unknown sites last
+        else:
+            return 0  # Default to healthy for any other status
+            
+    display_logs.sort(key=status_priority)
+    
+    return templates.TemplateResponse(
+        "home.html", 
+        {
+            "request": request, 
+            "config": config,
+            "logs": display_logs,
+            "tag_filter": tags,
+            "load": load_reader.read(),
+            "stats": {
+                "total": total_sites,
+                "down": down_sites,
+                "slow": slow_sites,
+                "expiring": token_alert_sites,
+                "healthy": healthy_sites,
+                "unknown": unknown_sites
             }
-        )
-    finally:
-        db.close()
+        }
+    )
 
 @router.get("/sites")
-async def get_sites_page(request: Request):
+@offload
+def get_sites_page(request: Request):
     """Render the sites page with the current configuration."""
-    config = read_config()
-    return templates.TemplateResponse("sites.html", {"request": request, "config": config})
+    config = get_site_registry().config
+    return templates.TemplateResponse("sites.html", {"request": request, "config": config, "probe_types": PROBE_TYPES, "priorities": PRIORITIES})
 
 @router.get("/settings")
-async def get_settings(request: Request):
+@offload
+def get_settings(request: Request):
     """Render the settings page with the current configuration."""
-    config = read_config()
-    return templates.TemplateResponse("settings.html", {"request": request, "config": config})
+    config = get_site_registry().config
+    # The settings page edits the first webhook destination, the API manages the full list
+    webhook = config["webhooks"][0] if config["webhooks"] else None
+    canary_targets = config.get("canary_targets", DEFAULT_CANARY_TARGETS)
+    return templates.TemplateResponse("settings.html", {"request": request, "config": config, "webhook": webhook, "canary_targets": canary_targets})
 
 @router.get("/history")
-async def get_history(request: Request):
-    """Render the history page with logs from the database."""
-    config = read_config()
-    
-    # Get the names of sites currently in the configuration
-    configured_site_names = {site['name'] for site in config["sites"]}
+@offload
+def get_history(request: Request, tags: Optional[str] = None):
+    """Render the history page with logs from the database, optionally only for the sites matching a tag expression."""
+    registry = get_site_registry()
+    sites = select_sites(registry, tags)
+    return cached_response(request, f"history?{tags or ''}", page_version(registry), lambda: render_history(request, registry, sites if tags else None, tags))
+
+def recent_logs(db, sites: Optional[List[Dict[str, Any]]], limit: int):
+    """The most recent log rows, of the given sites only when sites is not None."""
+    if sites is None:
+        return db.query(RunnerSiteLog).order_by(RunnerSiteLog.last_scan_time.desc()).limit(limit).all()
+
+    # Each chunk of sites gives its own most recent rows, the newest of those are kept
+    logs = []
+    for start in range(0, len(sites), HISTORY_SITE_CHUNK):
+        chunk = sites[start:start + HISTORY_SITE_CHUNK]
+        logs.extend(db.query(RunnerSiteLog).filter(
+            or_(
+                RunnerSiteLog.site_id.in_([site["id"] for site in chunk]),
+                RunnerSiteLog.name.in_([site["name"] for site in chunk])
+            )
+        ).order_by(RunnerSiteLog.last_scan_time.desc()).limit(limit).all())
+    logs.sort(key=lambda log: log.last_scan_time, reverse=True)
+    return logs[:limit]
+
+def render_history(request: Request, registry: SiteRegistry, sites: Optional[List[Dict[str, Any]]] = None, tags: Optional[str] = None):
+    config = registry.config
     
     # Get site data from database
     db = SessionLocal()
     try:
         # Query for all logs, sorted by last_scan_time descending (most recent first)
-        all_logs = db.query(RunnerSiteLog).order_by(
-            RunnerSiteLog.last_scan_time.desc()
-        ).limit(500).all()  # Limit to 500 recent logs for performance
-        
-        # Filter logs to only include sites that are in the current configuration
-        filtered_logs = [log for log in all_logs if log.name in configured_site_names]
+        all_logs = recent_logs(db, sites, 500)  # Limit to 500 recent logs for performance
         
         # Prepare site data for the history view
         display_logs = []
+        selected_ids = {site["id"] for site in sites} if sites is not None else None
         
-        for log in filtered_logs:
-            # Get the URL from the config for this site
-            site_url = ""
-            for site in config["sites"]:
-                if site["name"] == log.name:
-                    site_url = site["url"]
-                    break
+        for log in all_logs:
+            # Only include sites that are in the current configuration. Rows written
+            # before logs carried a site ID are matched by name until the runner backfills them.
+            if log.site_id is not None:
+                site = registry.by_id.get(log.site_id)
+            else:
+                site = registry.by_name.get(log.name)
+            if site is None or (sites is not None and site["id"] not in selected_ids):
+                continue
             
             # Calculate start time by subtracting response time
             # Since response_time is in seconds and created_at is a timestamp
@@ -280,8 +341,9 @@ async def get_history(request: Request):
             # Create a log entry for display
             display_logs.append({
                 "id": str(log.id),
-                "name": log.name,
-                "url": site_url,
+                "site_id": site["id"],
+                "name": site["name"],
+                "url": site["url"],
                 "status": log.status,
                 "status_display": status_display,
                 "status_class": status_class,
@@ -292,7 +354,7 @@ async def get_history(request: Request):
                 "response_time": log.response_time,
                 "raw_start_time": start_time.timestamp(),
                 "raw_end_time": end_time.timestamp(),
-                "tags": next((site["tags"] for site in config["sites"] if site["name"] == log.name), [])
+                "tags": site["tags"]
             })
         
         # Get total count for display
@@ -304,6 +366,7 @@ async def get_history(request: Request):
                 "request": request, 
                 "config": config,
                 "logs": display_logs,
+                "tag_filter": tags,
                 "total_logs": total_logs
             }
         )
@@ -311,97 +374,159 @@ async def get_history(request: Request):
         db.close()
 
 @router.get("/api/sites")
-async def get_sites():
-    """Get all monitored sites."""
-    config = read_config()
-    return JSONResponse(content=config["sites"])
-
-@router.get("/api/sites/{site_index}")
-async def get_site(site_index: int):
-    """Get a specific site by index."""
-    try:
-        # Logging to debug
-        print(f"Get site request for index: {site_index}, type: {type(site_index)}")
-        
-        config = read_config()
-        total_sites = len(config["sites"])
-        print(f"Total sites in config: {total_sites}")
-        
-        if site_index < 0 or site_index >= len(config["sites"]):
-            print(f"Site index out of range: {site_index}")
-            raise HTTPException(status_code=404, detail=f"Site not found. Index {site_index} is out of range (0-{total_sites-1})")
-        
-        site_data = config["sites"][site_index]
-        print(f"Returning site data for index {site_index}: {site_data}")
-        return JSONResponse(content=site_data)
-    except ValueError as e:
-        print(f"Value error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Invalid site index: {site_index}. Must be an integer.")
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving site: {str(e)}")
+@offload
+def get_sites(request: Request, tags: Optional[str] = None):
+    """Get all monitored sites, or those matching a tag expression."""
+    registry = get_site_registry()
+    sites = select_sites(registry, tags)
+    return cached_response(request, f"sites?{tags or ''}", registry.version, lambda: JSONResponse(content=sites))
 
-@router.post("/api/sites")
-async def add_site(site: Dict[str, Any] = Body(...)):
-    """Add a new site to monitor."""
-    config = read_config()
-    
+@router.get("/api/runner/load")
+@offload
+def get_runner_load():
+    """Get the runner's last published load: capacity, demand per priority, lag, stretched intervals and overload state."""
+    status = load_reader.read()
+    if status is None:
+        raise HTTPException(status_code=404, detail="The runner has not published its load yet")
+    return JSONResponse(content=status)
+
+@router.get("/api/uptime")
+@offload
+def get_uptime(request: Request, samples: int = DEFAULT_SAMPLES, tags: Optional[str] = None):
+    """
+    Get the most recent probe outcomes for every configured site (or those matching a tag expression), keyed by site ID.
+    Each site's samples are base64 encoded bytes, oldest first, with the
+    outcome in the high nibble and the latency bucket in the low nibble.
+    """
+    registry = get_site_registry()
+    selected = select_sites(registry, tags)
+    uptime_reader.read()
+    samples = max(1, min(samples, DEFAULT_SAMPLES))
+    version = (registry.version, uptime_reader.version)
+    return cached_response(request, f"uptime?{samples}&{tags or ''}", version, lambda: render_uptime(selected, samples))
+
+def render_uptime(selected: List[Dict[str, Any]], samples: int):
+    rings = uptime_reader.read()
+    sites = {}
+    for site in selected:
+        ring = rings.get(site["id"], b"")
+        sites[site["id"]] = base64.b64encode(ring[-samples:]).decode("ascii")
+    
+    return JSONResponse(content={
+        "samples": samples,
+        "outcomes": OUTCOMES,
+        "latency_buckets_ms": LATENCY_BUCKETS_MS,
+        "sites": sites
+    })
+
+def validate_site(site: Dict[str, Any], db, site_id: Optional[str] = None) -> None:
+    """Validate and fill in defaults for a site submitted through the API."""
     # Validate required fields
     if not all(key in site for key in ["name", "url", "trigger"]):
         raise HTTPException(status_code=400, detail="Missing required fields")
     
+    # Names must stay unique, heartbeats and older logs are looked up by name
+    if site_store.name_taken(db, site["name"], site_id):
+        raise HTTPException(status_code=400, detail="A site with this name already exists")
+    
     # Ensure tags is present
     if "tags" not in site:
         site["tags"] = []
     
-    # Add the new site
-    config["sites"].append(site)
-    write_config(config)
-    
-    return JSONResponse(content={"message": "Site added successfully"})
+    # Ensure probe is present and usable with the trigger
+    if "probe" not in site:
+        site["probe"] = DEFAULT_PROBE_TYPE
+    probe_error = validate_probe(site["probe"], site["trigger"].get("type"))
+    if probe_error:
+        raise HTTPException(status_code=400, detail=probe_error)
+    
+    # Ensure priority is present and known
+    if not site.get("priority"):
+        site["priority"] = DEFAULT_PRIORITY
+    if site["priority"] not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
 
-@router.put("/api/sites/{site_index}")
-async def update_site(site_index: int, site: Dict[str, Any] = Body(...)):
-    """Update an existing site."""
-    config = read_config()
-    
-    if site_index < 0 or site_index >= len(config["sites"]):
+@router.get("/api/sites/{site_id}")
+@offload
+def get_site(site_id: str):
+    """Get a specific site by ID."""
+    site = get_site_registry().by_id.get(site_id)
+    if site is None:
         raise HTTPException(status_code=404, detail="Site not found")
+    return JSONResponse(content=site)
+
+@router.post("/api/sites")
+@offload
+def add_site(site: Dict[str, Any] = Body(...)):
+    """Add a new site to monitor."""
+    db = SessionLocal()
+    try:
+        validate_site(site, db)
+        
+        # IDs are always assigned here and never change, even when the site is renamed
+        site["id"] = new_site_id()
+        
+        # Add the new site
+        site_store.add_site(db, site)
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
     
-    # Validate required fields
-    if not all(key in site for key in ["name", "url", "trigger"]):
-        raise HTTPException(status_code=400, detail="Missing required fields")
-    
-    # Ensure tags is present
-    if "tags" not in site:
-        site["tags"] = []
-    
-    # Update the site
-    config["sites"][site_index] = site
-    write_config(config)
+    return JSONResponse(content={"message": "Site added successfully", "id": site["id"]})
+
+@router.put("/api/sites/{site_id}")
+@offload
+def update_site(site_id: str, site: Dict[str, Any] = Body(...)):
+    """Update an existing site."""
+    db = SessionLocal()
+    try:
+        validate_site(site, db, site_id)
+        site["id"] = site_id
+        
+        # Update the site
+        if not site_store.update_site(db, site_id, site):
+            raise HTTPException(status_code=404, detail="Site not found")
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
     
     return JSONResponse(content={"message": "Site updated successfully"})
 
-@router.delete("/api/sites/{site_index}")
-async def delete_site(site_index: int):
+@router.delete("/api/sites/{site_id}")
+@offload
+def delete_site(site_id: str):
     """Delete a site from monitoring."""
-    config = read_config()
-    
-    if site_index < 0 or site_index >= len(config["sites"]):
-        raise HTTPException(status_code=404, detail="Site not found")
-    
-    # Remove the site
-    config["sites"].pop(site_index)
-    write_config(config)
+    db = SessionLocal()
+    try:
+        # Remove the site
+        if not site_store.delete_site(db, site_id):
+            raise HTTPException(status_code=404, detail="Site not found")
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
     
     return JSONResponse(content={"message": "Site deleted successfully"})
 
+@router.get("/api/config/export")
+@offload
+def export_config():
+    """Export settings, webhooks and sites as a single config.json file."""
+    return JSONResponse(
+        content=read_config(),
+        headers={"Content-Disposition": 'attachment; filename="config.json"'}
+    )
+
 @router.post("/api/settings")
-async def update_settings(settings: Dict[str, Any] = Body(...)):
+@offload
+def update_settings(settings: Dict[str, Any] = Body(...)):
     """Update global settings."""
-    print("Received settings update:", settings)
-    config = read_config()
-    print("Current config:", config)
+    try:
+        config = site_store.read_settings(CONFIG_PATH)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading config: {str(e)}")
     
     # Update settings
     if "default_scan_interval" in settings:
@@ -416,132 +541,141 @@ async def update_settings(settings: Dict[str, Any] = Body(...)):
         config["attempt_before_trigger"] = settings["attempt_before_trigger"]
     if "include_error_debugging" in settings:
         config["include_error_debugging"] = settings["include_error_debugging"]
-        print("Updated include_error_debugging to:", config["include_error_debugging"])
+    if "canary_targets" in settings:
+        targets = settings["canary_targets"]
+        if not isinstance(targets, list) or not all(isinstance(target, str) and target.strip() for target in targets):
+            raise HTTPException(status_code=400, detail="canary_targets must be a list of URLs or host:port pairs")
+        config["canary_targets"] = [target.strip() for target in targets]
+    if "scan_lag_budget" in settings:
+        budget = settings["scan_lag_budget"]
+        if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0:
+            raise HTTPException(status_code=400, detail="scan_lag_budget must be a positive number of seconds")
+        config["scan_lag_budget"] = budget
+    if "http2_probes" in settings:
+        if not isinstance(settings["http2_probes"], bool):
+            raise HTTPException(status_code=400, detail="http2_probes must be true or false")
+        config["http2_probes"] = settings["http2_probes"]
     
     write_config(config)
-    print("Updated config:", config)
+    log.info("settings_updated", keys=sorted(settings))
     
     return JSONResponse(content={"message": "Settings updated successfully"})
 
-@router.get("/api/webhooks")
-async def get_webhooks():
-    """Get all webhooks."""
-    config = read_config()
-    return JSONResponse(content=config["webhooks"])
-
-@router.get("/api/webhooks/{webhook_index}")
-async def get_webhook(webhook_index: int):
-    """Get a specific webhook by index."""
-    config = read_config()
-    
-    # Since webhooks is now a single object, not an array
-    if webhook_index != 0:
-        raise HTTPException(status_code=404, detail="Webhook not found")
-    
-    return JSONResponse(content=config["webhooks"])
-
-@router.post("/api/webhooks")
-async def add_webhook(webhook: Dict[str, Any] = Body(...)):
-    """Add a new webhook."""
-    config = read_config()
-    
-    # Validate required fields
+def check_webhook(webhook: Dict[str, Any]) -> None:
+    """Validate a webhook destination submitted through the API and fill in defaults."""
     if not all(key in webhook for key in ["type", "url"]):
         raise HTTPException(status_code=400, detail="Missing required fields")
     
     # Validate webhook URL
-    url = webhook["url"].strip()
-    if url:
+    url = str(webhook["url"]).strip()
+    parsed_url = requests.utils.urlparse(url)
+    if not all([parsed_url.scheme, parsed_url.netloc]):
+        raise HTTPException(status_code=400, detail="Invalid URL format")
+    
+    # Ensure type matches URL domain
+    domain = parsed_url.netloc.lower()
+    webhook_type = str(webhook["type"]).lower()
+    if webhook_type not in site_store.WEBHOOK_TYPES:
+        raise HTTPException(status_code=400, detail="Only Discord and Slack webhooks are supported")
+    if webhook_type == "discord" and "discord.com" not in domain:
+        raise HTTPException(status_code=400, detail="URL does not match Discord webhook format")
+    if webhook_type == "slack" and "hooks.slack.com" not in domain:
+        raise HTTPException(status_code=400, detail="URL does not match Slack webhook format")
+    
+    # Routing: a tag expression and a list of statuses, empty for everything
+    tags = webhook.get("tags") or ""
+    if not isinstance(tags, str):
+        raise HTTPException(status_code=400, detail="tags must be a tag expression")
+    if tags.strip():
         try:
-            parsed_url = requests.utils.urlparse(url)
-            if not all([parsed_url.scheme, parsed_url.netloc]):
-                raise HTTPException(status_code=400, detail="Invalid URL format")
-            
-            # Validate webhook type
-            domain = parsed_url.netloc.lower()
-            webhook_type = webhook["type"].lower()
-            
-            # Ensure type matches URL domain
-            if webhook_type == "discord" and "discord.com" not in domain:
-                raise HTTPException(status_code=400, detail="URL does not match Discord webhook format")
-            elif webhook_type == "slack" and "hooks.slack.com" not in domain:
-                raise HTTPException(status_code=400, detail="URL does not match Slack webhook format")
-            elif webhook_type not in ["discord", "slack"]:
-                raise HTTPException(status_code=400, detail="Only Discord and Slack webhooks are supported")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid webhook URL: {str(e)}")
-    
-    # Ensure there's an 'enabled' field
+            parse_tag_query(tags)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid tag expression: {str(e)}")
+    statuses = webhook.get("statuses") or []
+    if not isinstance(statuses, list) or any(status not in site_store.WEBHOOK_STATUSES for status in statuses):
+        raise HTTPException(status_code=400, detail=f"statuses must be a list of: {', '.join(site_store.WEBHOOK_STATUSES)}")
+    
+    webhook.update(url=url, type=webhook_type, tags=tags.strip(), statuses=statuses)
     if "enabled" not in webhook:
         webhook["enabled"] = True
-    
-    # Replace the existing webhook with the new one
-    config["webhooks"] = webhook
-    write_config(config)
-    
-    return JSONResponse(content={"message": "Webhook added successfully"})
 
-@router.put("/api/webhooks/{webhook_index}")
-async def update_webhook(webhook_index: int, webhook: Dict[str, Any] = Body(...)):
-    """Update an existing webhook."""
-    config = read_config()
-    
-    # Since webhooks is now a single object, not an array
-    if webhook_index != 0:
+def find_webhook(db, webhook_id: int) -> Dict[str, Any]:
+    """A webhook destination by ID, read from the database so an update merges into its current fields."""
+    webhook = site_store.get_webhook(db, webhook_id)
+    if webhook is None:
         raise HTTPException(status_code=404, detail="Webhook not found")
-    
-    # Validate required fields
-    if not all(key in webhook for key in ["type", "url"]):
-        raise HTTPException(status_code=400, detail="Missing required fields")
-    
-    # Validate webhook URL if not empty
-    url = webhook["url"].strip()
-    if url:
-        try:
-            parsed_url = requests.utils.urlparse(url)
-            if not all([parsed_url.scheme, parsed_url.netloc]):
-                raise HTTPException(status_code=400, detail="Invalid URL format")
-            
-            # Validate webhook type
-            domain = parsed_url.netloc.lower()
-            webhook_type = webhook["type"].lower()
-            
-            # Ensure type matches URL domain
-            if webhook_type == "discord" and "discord.com" not in domain:
-                raise HTTPException(status_code=400, detail="URL does not match Discord webhook format")
-            elif webhook_type == "slack" and "hooks.slack.com" not in domain:
-                raise HTTPException(status_code=400, detail="URL does not match Slack webhook format")
-            elif webhook_type not in ["discord", "slack"]:
-                raise HTTPException(status_code=400, detail="Only Discord and Slack webhooks are supported")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid webhook URL: {str(e)}")
-    
-    # Update the webhook
-    config["webhooks"] = webhook
-    write_config(config)
-    
-    return JSONResponse(content={"message": "Webhook updated successfully"})
+    return webhook
 
-@router.delete("/api/webhooks/{webhook_index}")
-async def delete_webhook(webhook_index: int):
-    """Delete a webhook."""
-    config = read_config()
-    
-    # Since webhooks is now a single object, not an array
-    if webhook_index != 0:
-        raise HTTPException(status_code=404, detail="Webhook not found")
+@router.get("/api/webhooks")
+@offload
+def get_webhooks():
+    """Get all webhook destinations, in order."""
+    config = get_site_registry().config
+    return JSONResponse(content=config["webhooks"])
+
+@router.get("/api/webhooks/{webhook_id}")
+@offload
+def get_webhook(webhook_id: int):
+    """Get a specific webhook destination by ID."""
+    db = SessionLocal()
+    try:
+        return JSONResponse(content=find_webhook(db, webhook_id))
+    finally:
+        db.close()
+
+@router.post("/api/webhooks")
+@offload
+def add_webhook(webhook: Dict[str, Any] = Body(...)):
+    """Add a webhook destination after the existing ones."""
+    check_webhook(webhook)
+    db = SessionLocal()
+    try:
+        webhook_id = site_store.add_webhook(db, webhook)
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
+    return JSONResponse(content={"message": "Webhook added successfully", "id": webhook_id})
+
+@router.put("/api/webhooks/{webhook_id}")
+@offload
+def update_webhook(webhook_id: int, webhook: Dict[str, Any] = Body(...)):
+    """Update a webhook destination. Fields left out keep their values."""
+    db = SessionLocal()
+    try:
+        webhook = {**find_webhook(db, webhook_id), **webhook}
+        check_webhook(webhook)
+        if not site_store.update_webhook(db, webhook_id, webhook):
+            raise HTTPException(status_code=404, detail="Webhook not found")
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
     
-    # Clear webhook by setting to empty dict
-    config["webhooks"] = {"type": "", "url": "", "enabled": False}
-    write_config(config)
+    return JSONResponse(content={"message": "Webhook updated successfully", "id": webhook_id})
+
+@router.delete("/api/webhooks/{webhook_id}")
+@offload
+def delete_webhook(webhook_id: int):
+    """Delete a webhook destination. The others keep their IDs."""
+    db = SessionLocal()
+    try:
+        if not site_store.delete_webhook(db, webhook_id):
+            raise HTTPException(status_code=404, detail="Webhook not found")
+        db.commit()
+        config_changed()
+    finally:
+        db.close()
     
     return JSONResponse(content={"message": "Webhook deleted successfully"})
 
 @router.post("/api/test-site")
-async def test_site(site_data: Dict[str, Any] = Body(...)):
+def test_site(site_data: Dict[str, Any] = Body(...)):
     """
     Test a site based on provided URL and trigger conditions.
     Returns response data for display in the UI.
+    A plain def, so FastAPI runs it on its worker threads: the probe blocks on
+    the network and should not hold one of the database threads either.
     """
     try:
         # Extract required fields
@@ -549,28 +683,36 @@ async def test_site(site_data: Dict[str, Any] = Body(...)):
         trigger_type = site_data.get("trigger_type")
         trigger_value = site_data.get("trigger_value")
         timeout = site_data.get("timeout", 10)  # Default to 10 seconds timeout
+        probe_type = site_data.get("probe") or DEFAULT_PROBE_TYPE
         
         # Validate required fields
         if not url or not trigger_type or not trigger_value:
             raise HTTPException(status_code=400, detail="Missing required fields")
         
+        probe_error = validate_probe(probe_type, trigger_type)
+        if probe_error:
+            raise HTTPException(status_code=400, detail=probe_error)
+        
         # Load config to get default timeout if needed
-        config = read_config()
+        config = get_site_registry().config
         if timeout == 0:
             timeout = config["default_timeout"]
             
         # Make the request to the site
-        result = await test_site_request(url, timeout, trigger_type, trigger_value, site_data)
+        if probe_type == DEFAULT_PROBE_TYPE:
+            result = test_site_request(url, timeout, trigger_type, trigger_value, site_data)
+        else:
+            result = test_site_probe(probe_type, url, timeout, trigger_type, trigger_value)
         
         return JSONResponse(content=result)
     except Exception as e:
-        print(f"Error testing site: {str(e)}")
+        log.warning("site_test_failed", error=str(e))
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
 
-async def test_site_request(url: str, timeout: int, trigger_type: str, trigger_value: str, site_data: Dict[str, Any]):
+def test_site_request(url: str, timeout: int, trigger_type: str, trigger_value: str, site_data: Dict[str, Any]):
     """
     Makes a request to the site and checks if the trigger condition is met.
     Returns response data including success status, timing, and response details.
@@ -640,8 +782,42 @@ async def test_site_request(url: str, timeout: int, trigger_type: str, trigger_v
             "body": f"Error connecting to site: {str(e)}"
         }
 
+def test_site_probe(probe_type: str, url: str, timeout: int, trigger_type: str, trigger_value: str):
+    """
+    Runs one of the lightweight probes against the site and checks the trigger.
+    Returns the same shape as test_site_request so the UI can display either.
+    """
+    if probe_type == HEARTBEAT_PROBE:
+        return {
+            "success": False,
+            "error": "Heartbeat sites are not probed",
+            "response_time": 0,
+            "status_code": None,
+            "content_type": None,
+            "body": "Heartbeat sites are marked up by check-ins. Send GET or POST requests to /api/heartbeat/{site name} from the job."
+        }
+    
+    probe_result = run_probe(probe_type, url, timeout)
+    
+    if probe_type in HTTP_PROBE_TYPES and probe_result.reachable:
+        body = f"{probe_type.upper()} probe returned {probe_result.status_code} (body not downloaded)"
+    else:
+        body = probe_result.detail
+    
+    result = {
+        "success": trigger_met(probe_result, trigger_type, trigger_value),
+        "response_time": round(probe_result.response_time * 1000, 2),  # Convert to ms
+        "status_code": probe_result.status_code,
+        "content_type": probe_result.content_type,
+        "body": body,
+    }
+    if not probe_result.reachable:
+        result["error"] = probe_result.detail
+    
+    return result
+
 @router.post("/api/validate-webhook")
-async def validate_webhook(webhook_data: Dict[str, Any] = Body(...)):
+def validate_webhook(webhook_data: Dict[str, Any] = Body(...)):
     """
     Validate a webhook URL to ensure it's either Discord or Slack.
     Returns the detected webhook type or an error.
@@ -678,9 +854,11 @@ async def validate_webhook(webhook_data: Dict[str, Any] = Body(...)):
     return JSONResponse(content={"valid": True, "type": webhook_type})
 
 @router.post("/api/test-webhook")
-async def test_webhook(webhook_data: Dict[str, Any] = Body(...)):
+def test_webhook(webhook_data: Dict[str, Any] = Body(...)):
     """
     Test a webhook by sending a notification.
+    A plain def like test_site: the delivery waits on the network, on one of
+    FastAPI's worker threads.
     """
     url = webhook_data.get("url", "").strip()
     webhook_type = webhook_data.get("type", "").lower()
@@ -710,15 +888,15 @@ async def test_webhook(webhook_data: Dict[str, Any] = Body(...)):
     # Send test notification
     try:
         if webhook_type == "discord":
-            await send_discord_test_notification(url)
+            send_discord_test_notification(url)
         elif webhook_type == "slack":
-            await send_slack_test_notification(url)
+            send_slack_test_notification(url)
         
         return JSONResponse(content={"success": True, "message": "Test notification sent"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send test notification: {str(e)}")
 
-async def send_discord_test_notification(webhook_url: str):
+def send_discord_test_notification(webhook_url: str):
     """Send a test notification to Discord webhook that matches the format used by the runner"""
     # Determine color (green for test)
     color = 0x00FF00
@@ -760,7 +938,7 @@ async def send_discord_test_notification(webhook_url: str):
     if response.status_code < 200 or response.status_code >= 300:
         raise Exception(f"Discord webhook returned status code {response.status_code}")
 
-async def send_slack_test_notification(webhook_url: str):
+def send_slack_test_notification(webhook_url: str):
     """Send a test notification to Slack webhook that matches the format used by the runner"""
     # Determine color (green for test)
     hex_color = "#00FF00"
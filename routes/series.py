@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional
+import time
+from database import offload
+from downsample import DOWNSAMPLE_METHODS
+from history_export import parse_time
+from samples import load_series
+from uptime import OUTCOMES
+from routes.home import get_site_registry
+
+router = APIRouter(
+    prefix="",
+    tags=["series"]
+)
+
+DEFAULT_RANGE_SECONDS = 86400
+DEFAULT_POINTS = 1000
+MIN_POINTS = 3
+MAX_POINTS = 10000
+
+
+@router.get("/api/sites/{site_id}/series")
+@offload
+def get_site_series(
+    site_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = DEFAULT_POINTS,
+    method: str = "lttb"
+):
+    """
+    Get a site's response times and probe outcomes between start and end, reduced to at most `points` points.
+    start/end take ISO dates, datetimes or epoch seconds and default to the last 24 hours.
+    method is "lttb" (keeps the shape of the line) or "minmax" (keeps every bucket's extremes).
+    Each point's outcome is the worst one among the samples it stands for.
+    """
+    site = get_site_registry().resolve(site_id)
+    if site is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    if method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid method. Must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+
+    try:
+        end_time = parse_time(end, end_of_day=True).timestamp() if end else time.time()
+        start_time = parse_time(start).timestamp() if start else end_time - DEFAULT_RANGE_SECONDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {str(e)}")
+    points = max(MIN_POINTS, min(points, MAX_POINTS))
+
+    return JSONResponse(content={
+        "id": site["id"],
+        "name": site["name"],
+        "start": start_time,
+        "end": end_time,
+        "method": method,
+        "outcomes": OUTCOMES,
+        **load_series(site["id"], start_time, end_time, points, method),
+    })
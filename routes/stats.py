@@ -0,0 +1,109 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional, Tuple
+from datetime import date, timedelta
+from database import SessionLocal, offload
+from snapshot import snapshot_reader
+from daily_stats import add_running_periods, load_totals, summarize
+from routes.home import get_site_registry, select_sites
+
+router = APIRouter(
+    prefix="",
+    tags=["stats"]
+)
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 3660
+
+
+def day_range(days: int, start: Optional[str], end: Optional[str]) -> Tuple[str, str]:
+    """Return the first and last day of the report, both inclusive, as ISO dates."""
+    try:
+        end_day = date.fromisoformat(end) if end else date.today()
+        start_day = date.fromisoformat(start) if start else end_day - timedelta(days=max(1, min(days, MAX_DAYS)) - 1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start_day.isoformat(), end_day.isoformat()
+
+
+@router.get("/api/stats")
+@offload
+def get_stats(
+    days: int = DEFAULT_DAYS,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    site: Optional[str] = None,
+    tags: Optional[str] = None
+):
+    """
+    Get availability, incidents, MTTR and MTBF for every site over a range of days.
+    The range is the last `days` days, or start/end as ISO dates (inclusive).
+    site narrows the report to one site (by ID or name), tags to the sites matching a tag expression.
+    """
+    start_day, end_day = day_range(days, start, end)
+    registry = get_site_registry()
+    sites = select_sites(registry, tags)
+    if site is not None:
+        found = registry.resolve(site)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Site not found")
+        sites = [s for s in sites if s["id"] == found["id"]]
+
+    db = SessionLocal()
+    try:
+        # A selection only reads its own sites' rows
+        selected_ids = None if sites is registry.sites else [s["id"] for s in sites]
+        totals = load_totals(db, start_day, end_day, site_ids=selected_ids)
+    finally:
+        db.close()
+    states = snapshot_reader.read()
+    add_running_periods(totals, (states[s["id"]] for s in sites if s["id"] in states), start_day, end_day)
+
+    return JSONResponse(content={
+        "start": start_day,
+        "end": end_day,
+        "sites": [
+            {"id": s["id"], "name": s["name"], **summarize(totals.get(s["id"], {}))}
+            for s in sites
+        ]
+    })
+
+
+@router.get("/api/sites/{site_id}/stats")
+@offload
+def get_site_stats(
+    site_id: str,
+    days: int = DEFAULT_DAYS,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """Get the same figures as /api/stats for one site, for the whole range and for each day."""
+    site = get_site_registry().resolve(site_id)
+    if site is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    start_day, end_day = day_range(days, start, end)
+
+    db = SessionLocal()
+    try:
+        daily = load_totals(db, start_day, end_day, site["id"])
+    finally:
+        db.close()
+    state = snapshot_reader.read().get(site["id"])
+    if state is not None:
+        add_running_periods(daily, [state], start_day, end_day, by_day=True)
+
+    total = {}
+    for counters in daily.values():
+        for column, amount in counters.items():
+            total[column] = total.get(column, 0) + (amount or 0)
+
+    return JSONResponse(content={
+        "id": site["id"],
+        "name": site["name"],
+        "start": start_day,
+        "end": end_day,
+        **summarize(total),
+        "days": [{"day": day, **summarize(daily[day])} for day in sorted(daily)]
+    })
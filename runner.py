@@ -1,17 +1,47 @@
-from typing import Dict, Any
-import json
+from typing import Any, Dict, List, Optional
+from functools import partial
 import time
-import requests
+import signal
 import socket
+import threading
 import ssl
-from datetime import datetime, timedelta
-from database import engine, SessionLocal
-from sqlalchemy.orm import Session
+from datetime import datetime
+from database import engine, SessionLocal, upgrade_schema
 import models.models as models
+from probes import HEARTBEAT_PROBE, ProbeResult, get_probe_type, run_probe, trigger_met
+from heartbeat import HeartbeatTracker
+from state_store import SiteState, StateStore, backfill_site_ids
+from daily_stats import backfill_if_empty
+from registry import RegistryCache
+from site_store import config_version, import_config_file, load_config
+from snapshot import publish_snapshot
+from uptime import OUTCOME_DOWN, OUTCOME_SLOW, OUTCOME_UP, UptimeRecorder
+from samples import SampleLog
+from canary import CANARY_TIMEOUT, DEFAULT_CANARY_TARGETS, ConnectivityCanary
+from notifications import Event, NotificationRouter
+from profiler import RUNNER_PROFILE_REQUEST, ProfileControl
+from overload import DEFAULT_SCAN_LAG_BUDGET, LoadModel, site_priority
+from multiplex import MultiplexProber
+from state_engine import CHANGE, KEEP, Thresholds, decide
+from jsonlog import PeriodicSummary, log
 
 CONFIG_PATH = "data/config.json"
 
+STATUS_COLORS = {
+    "up": 0x00FF00,
+    "down": 0xFF0000,
+    "slow": 0xFFFF00,
+    "token_alert": 0x0000FF
+}
+
+# More state changes than this in one pass are sent to a destination as a single summary
+ALERT_STORM_THRESHOLD = 10
+ALERT_SUMMARY_SITES = 25
+MESSAGE_SEPARATOR = "------------------------------------------------------"
+
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema()
+import_config_file(CONFIG_PATH)
 
 def get_db():
     db = SessionLocal()
@@ -22,50 +52,36 @@ def get_db():
         
 
 def read_config() -> Dict[str, Any]:
-    """Read the configuration from the JSON file."""
+    """Read the settings file together with the sites and webhooks from the database."""
+    db = SessionLocal()
     try:
-        with open(CONFIG_PATH, 'r') as f:
-            return json.load(f)
+        return load_config(db, CONFIG_PATH)
     except Exception as e:
         raise Exception(f"Error reading config: {str(e)}")
-    
-    
-def get_runner_site_log(name: str, db: Session) -> models.RunnerSiteLog:
-    site_log = db.query(models.RunnerSiteLog).filter(
-        models.RunnerSiteLog.name == name
-    ).order_by(
-        models.RunnerSiteLog.last_scan_time.desc()
-    ).first()
-    
-    if site_log is None:
-        # Create an instance of RunnerSiteLog
-        site_log = models.RunnerSiteLog(
-            name=name,
-            status="unknown",
-            response_time=0,
-            attempt_count=0,
-            created_at=datetime.now(),
-            last_scan_time=datetime.now(),
-            ssl_days_remaining=0
-        )
-        db.add(site_log)
-        db.commit()
-        db.refresh(site_log)
-        print(f"Created new site log for {site_log.name}")
-        
-    return site_log
+    finally:
+        db.close()
 
 
-def basic_site_scraper(url: str, timeout: int):
-    try:
-        start_time = time.time()
-        response = requests.get(url, timeout=timeout)
-        response_time = time.time() - start_time
-        return response, response_time
-    except Exception as e:
-        return None
-    
+# Sites are only reloaded when the settings file or the change sequence moves
+site_registry = RegistryCache(read_config, partial(config_version, CONFIG_PATH))
+
+# Webhook destinations, kept in step with the registry at the start of every pass
+notifier = NotificationRouter()
+
+# Profiling windows, requested with SIGUSR1 or by creating RUNNER_PROFILE_REQUEST
+profile_control = ProfileControl("runner", RUNNER_PROFILE_REQUEST)
+
+# Due probes that share an origin, sent together over HTTP/2 when http2_probes is on
+multiplexer = MultiplexProber()
 
+# Per site lines are debug level, at info the runner logs what its passes did once a minute
+pass_summary = PeriodicSummary(log, "runner_summary")
+
+# Passes sleep by waiting on this (never set) event rather than time.sleep, which
+# profiles recognise as idle instead of counting as time spent in runner()
+idle = threading.Event()
+    
+    
 def ssl_check(url: str):
     try:
         hostname = url.split("://")[1].split("/")[0]
@@ -84,283 +100,455 @@ def ssl_check(url: str):
 
 
 def update_last_scan_time(
-    site_log: models.RunnerSiteLog,
-    db: Session,
+    site_state: SiteState,
+    store: StateStore,
     response_time: float=0.0,
     ssl_days_remaining: int = None
 ):
-    site_log.last_scan_time = datetime.now()
-    site_log.attempt_count = 0
-    site_log.response_time = response_time
-    site_log.ssl_days_remaining = ssl_days_remaining
+    site_state.last_scan_time = time.time()
+    site_state.attempt_count = 0
+    site_state.response_time = response_time
+    site_state.ssl_days_remaining = ssl_days_remaining
     
-    db.commit()
-    db.refresh(site_log)
-    print(f"Updated last scan time for {site_log.name}")
+    store.save(site_state)
+    log.debug("scan_kept", site=site_state.name, response_time=response_time)
     return
     
 
 def change_state(
-    site_log: models.RunnerSiteLog,
+    site_state: SiteState,
+    url: str,
     new_status: str,
     response_time: float,
-    db: Session,
+    store: StateStore,
     webhook_state: bool,
-    ssl_days_remaining: int = 0
+    ssl_days_remaining: int = 0,
+    alerts: Optional[List[Dict[str, Any]]] = None
 ):
-    site_log.last_scan_time = datetime.now()
-    db.commit()
-    db.refresh(site_log)
-    
-    new_site_log = models.RunnerSiteLog(
-        name=site_log.name,
-        status=new_status,
-        response_time=response_time,
-        attempt_count=0,
-        created_at=datetime.now(),
-        last_scan_time=datetime.now(),
-        ssl_days_remaining=ssl_days_remaining
-    )
-    
-    db.add(new_site_log)
-    db.commit()
-    db.refresh(new_site_log)
+    previous_created_at = site_state.created_at
+    store.change_status(site_state, new_status, response_time, ssl_days_remaining)
     
     if webhook_state:
-        previous_state_duration = (datetime.now() - site_log.created_at).total_seconds()
-        
-        trigger_webhook(
-            site_log.name,
-            site_log.url,
-            new_status,
-            response_time,
-            ssl_days_remaining,
-            previous_state_duration
-        )
-    print(f"Changed state for {site_log.name} to {new_status}")
+        alert = {
+            "site_id": site_state.site_id,
+            "name": site_state.name,
+            "url": url,
+            "status": new_status,
+            "response_time": response_time,
+            "ssl_days_remaining": ssl_days_remaining,
+            "previous_state_duration": time.time() - previous_created_at
+        }
+        # Alerts collected during a pass are sent together at its end
+        if alerts is None:
+            send_alerts([alert])
+        else:
+            alerts.append(alert)
+    log.info("state_changed", site=site_state.name, status=new_status, response_time=response_time)
     return
 
 
-def trigger_webhook(
-    name: str,
-    url: str,
-    status: str,
-    response_time: float = 0.0,
-    ssl_days_remaining: int = 0,
-    previous_state_duration: int = 0,
-    log: str = ""
-):
-    config = read_config()
-    include_error_debugging = config['include_error_debugging']
-    webhook_type = config['webhooks']['type']
-    webhook_url = config['webhooks']['url']
-    title = f'{name} - {status}'
+def alert_event(alert: Dict[str, Any]) -> Event:
+    """Build the notification for one site's state change."""
+    include_error_debugging = site_registry.get().config['include_error_debugging']
+    lines = [
+        f"Site: {alert['name']}",
+        f"URL: {alert['url']}",
+        f"Status: {alert['status']}"
+    ]
+    if alert['response_time'] > 0:
+        lines.append(f"Response Time: {alert['response_time']}")
+    if alert['ssl_days_remaining'] and alert['ssl_days_remaining'] > 0:
+        lines.append(f"SSL Days Remaining: {alert['ssl_days_remaining']}")
+    lines += [MESSAGE_SEPARATOR, f"Previous State Duration: {alert['previous_state_duration']}"]
+    if alert.get('log') and include_error_debugging:
+        lines += [MESSAGE_SEPARATOR, f"Log: {alert['log']}"]
     
-    if status == "up":
-        color = 0x00FF00
-    elif status == "down":
-        color = 0xFF0000
-    elif status == "slow":
-        color = 0xFFFF00
-    elif status == "token_alert":
-        color = 0x0000FF
-        
-    message = f"""
-        Site: {name}
-        URL: {url}
-        Status: {status}
+    title = f"{alert['name']} - {alert['status']}"
+    return Event(title, STATUS_COLORS.get(alert['status'], 0x808080), "\n".join(lines))
+
+
+def summary_event(alerts: List[Dict[str, Any]]) -> Event:
+    """Build one notification standing in for many state changes."""
+    counts: Dict[str, int] = {}
+    for alert in alerts:
+        counts[alert["status"]] = counts.get(alert["status"], 0) + 1
+    # The summary takes the colour of the worst status in it
+    worst = next((status for status in ("down", "token_alert", "slow") if status in counts), "up")
+    
+    lines = [f"{status}: {count}" for status, count in sorted(counts.items())]
+    lines.append(MESSAGE_SEPARATOR)
+    lines += [f"{alert['name']} - {alert['status']}" for alert in alerts[:ALERT_SUMMARY_SITES]]
+    if len(alerts) > ALERT_SUMMARY_SITES:
+        lines.append(f"... and {len(alerts) - ALERT_SUMMARY_SITES} more")
+    return Event(f"{len(alerts)} sites changed state", STATUS_COLORS[worst], "\n".join(lines))
+
+
+def send_alerts(alerts: List[Dict[str, Any]]) -> None:
+    """
+    Send state changes to the destinations they are routed to. A destination
+    receiving too many to read one by one gets a single summary instead.
+    """
+    # Each alert is rendered once, whichever destinations it goes to
+    events: Dict[int, Event] = {}
+    for route, routed in notifier.route(alerts):
+        if len(routed) > ALERT_STORM_THRESHOLD:
+            notifier.send(route, summary_event(routed))
+            continue
+        for alert in routed:
+            event = events.get(id(alert))
+            if event is None:
+                event = events[id(alert)] = alert_event(alert)
+            notifier.send(route, event)
+
+
+def check_heartbeat(
+    site: Dict[str, Any],
+    site_state: SiteState,
+    store: StateStore,
+    uptime: UptimeRecorder,
+    heartbeats: HeartbeatTracker,
+    scan_interval: float,
+    grace: float,
+    webhook_state: bool,
+    alerts: List[Dict[str, Any]],
+    online_since: float = 0
+) -> float:
+    """
+    Evaluate a heartbeat site against its deadline and return the seconds
+    until the deadline, so the runner wakes up in time to catch a missed ping.
     """
+    last_ping, reported_status = heartbeats.pings.get(site['id'], (None, None))
+    now = time.time()
     
-    if response_time > 0:
-        message += f"\nResponse Time: {response_time}"
-        
-    if ssl_days_remaining > 0:
-        message += f"\nSSL Days Remaining: {ssl_days_remaining}"
+    # Sites that never checked in get one interval from when monitoring started,
+    # and every site gets one from when the runner got its network back
+    deadline = max(last_ping or site_state.created_at, online_since) + scan_interval + grace
     
-    message += f"\n------------------------------------------------------\nPrevious State Duration: {previous_state_duration}"
+    if now > deadline or reported_status == "down":
+        new_status = "down"
+        outcome = OUTCOME_DOWN
+    elif last_ping is not None:
+        new_status = "up"
+        outcome = OUTCOME_UP
+    else:
+        return deadline - now
     
-    if log and include_error_debugging:
-        message += f"\n------------------------------------------------------\nLog: {log}"
+    if site_state.status != new_status:
+        change_state(site_state, site['url'], new_status, 0.0, store, webhook_state, alerts=alerts)
+        uptime.record(site['id'], outcome, 0.0)
+    elif last_ping is not None and last_ping > site_state.last_scan_time:
+        # A new ping arrived since the last pass
+        update_last_scan_time(site_state, store, 0.0, 0)
+        uptime.record(site['id'], outcome, 0.0)
     
-    if webhook_type == "discord":
-        trigger_discord_webhook(webhook_url, color, message, title)
-    elif webhook_type == "slack":
-        trigger_slack_webhook(webhook_url, color, message, title)
+    if now > deadline:
+        return scan_interval
+    return deadline - now
 
 
-def trigger_discord_webhook(webhook_url: str, color: int, message: str, title: str):
-    """Send a webhook notification to Discord"""
+def publish_state(store: StateStore):
+    """Publish a snapshot for the web process if anything changed since the last one."""
+    if store.version == store.published_version:
+        return
     try:
-        # Create Discord webhook payload
-        payload = {
-            "embeds": [
-                {
-                    "title": title,
-                    "description": message,
-                    "color": color,
-                    "timestamp": datetime.now().isoformat()
-                }
-            ]
-        }
-        
-        # Send webhook request
-        response = requests.post(
-            webhook_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=5
-        )
-        
-        # Check if request was successful
-        if response.status_code < 200 or response.status_code >= 300:
-            print(f"Failed to send Discord webhook: {response.status_code} {response.text}")
+        publish_snapshot(store, store.version)
+        store.published_version = store.version
     except Exception as e:
-        print(f"Error sending Discord webhook: {str(e)}")
+        log.error("snapshot_publish_failed", error=str(e))
 
 
-def trigger_slack_webhook(webhook_url: str, color: int, message: str, title: str):
-    """Send a webhook notification to Slack"""
-    try:
-        # Convert int color to hex string for Slack
-        hex_color = f"#{color:06x}"
-        
-        # Create Slack webhook payload
-        payload = {
-            "attachments": [
-                {
-                    "color": hex_color,
-                    "title": title,
-                    "text": message,
-                    "ts": time.time()
-                }
-            ]
-        }
-        
-        # Send webhook request
-        response = requests.post(
-            webhook_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=5
+def notify_connectivity(canary: ConnectivityCanary) -> None:
+    """
+    Report the runner losing or getting back its network, once instead of once
+    per site. Nothing can be delivered while the network is down, so the loss
+    is only logged and the notification waits until it comes back.
+    """
+    if not canary.online:
+        log.warning("connectivity_lost", message="No reference target is reachable. Sites are not checked until one is.")
+        return
+    duration = canary.restored_at - canary.lost_at
+    lost_at = datetime.fromtimestamp(canary.lost_at).strftime("%Y-%m-%d %H:%M:%S")
+    message = f"Lost at {lost_at}, offline for {duration:.0f} seconds. Sites were not checked and their states were left unchanged meanwhile."
+    log.warning("connectivity_restored", message=message)
+    notifier.broadcast(Event("Runner connectivity restored", STATUS_COLORS["up"], message))
+
+
+def prefetch_probes(sites: List[Dict[str, Any]], store: StateStore, config: Dict[str, Any], load: LoadModel) -> Dict[str, ProbeResult]:
+    """
+    Probe the due sites that share an origin with other due sites in one go
+    over HTTP/2, before the pass goes through the sites one by one. Returns
+    results by site ID, the pass probes every other site itself.
+    """
+    now = time.time()
+    due = []
+    for site in sites:
+        probe_type = get_probe_type(site)
+        if probe_type == HEARTBEAT_PROBE:
+            continue
+        # While overloaded the pass may shed non-critical probes, so only critical
+        # sites are batched, the rest are probed or shed by the pass like any other
+        priority = site_priority(site)
+        if load.overloaded and priority != "critical":
+            continue
+        site_state = store.get(site['id'], site['name'])
+        scan_interval = load.interval(priority, site['scan_interval'] or config['default_scan_interval'])
+        if now - site_state.last_scan_time >= scan_interval or site_state.status == "unknown":
+            scan_type, scan_value = site['trigger']['type'], site['trigger']['value']
+            due.append((site['id'], probe_type, site['url'], site['timeout'] or config['default_timeout'], scan_value if scan_type == "text" else None))
+    
+    started = time.perf_counter()
+    results = multiplexer.probe(due)
+    if results:
+        # For the capacity model every probe of the batch costs an equal share of it
+        elapsed = time.perf_counter() - started
+        for _ in results:
+            load.record_probe(elapsed / len(results))
+        log.debug("http2_batch", sites=len(results), seconds=round(elapsed, 3))
+    return results
+
+
+def notify_load(load: LoadModel) -> None:
+    """Report the runner falling behind its sites, and catching up again."""
+    if load.overloaded:
+        title = "Runner overloaded"
+        capacity = load.capacity or 0
+        message = (
+            f"Sites are due {sum(load.demand.values()):.2f} times a second but the runner probes about {capacity:.2f} a second. "
+            f"Low priority intervals are stretched {load.stretch['low']:.1f}x and normal ones {load.stretch['normal']:.1f}x, "
+            f"critical sites keep their interval."
         )
-        
-        # Check if request was successful
-        if response.status_code < 200 or response.status_code >= 300:
-            print(f"Failed to send Slack webhook: {response.status_code} {response.text}")
-    except Exception as e:
-        print(f"Error sending Slack webhook: {str(e)}")
+        color = STATUS_COLORS["slow"]
+    else:
+        title = "Runner load back to normal"
+        message = f"Overloaded for {load.previous_duration:.0f} seconds. Every site is scanned at its configured interval again."
+        color = STATUS_COLORS["up"]
+    log.warning("overload_started" if load.overloaded else "overload_ended", message=message)
+    notifier.broadcast(Event(title, color, message))
 
 
-def runner(db: Session):    
-    config = read_config()
-    sites = config.get('sites', [])
+def runner(store: StateStore, uptime: UptimeRecorder, heartbeats: HeartbeatTracker, canary: ConnectivityCanary, load: LoadModel):    
+    profile_control.check_request()
+    registry = site_registry.get()
+    config = registry.config
+    sites = registry.sites
     runner_delay = config['default_scan_interval']
     slow_threshold = config['default_slow_threshold']
-    expiring_token_threshold = config['expiring_token_threshold']
-    global_webhook_state = config['webhooks']['enabled']
-    attempts_before_trigger = config['attempt_before_trigger']
+    thresholds = Thresholds(slow_threshold, config['expiring_token_threshold'], config['attempt_before_trigger'])
+    notifier.configure(registry)
+    webhooks_active = notifier.active
+    canary_targets = config.get('canary_targets', DEFAULT_CANARY_TARGETS)
+    canary_timeout = config.get('canary_timeout', CANARY_TIMEOUT)
+    load.lag_budget = config.get('scan_lag_budget', DEFAULT_SCAN_LAG_BUDGET)
+    load.prepare(registry, runner_delay)
+    use_http2 = config.get('http2_probes', False) and multiplexer.available
+    if not use_http2:
+        multiplexer.close()
     next_scan_time = runner_delay
+    alerts: List[Dict[str, Any]] = []
     
-    for site in sites:
-        print(f"Running scan for {site['name']}")
-        site_log = get_runner_site_log(site['name'], db)
+    # Without network every site would fail, so nothing is probed, written or
+    # alerted until a reference target answers again
+    if not canary.online:
+        if not canary.check(canary_targets, canary_timeout, force=True):
+            log.debug("still_offline", retry_in=canary.recheck_interval)
+            idle.wait(canary.recheck_interval)
+            return
+        load.resume(canary.restored_at)
+        notify_connectivity(canary)
+    
+    if any(get_probe_type(site) == HEARTBEAT_PROBE for site in sites):
+        heartbeats.refresh()
+    
+    # Critical sites first, then normal and low ones
+    ordered_sites = load.order(lambda site: store.get(site['id'], site['name']).last_scan_time)
+    pass_started = time.time()
+    load.start_pass()
+    prefetched = prefetch_probes(ordered_sites, store, config, load) if use_http2 else {}
+    scanned = skipped = 0
+    
+    for site in ordered_sites:
+        site_state = store.get(site['id'], site['name'])
         
         if site['scan_interval'] == 0:
             scan_interval = config['default_scan_interval']
         else:
             scan_interval = site['scan_interval']
+        
+        # Heartbeat sites are checked against their deadline on every pass
+        if get_probe_type(site) == HEARTBEAT_PROBE:
+            grace = site['timeout'] or config['default_timeout']
+            time_until_deadline = check_heartbeat(
+                site,
+                site_state,
+                store,
+                uptime,
+                heartbeats,
+                scan_interval,
+                grace,
+                site['webhook'] and webhooks_active,
+                alerts,
+                canary.restored_at
+            )
+            next_scan_time = min(next_scan_time, time_until_deadline)
+            continue
+        
+        # Stretched while the runner cannot keep up, except for critical sites
+        priority = site_priority(site)
+        scan_interval = load.interval(priority, scan_interval)
             
-        now = datetime.now()
-        time_since_last_scan = (now - site_log.last_scan_time).total_seconds()
+        now = time.time()
+        time_since_last_scan = now - site_state.last_scan_time
         
         time_until_next_scan = max(0, scan_interval - time_since_last_scan)
         next_scan_time = min(next_scan_time, time_until_next_scan)
         
-        if now >= site_log.last_scan_time + timedelta(seconds=scan_interval) or site_log.status == "unknown":
+        if time_since_last_scan >= scan_interval or site_state.status == "unknown":
+            # Once the pass has used up the lag budget only critical probes are
+            # started, the rest stay due for the next pass
+            if priority != "critical" and now - pass_started > load.lag_budget:
+                load.record_shed()
+                continue
+            if site_state.status != "unknown":
+                load.record_lag(priority, site_state.last_scan_time, scan_interval, now)
+            log.debug("scan", site=site['name'])
+            scanned += 1
+            
             url = site['url']
             scan_type = site['trigger']['type']
             scan_value = site['trigger']['value']
+            probe_type = get_probe_type(site)
             timeout = site['timeout']
             webhook_state = False
             monitor_expiring_token = site['monitor_expiring_token']
-            status = site_log.status
+            status = site_state.status
             
             if site['timeout'] == 0:
                 timeout = config['default_timeout']
                 
-            if site['webhook'] and global_webhook_state:
+            if site['webhook'] and webhooks_active:
                 webhook_state = True
             
-            response, response_time = basic_site_scraper(url, timeout)
+            probe_started = time.perf_counter()
+            # Unchanged pages are answered with a 304 or recognised by their hash,
+            # either way a text trigger is not searched for again
+            result = prefetched.get(site['id'])
+            if result is None:
+                result = run_probe(probe_type, url, timeout, conditional=True, expect_text=scan_value if scan_type == "text" else None)
+            response_time = result.response_time
+            site_is_reachable = result.reachable
+            
+            # An unreachable site may mean the runner itself is offline, in which
+            # case the result is dropped and the pass stops here
+            if not site_is_reachable and not canary.check(canary_targets, canary_timeout):
+                notify_connectivity(canary)
+                break
             
             # Check if SSL should be monitored and get days remaining
+            # The tls probe already read the certificate during its handshake
             ssl_days_remaining = 0
-            if monitor_expiring_token and response is not None:
-                ssl_days_remaining = ssl_check(url)
+            if monitor_expiring_token and site_is_reachable:
+                if result.ssl_days_remaining is not None:
+                    ssl_days_remaining = result.ssl_days_remaining
+                else:
+                    ssl_days_remaining = ssl_check(url)
+            if site['id'] not in prefetched:
+                load.record_probe(time.perf_counter() - probe_started)
             
             # Determine if site is technically up
-            site_is_up = False
-            if response is not None:
-                if scan_type == "text":
-                    if scan_value in response.text:
-                        site_is_up = True
-                elif scan_type == "status_code":
-                    if response.status_code == int(scan_value):
-                        site_is_up = True
+            site_is_up = trigger_met(result, scan_type, scan_value)
             
-            # SSL token alert takes priority
-            if monitor_expiring_token and response is not None and ssl_days_remaining <= expiring_token_threshold:
-                if status != "token_alert":
-                    change_state(site_log, "token_alert", response_time, db, webhook_state, ssl_days_remaining)
-                else:
-                    update_last_scan_time(site_log, db, response_time, ssl_days_remaining)
-                continue
+            # Record the raw probe outcome for the uptime bar
+            if not site_is_up:
+                outcome = OUTCOME_DOWN
+            elif response_time >= slow_threshold:
+                outcome = OUTCOME_SLOW
+            else:
+                outcome = OUTCOME_UP
+            uptime.record(site['id'], outcome, response_time)
             
-            # Check for slow response
-            if response is not None and response_time >= slow_threshold and site_is_up:
-                if status != "slow":
-                    change_state(site_log, "slow", response_time, db, webhook_state, ssl_days_remaining)
-                else:
-                    update_last_scan_time(site_log, db, response_time, ssl_days_remaining)
-                continue
-
-            # Handle up/down status
-            if site_log.status == "up" and site_is_up:
-                update_last_scan_time(site_log, db, response_time, ssl_days_remaining)
-            elif site_log.status == "down" and not site_is_up:
-                update_last_scan_time(site_log, db, response_time, ssl_days_remaining)
+            # The state engine decides, the runner only applies its decision
+            decision = decide(
+                status,
+                site_state.attempt_count,
+                site_is_up,
+                site_is_reachable,
+                response_time,
+                thresholds,
+                ssl_days_remaining if monitor_expiring_token else None
+            )
+            if decision.action == CHANGE:
+                change_state(site_state, url, decision.status, response_time, store, webhook_state, ssl_days_remaining, alerts)
+            elif decision.action == KEEP:
+                update_last_scan_time(site_state, store, response_time, ssl_days_remaining)
             else:
-                if site_log.attempt_count >= attempts_before_trigger:
-                    if site_is_up:
-                        change_state(site_log, "up", response_time, db, webhook_state, ssl_days_remaining)
-                    else:
-                        change_state(site_log, "down", response_time, db, webhook_state, ssl_days_remaining)
-                else:
-                    site_log.response_time = response_time
-                    site_log.attempt_count += 1
-                    site_log.last_scan_time = datetime.now()
-                    
-                    db.commit()
-                    db.refresh(site_log)
-                    
-                    continue
+                site_state.response_time = response_time
+                site_state.attempt_count = decision.attempt_count
+                site_state.last_scan_time = time.time()
+                
+                store.save(site_state)
         else:
-            print(f"Skipping scan for {site['name']} - next scan in {time_until_next_scan:.1f} seconds")
+            skipped += 1
+    
+    if load.pass_shed:
+        log.debug("scans_shed", count=load.pass_shed, lag_budget=load.lag_budget)
+    load_change = load.finish_pass()
+    if load_change is not None:
+        notify_load(load)
+    try:
+        load.publish(force=load_change is not None)
+    except OSError as e:
+        log.error("load_publish_failed", error=str(e))
     
-    sleep_time = max(1, min(next_scan_time, runner_delay))
-    print(f"Putting runner to sleep for {sleep_time:.1f} seconds")
-    time.sleep(sleep_time)
+    publish_state(store)
+    uptime.publish()
+    send_alerts(alerts)
+    
+    if canary.online:
+        sleep_time = max(1, min(next_scan_time, runner_delay))
+    else:
+        sleep_time = canary.recheck_interval
+    pass_summary.add(passes=1, scans=scanned, skipped=skipped, shed=load.pass_shed, alerts=len(alerts))
+    pass_summary.flush(sites=len(sites), overloaded=load.overloaded, online=canary.online)
+    log.debug("sleep", seconds=round(sleep_time, 1))
+    idle.wait(sleep_time)
         
 
 if __name__ == "__main__":
+    # Bound up front so a failed startup reaches the cleanup below with its own error
+    store = uptime = None
     try:
-        print("Starting Site Monitor Runner...")
+        log.info("runner_starting")
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, profile_control.handle_signal)
+        store = StateStore()
+        uptime = UptimeRecorder(sample_log=SampleLog())
+        uptime.load()
+        heartbeats = HeartbeatTracker()
+        canary = ConnectivityCanary()
+        load = LoadModel()
+        if site_registry.get().config.get('http2_probes') and not multiplexer.available:
+            log.warning("http2_unavailable", message="http2_probes is on but httpx and h2 are not installed, probing over HTTP/1.1")
         db = SessionLocal()
+        try:
+            backfill_site_ids(db, site_registry.get().sites)
+            store.load(db)
+        finally:
+            db.close()
+        backfill_if_empty()
+        store.start()
+        publish_state(store)
 
         while True:
-            runner(db)
+            runner(store, uptime, heartbeats, canary, load)
     except KeyboardInterrupt:
-        print("Shutting down Site Monitor Runner...")
+        log.info("runner_stopping")
     finally:
-        db.close()
-        print("Runner stopped.")
+        if store is not None:
+            store.close()
+        if uptime is not None:
+            uptime.publish(force=True)
+        notifier.close()
+        multiplexer.close()
+        pass_summary.flush(force=True)
+        log.info("runner_stopped")
+        log.close()
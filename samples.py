@@ -0,0 +1,251 @@
+from typing import Any, Dict, List, Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+import hashlib
+import os
+import re
+import struct
+import sys
+import time
+from downsample import LTTB_CANDIDATE_RATIO, lttb, minmax, span_outcomes
+from jsonlog import log
+
+SAMPLES_DIR = "data/samples"
+
+# Each site has an append-only file of fixed 8 byte records, oldest first:
+# u32 epoch seconds, u16 response time in ms, u8 outcome (as in uptime.py), one
+# byte of padding. A year of 30 second samples is about 8 MB.
+SAMPLE_RECORD = struct.Struct("<IHBx")
+MAX_LATENCY_MS = 0xFFFF
+
+# Next to it, a rollup file summarizes every complete block of samples:
+# first and last timestamp, timestamps of the lowest and highest response
+# time, those response times, the worst outcome and a spare field, all u32.
+# Long ranges are downsampled from the rollups instead of every sample.
+ROLLUP_BLOCK = 64
+ROLLUP_RECORD = struct.Struct("<8I")
+ROLLUP_FIELDS = 8
+
+# Samples older than this are dropped, checked once a day per site
+SAMPLE_RETENTION_DAYS = 400
+COMPACT_CHECK_SECONDS = 86400
+
+SAFE_SITE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def sample_paths(site_id: str, samples_dir: str = SAMPLES_DIR) -> Tuple[str, str]:
+    """Return the sample and rollup file paths of a site."""
+    # Imported sites may bring their own IDs, only plain ones are used as file names
+    if not SAFE_SITE_ID.fullmatch(site_id):
+        site_id = hashlib.blake2b(site_id.encode("utf-8"), digest_size=16).hexdigest()
+    base = os.path.join(samples_dir, site_id)
+    return f"{base}.bin", f"{base}.rollup"
+
+
+def encode_record(timestamp: float, outcome: int, response_time: float) -> bytes:
+    return SAMPLE_RECORD.pack(int(timestamp), min(int(round(response_time * 1000)), MAX_LATENCY_MS), outcome)
+
+
+class SampleLog:
+    """Runner-side log of every probe sample, appended to disk when the uptime file is published."""
+
+    def __init__(self, samples_dir: str = SAMPLES_DIR, retention_days: int = SAMPLE_RETENTION_DAYS):
+        self.samples_dir = samples_dir
+        self.retention_seconds = retention_days * 86400
+        self.pending: Dict[str, bytearray] = {}
+        self.next_compact_check: Dict[str, float] = {}
+
+    def record(self, site_id: str, outcome: int, response_time: float) -> None:
+        self.pending.setdefault(site_id, bytearray()).extend(encode_record(time.time(), outcome, response_time))
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        os.makedirs(self.samples_dir, exist_ok=True)
+        now = time.time()
+        for site_id, records in pending.items():
+            path, rollup_path = sample_paths(site_id, self.samples_dir)
+            try:
+                with open(path, 'ab') as f:
+                    # Drop a record left half written by a crash
+                    size = f.tell()
+                    if size % SAMPLE_RECORD.size:
+                        f.truncate(size - size % SAMPLE_RECORD.size)
+                    f.write(records)
+                    size = f.tell()
+                update_rollups(path, rollup_path, size // SAMPLE_RECORD.size)
+                if now >= self.next_compact_check.get(site_id, 0):
+                    self.next_compact_check[site_id] = now + COMPACT_CHECK_SECONDS
+                    compact(path, rollup_path, now - self.retention_seconds)
+            except OSError as e:
+                log.error("samples_write_failed", site_id=site_id, error=str(e))
+
+
+def split_records(data: bytes) -> Tuple[array, array, bytes]:
+    """Split packed records into timestamp and latency arrays and outcome bytes, without a per-record loop."""
+    count = len(data) // SAMPLE_RECORD.size
+    view = memoryview(data)[:count * SAMPLE_RECORD.size]
+    timestamps = array("I")
+    timestamps.frombytes(view.cast("I")[0::2].tobytes())
+    latencies = array("H")
+    latencies.frombytes(view.cast("H")[2::4].tobytes())
+    outcomes = view[6::8].tobytes()
+    if sys.byteorder == "big":
+        timestamps.byteswap()
+        latencies.byteswap()
+    return timestamps, latencies, outcomes
+
+
+def read_records(path: str, first: int, last: int) -> Tuple[array, array, bytes]:
+    """Read records first to last (exclusive) of a sample file."""
+    if last <= first:
+        return array("I"), array("H"), b""
+    with open(path, 'rb') as f:
+        f.seek(first * SAMPLE_RECORD.size)
+        return split_records(f.read((last - first) * SAMPLE_RECORD.size))
+
+
+def read_rollups(path: str) -> List[array]:
+    """Read a rollup file into one array per field."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = b""
+    view = memoryview(data)[:len(data) // ROLLUP_RECORD.size * ROLLUP_RECORD.size].cast("I")
+    columns = []
+    for field in range(ROLLUP_FIELDS):
+        column = array("I")
+        column.frombytes(view[field::ROLLUP_FIELDS].tobytes())
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+    return columns
+
+
+def update_rollups(path: str, rollup_path: str, record_count: int) -> None:
+    """Append rollups for the blocks of samples completed since the last call."""
+    try:
+        rollup_size = os.path.getsize(rollup_path)
+    except FileNotFoundError:
+        rollup_size = 0
+    done = rollup_size // ROLLUP_RECORD.size
+    complete = record_count // ROLLUP_BLOCK
+    if done > complete:
+        # Left behind by an interrupted compaction, start over
+        done = rollup_size = 0
+        os.remove(rollup_path)
+    elif rollup_size % ROLLUP_RECORD.size:
+        os.truncate(rollup_path, done * ROLLUP_RECORD.size)
+    if done == complete:
+        return
+
+    timestamps, latencies, outcomes = read_records(path, done * ROLLUP_BLOCK, complete * ROLLUP_BLOCK)
+    parts = []
+    for low in range(0, len(timestamps), ROLLUP_BLOCK):
+        high = low + ROLLUP_BLOCK
+        block = latencies[low:high]
+        lowest = low + block.index(min(block))
+        highest = low + block.index(max(block))
+        parts.append(ROLLUP_RECORD.pack(
+            timestamps[low],
+            timestamps[high - 1],
+            timestamps[lowest],
+            timestamps[highest],
+            latencies[lowest],
+            latencies[highest],
+            max(outcomes[low:high]),
+            0
+        ))
+    with open(rollup_path, 'ab') as f:
+        f.write(b"".join(parts))
+
+
+def compact(path: str, rollup_path: str, cutoff: float) -> None:
+    """Drop the blocks of samples that ended before cutoff."""
+    last_timestamps = read_rollups(rollup_path)[1]
+    dropped = bisect_left(last_timestamps, cutoff)
+    if dropped == 0:
+        return
+
+    # The samples go first, a rollup file longer than its samples is rebuilt
+    for file_path, offset in ((path, dropped * ROLLUP_BLOCK * SAMPLE_RECORD.size), (rollup_path, dropped * ROLLUP_RECORD.size)):
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+
+def load_series(
+    site_id: str,
+    start: float,
+    end: float,
+    points: int,
+    method: str,
+    samples_dir: str = SAMPLES_DIR
+) -> Dict[str, Any]:
+    """Downsample a site's samples between start and end to at most `points` points.
+
+    Ranges with enough complete blocks are reduced from the rollups, with
+    raw samples only for the partial blocks at either end, so the work
+    depends on the number of blocks rather than samples.
+    """
+    path, rollup_path = sample_paths(site_id, samples_dir)
+    try:
+        record_count = os.path.getsize(path) // SAMPLE_RECORD.size
+    except FileNotFoundError:
+        record_count = 0
+    first_ts, last_ts, min_ts, max_ts, min_latency, max_latency, worst, _ = read_rollups(rollup_path)
+    block_count = len(first_ts)
+
+    # Blocks overlapping the range, and the records they (and the unfinished block) hold
+    low = bisect_left(last_ts, start)
+    high = bisect_right(first_ts, end)
+    last_record = high * ROLLUP_BLOCK if high < block_count else record_count
+    # Blocks entirely inside the range
+    inner_low = low if low < block_count and first_ts[low] >= start else low + 1
+    inner_high = max(inner_low, high if high > 0 and last_ts[high - 1] <= end else high - 1)
+
+    candidates = points * LTTB_CANDIDATE_RATIO if method == "lttb" else points
+    if (inner_high - inner_low) * 2 >= candidates:
+        head = read_records(path, low * ROLLUP_BLOCK, inner_low * ROLLUP_BLOCK)
+        tail = read_records(path, inner_high * ROLLUP_BLOCK, last_record)
+        head_first = bisect_left(head[0], start)
+        tail_last = bisect_right(tail[0], end)
+        head_ts, head_latency, head_outcomes = head[0][head_first:], head[1][head_first:], head[2][head_first:]
+        tail_ts, tail_latency, tail_outcomes = tail[0][:tail_last], tail[1][:tail_last], tail[2][:tail_last]
+
+        blocks = slice(inner_low, inner_high)
+        item_starts = head_ts.tolist() + first_ts[blocks].tolist() + tail_ts.tolist()
+        xs_low = head_ts.tolist() + min_ts[blocks].tolist() + tail_ts.tolist()
+        ys_low = head_latency.tolist() + min_latency[blocks].tolist() + tail_latency.tolist()
+        xs_high = head_ts.tolist() + max_ts[blocks].tolist() + tail_ts.tolist()
+        ys_high = head_latency.tolist() + max_latency[blocks].tolist() + tail_latency.tolist()
+        item_outcomes = head_outcomes + bytes(worst[blocks].tolist()) + tail_outcomes
+        sample_count = len(head_ts) + (inner_high - inner_low) * ROLLUP_BLOCK + len(tail_ts)
+    else:
+        timestamps, latencies, item_outcomes = read_records(path, low * ROLLUP_BLOCK, last_record)
+        first = bisect_left(timestamps, start)
+        last = bisect_right(timestamps, end)
+        item_starts = xs_low = xs_high = timestamps[first:last]
+        ys_low = ys_high = latencies[first:last]
+        item_outcomes = item_outcomes[first:last]
+        sample_count = len(item_starts)
+
+    if sample_count <= points:
+        xs, ys = list(xs_low), list(ys_low)
+    else:
+        xs, ys = minmax(xs_low, ys_low, xs_high, ys_high, candidates // 2)
+        if method == "lttb":
+            xs, ys = lttb(xs, ys, points)
+
+    return {
+        "samples": sample_count,
+        "timestamps": xs,
+        "latency_ms": ys,
+        "outcome": span_outcomes(item_starts, item_outcomes, xs, start),
+    }
@@ -0,0 +1,283 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from datetime import datetime
+import csv
+import io
+import json
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models.models as models
+from probes import DEFAULT_PROBE_TYPE, validate_probe
+from overload import DEFAULT_PRIORITY, PRIORITIES
+from registry import new_site_id
+import site_store
+
+BULK_FORMATS = ["ndjson", "csv"]
+BULK_OPERATIONS = ["upsert", "delete"]
+TRIGGER_TYPES = ["status_code", "text"]
+
+# Flat site columns used by CSV, tags are joined into one column
+SITE_COLUMNS = [
+    "id",
+    "name",
+    "url",
+    "probe",
+    "priority",
+    "trigger_type",
+    "trigger_value",
+    "scan_interval",
+    "timeout",
+    "monitor_expiring_token",
+    "webhook",
+    "tags",
+    "method",
+    "content_type",
+    "body",
+]
+TAG_SEPARATOR = ";"
+
+# Current state added to exports, ignored when the export is imported again
+STATE_COLUMNS = ["status", "response_time", "attempt_count", "last_scan_time", "ssl_days_remaining"]
+
+EXPORT_CHUNK_ROWS = 500
+
+
+def parse_bool(value: Any, field: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = "" if value is None else str(value).strip().lower()
+    if text in ("true", "1", "yes", "on"):
+        return True
+    if text in ("false", "0", "no", "off", ""):
+        return False
+    raise ValueError(f"{field} must be true or false")
+
+
+def parse_int(value: Any, field: str) -> int:
+    if value is None or value == "":
+        return 0
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number")
+    if number < 0:
+        raise ValueError(f"{field} must not be negative")
+    return number
+
+
+def parse_tags(value: Any) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        tags = value.split(TAG_SEPARATOR)
+    elif isinstance(value, list):
+        tags = value
+    else:
+        raise ValueError(f"tags must be a list or a '{TAG_SEPARATOR}' separated string")
+    return [str(tag).strip() for tag in tags if str(tag).strip()]
+
+
+def normalize_row(row: Any) -> Tuple[str, Dict[str, Any]]:
+    """Turn an NDJSON object or a CSV row into an operation and a site in config.json shape.
+
+    Both the nested "trigger" object used by config.json and the flat
+    trigger_type / trigger_value columns used by CSV are accepted.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+
+    op = str(row.get("op") or "upsert").strip().lower()
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f"Invalid op '{op}'. Must be one of: {', '.join(BULK_OPERATIONS)}")
+
+    site_id = str(row.get("id") or "").strip()
+    name = str(row.get("name") or "").strip()
+    if op == "delete":
+        if not site_id and not name:
+            raise ValueError("Delete rows need an id or a name")
+        return op, {"id": site_id, "name": name}
+
+    url = str(row.get("url") or "").strip()
+    if not name or not url:
+        raise ValueError("name and url are required")
+
+    trigger = row.get("trigger")
+    if isinstance(trigger, dict):
+        trigger_type, trigger_value = trigger.get("type"), trigger.get("value")
+    else:
+        trigger_type, trigger_value = row.get("trigger_type"), row.get("trigger_value")
+    if trigger_type not in TRIGGER_TYPES:
+        raise ValueError(f"trigger type must be one of: {', '.join(TRIGGER_TYPES)}")
+    trigger_value = "" if trigger_value is None else str(trigger_value)
+    if trigger_value == "":
+        raise ValueError("trigger value is required")
+    if trigger_type == "status_code" and not trigger_value.isdigit():
+        raise ValueError("status_code triggers need a numeric value")
+
+    probe = str(row.get("probe") or DEFAULT_PROBE_TYPE).strip().lower()
+    probe_error = validate_probe(probe, trigger_type)
+    if probe_error:
+        raise ValueError(probe_error)
+
+    priority = str(row.get("priority") or DEFAULT_PRIORITY).strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+
+    site = {
+        "id": site_id,
+        "url": url,
+        "name": name,
+        "scan_interval": parse_int(row.get("scan_interval"), "scan_interval"),
+        "timeout": parse_int(row.get("timeout"), "timeout"),
+        "probe": probe,
+        "priority": priority,
+        "trigger": {
+            "type": trigger_type,
+            "value": trigger_value
+        },
+        "monitor_expiring_token": parse_bool(row.get("monitor_expiring_token"), "monitor_expiring_token"),
+        "webhook": parse_bool(row.get("webhook"), "webhook"),
+        "tags": parse_tags(row.get("tags"))
+    }
+    for field in site_store.OPTIONAL_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            site[field] = str(value)
+    return op, site
+
+
+def parse_rows(text: str, body_format: str) -> List[Any]:
+    """Split an import body into rows. NDJSON lines that are not valid JSON become errors."""
+    if body_format == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+
+    rows: List[Any] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            rows.append(ValueError(f"Invalid JSON: {str(e)}"))
+    return rows
+
+
+def apply_site_rows(db: Session, rows: Iterable[Any], atomic: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """Validate rows against the current sites and write the valid ones in one transaction.
+
+    Rows are matched to existing sites by id, or by name when they have no
+    id, so importing the same list twice updates instead of duplicating.
+    Every row gets a result. With atomic set nothing is written if any row
+    fails, and dry_run only validates. The caller commits when "applied".
+    """
+    names_by_id: Dict[str, str] = dict(db.execute(select(models.Site.id, models.Site.name)).all())
+    ids_by_name = {name: site_id for site_id, name in names_by_id.items()}
+    touched = set()
+    creates: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    deletes: List[str] = []
+    results: List[Dict[str, Any]] = []
+
+    for number, row in enumerate(rows, 1):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            op, site = normalize_row(row)
+
+            if site["id"]:
+                existing_id = site["id"] if site["id"] in names_by_id else None
+            else:
+                existing_id = ids_by_name.get(site["name"])
+            if (existing_id or site["id"]) in touched:
+                raise ValueError("Site appears more than once in this batch")
+
+            if op == "delete":
+                if existing_id is None:
+                    raise ValueError("Site not found")
+                name = names_by_id.pop(existing_id)
+                del ids_by_name[name]
+                deletes.append(existing_id)
+                touched.add(existing_id)
+                results.append({"row": number, "ok": True, "action": "deleted", "id": existing_id, "name": name})
+                continue
+
+            owner = ids_by_name.get(site["name"])
+            if owner is not None and owner != existing_id:
+                raise ValueError("A site with this name already exists")
+
+            if existing_id is None:
+                site["id"] = site["id"] or new_site_id()
+                creates.append(site)
+                action = "created"
+            else:
+                del ids_by_name[names_by_id[existing_id]]
+                site["id"] = existing_id
+                updates.append(site)
+                action = "updated"
+            names_by_id[site["id"]] = site["name"]
+            ids_by_name[site["name"]] = site["id"]
+            touched.add(site["id"])
+            results.append({"row": number, "ok": True, "action": action, "id": site["id"], "name": site["name"]})
+        except ValueError as e:
+            results.append({"row": number, "ok": False, "error": str(e)})
+
+    failed = sum(1 for result in results if not result["ok"])
+    applied = not dry_run and not (atomic and failed)
+    if applied:
+        site_store.write_sites_bulk(db, creates, updates, deletes)
+
+    return {
+        "applied": applied,
+        "created": len(creates),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "failed": failed,
+        "results": results
+    }
+
+
+def export_state(state: Any) -> Dict[str, Any]:
+    """Pick the exported state fields from a snapshot entry."""
+    if state is None:
+        return {column: None for column in STATE_COLUMNS}
+    last_scan_time = state.get("last_scan_time")
+    return {
+        "status": state.get("status"),
+        "response_time": state.get("response_time"),
+        "attempt_count": state.get("attempt_count"),
+        "last_scan_time": datetime.fromtimestamp(last_scan_time).isoformat() if last_scan_time else None,
+        "ssl_days_remaining": state.get("ssl_days_remaining"),
+    }
+
+
+def export_ndjson(sites: List[Dict[str, Any]], states: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    """Yield one JSON object per site, in config.json shape with a "state" object added."""
+    lines = []
+    for site in sites:
+        lines.append(json.dumps({**site, "state": export_state(states.get(site["id"]))}, separators=(",", ":")))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_csv(sites: List[Dict[str, Any]], states: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    """Yield CSV with the flat site columns followed by the state columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SITE_COLUMNS + STATE_COLUMNS)
+
+    for count, site in enumerate(sites, 1):
+        flat = {
+            **site,
+            "trigger_type": site["trigger"]["type"],
+            "trigger_value": site["trigger"]["value"],
+            "tags": TAG_SEPARATOR.join(site.get("tags", [])),
+        }
+        flat.update(export_state(states.get(site["id"])))
+        writer.writerow(["" if flat.get(column) is None else flat[column] for column in SITE_COLUMNS + STATE_COLUMNS])
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
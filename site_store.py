@@ -0,0 +1,405 @@
+from typing import Any, Dict, List, Optional, Set
+import json
+import os
+import shutil
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import models.models as models
+from probes import DEFAULT_PROBE_TYPE
+from overload import DEFAULT_PRIORITY
+from registry import ensure_site_ids
+from jsonlog import log
+
+# Keys of config.json that are stored in the database. Everything else in
+# the file is a global setting and stays there.
+DATABASE_KEYS = ("sites", "webhooks")
+
+# Request options that are only present on sites that set them
+OPTIONAL_FIELDS = ("method", "content_type", "body")
+
+WEBHOOK_TYPES = ("discord", "slack")
+# Statuses a webhook destination can be limited to
+WEBHOOK_STATUSES = ("up", "slow", "down", "token_alert")
+
+
+def site_to_dict(site: Any, tags: List[str]) -> Dict[str, Any]:
+    """Convert a site row into the shape sites have in config.json."""
+    data = {
+        "id": site.id,
+        "url": site.url,
+        "name": site.name,
+        "scan_interval": site.scan_interval,
+        "timeout": site.timeout,
+        "probe": site.probe or DEFAULT_PROBE_TYPE,
+        "priority": site.priority or DEFAULT_PRIORITY,
+        "trigger": {
+            "type": site.trigger_type,
+            "value": site.trigger_value
+        },
+        "monitor_expiring_token": site.monitor_expiring_token,
+        "webhook": site.webhook,
+        "tags": tags
+    }
+    for field in OPTIONAL_FIELDS:
+        value = getattr(site, field)
+        if value is not None:
+            data[field] = value
+    return data
+
+
+def site_columns(site: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a site in config.json shape into column values for the site table."""
+    columns = {
+        "name": site["name"],
+        "url": site["url"],
+        "probe": site.get("probe") or DEFAULT_PROBE_TYPE,
+        "priority": site.get("priority") or DEFAULT_PRIORITY,
+        "scan_interval": site.get("scan_interval") or 0,
+        "timeout": site.get("timeout") or 0,
+        "trigger_type": site["trigger"]["type"],
+        "trigger_value": str(site["trigger"]["value"]),
+        "monitor_expiring_token": bool(site.get("monitor_expiring_token")),
+        "webhook": bool(site.get("webhook")),
+    }
+    for field in OPTIONAL_FIELDS:
+        columns[field] = site.get(field)
+    return columns
+
+
+def get_change_seq(db: Session) -> int:
+    """Return the current change sequence, which moves on every site or webhook change."""
+    value = db.execute(
+        select(models.ConfigSequence.value).where(models.ConfigSequence.id == 1)
+    ).scalar()
+    return value or 0
+
+
+def bump_change_seq(db: Session) -> None:
+    """Advance the change sequence as part of the caller's transaction."""
+    result = db.execute(
+        update(models.ConfigSequence)
+        .where(models.ConfigSequence.id == 1)
+        .values(value=models.ConfigSequence.value + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(models.ConfigSequence).values(id=1, value=1))
+
+
+def load_sites(db: Session) -> List[Dict[str, Any]]:
+    """Load every site, in display order, with its tags."""
+    tags: Dict[str, List[str]] = {}
+    for site_id, tag in db.execute(
+        select(models.SiteTag.site_id, models.SiteTag.tag).order_by(models.SiteTag.site_id, models.SiteTag.tag)
+    ):
+        tags.setdefault(site_id, []).append(tag)
+
+    # Plain rows instead of ORM objects, this runs for the whole fleet on every change
+    sites = db.execute(select(*models.Site.__table__.columns).order_by(models.Site.position))
+    return [site_to_dict(site, tags.get(site.id, [])) for site in sites]
+
+
+def load_site(db: Session, site_id: str) -> Optional[Dict[str, Any]]:
+    site = db.get(models.Site, site_id)
+    if site is None:
+        return None
+    tags = db.execute(
+        select(models.SiteTag.tag).where(models.SiteTag.site_id == site_id).order_by(models.SiteTag.tag)
+    ).scalars().all()
+    return site_to_dict(site, list(tags))
+
+
+def name_taken(db: Session, name: str, site_id: Optional[str] = None) -> bool:
+    """Check whether a site other than site_id already uses this name."""
+    query = select(models.Site.id).where(models.Site.name == name)
+    if site_id is not None:
+        query = query.where(models.Site.id != site_id)
+    return db.execute(query.limit(1)).first() is not None
+
+
+def replace_tags(db: Session, site_id: str, tags: List[str]) -> None:
+    db.execute(delete(models.SiteTag).where(models.SiteTag.site_id == site_id))
+    unique_tags = list(dict.fromkeys(tags))
+    if unique_tags:
+        db.execute(insert(models.SiteTag), [{"site_id": site_id, "tag": tag} for tag in unique_tags])
+
+
+# The functions below change a single site or the webhook settings and leave
+# committing to the caller, so several changes can share one transaction.
+
+def add_site(db: Session, site: Dict[str, Any]) -> None:
+    """Insert a new site after the existing ones. The site must already have an ID."""
+    last_position = db.execute(select(func.max(models.Site.position))).scalar()
+    position = 0 if last_position is None else last_position + 1
+    db.execute(insert(models.Site).values(id=site["id"], position=position, **site_columns(site)))
+    replace_tags(db, site["id"], site.get("tags", []))
+    bump_change_seq(db)
+
+
+def update_site(db: Session, site_id: str, site: Dict[str, Any]) -> bool:
+    """Update a site in place. Returns False if the site does not exist."""
+    result = db.execute(
+        update(models.Site).where(models.Site.id == site_id).values(**site_columns(site))
+    )
+    if result.rowcount == 0:
+        return False
+    replace_tags(db, site_id, site.get("tags", []))
+    bump_change_seq(db)
+    return True
+
+
+def delete_site(db: Session, site_id: str) -> bool:
+    """Delete a site and its tags. Returns False if the site does not exist."""
+    result = db.execute(delete(models.Site).where(models.Site.id == site_id))
+    if result.rowcount == 0:
+        return False
+    db.execute(delete(models.SiteTag).where(models.SiteTag.site_id == site_id))
+    bump_change_seq(db)
+    return True
+
+
+def write_sites_bulk(
+    db: Session,
+    creates: List[Dict[str, Any]],
+    updates: List[Dict[str, Any]],
+    deletes: List[str]
+) -> None:
+    """Apply many already validated changes with a few set-based statements.
+
+    Deletes run first and creates last, so a batch can free a name and reuse
+    it. The change sequence moves once for the whole batch.
+    """
+    for chunk in chunked(deletes):
+        db.execute(delete(models.Site).where(models.Site.id.in_(chunk)))
+        db.execute(delete(models.SiteTag).where(models.SiteTag.site_id.in_(chunk)))
+
+    if updates:
+        db.execute(update(models.Site), [{"id": site["id"], **site_columns(site)} for site in updates])
+        for chunk in chunked([site["id"] for site in updates]):
+            db.execute(delete(models.SiteTag).where(models.SiteTag.site_id.in_(chunk)))
+
+    if creates:
+        last_position = db.execute(select(func.max(models.Site.position))).scalar()
+        first_position = 0 if last_position is None else last_position + 1
+        db.execute(insert(models.Site), [
+            {"id": site["id"], "position": first_position + offset, **site_columns(site)}
+            for offset, site in enumerate(creates)
+        ])
+
+    tag_rows = [
+        {"site_id": site["id"], "tag": tag}
+        for site in updates + creates
+        for tag in dict.fromkeys(site.get("tags", []))
+    ]
+    if tag_rows:
+        db.execute(insert(models.SiteTag), tag_rows)
+
+    if creates or updates or deletes:
+        bump_change_seq(db)
+
+
+def chunked(values: List[Any], size: int = 500):
+    """Split values into chunks small enough for an IN clause."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def webhook_to_dict(webhook: Any) -> Dict[str, Any]:
+    return {
+        "id": webhook.id,
+        "name": webhook.name or "",
+        "type": webhook.type,
+        "url": webhook.url,
+        "enabled": webhook.enabled,
+        "tags": webhook.tags or "",
+        "statuses": [status for status in (webhook.statuses or "").split(",") if status],
+    }
+
+
+def webhook_columns(webhook: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": webhook.get("name") or "",
+        "type": webhook.get("type") or "",
+        "url": webhook.get("url") or "",
+        "enabled": bool(webhook.get("enabled")),
+        "tags": webhook.get("tags") or "",
+        "statuses": ",".join(webhook.get("statuses") or []),
+    }
+
+
+def load_webhooks(db: Session) -> List[Dict[str, Any]]:
+    """Return the webhook destinations in order. Rows without a URL (a cleared webhook from older versions) are left out."""
+    webhooks = db.execute(select(models.Webhook).order_by(models.Webhook.id)).scalars()
+    return [webhook_to_dict(webhook) for webhook in webhooks if webhook.url]
+
+
+def get_webhook(db: Session, webhook_id: int) -> Optional[Dict[str, Any]]:
+    """Return one webhook destination by ID, or None if it does not exist."""
+    webhook = db.get(models.Webhook, webhook_id)
+    if webhook is None or not webhook.url:
+        return None
+    return webhook_to_dict(webhook)
+
+
+def save_webhooks(db: Session, webhooks: Any) -> None:
+    """Replace all webhook destinations. A single object, as config.json held before, counts as a list of one."""
+    if isinstance(webhooks, dict):
+        webhooks = [webhooks]
+    db.execute(delete(models.Webhook))
+    rows = [webhook_columns(webhook) for webhook in webhooks if webhook.get("url")]
+    if rows:
+        db.execute(insert(models.Webhook), rows)
+    bump_change_seq(db)
+
+
+def add_webhook(db: Session, webhook: Dict[str, Any]) -> int:
+    """Append a webhook destination and return its ID."""
+    result = db.execute(insert(models.Webhook).values(**webhook_columns(webhook)))
+    bump_change_seq(db)
+    return result.inserted_primary_key[0]
+
+
+def update_webhook(db: Session, webhook_id: int, webhook: Dict[str, Any]) -> bool:
+    """Update a webhook destination in place. Returns False if it does not exist."""
+    result = db.execute(
+        update(models.Webhook).where(models.Webhook.id == webhook_id).values(**webhook_columns(webhook))
+    )
+    if result.rowcount == 0:
+        return False
+    bump_change_seq(db)
+    return True
+
+
+def delete_webhook(db: Session, webhook_id: int) -> bool:
+    """Delete a webhook destination. Returns False if it does not exist."""
+    result = db.execute(delete(models.Webhook).where(models.Webhook.id == webhook_id))
+    if result.rowcount == 0:
+        return False
+    bump_change_seq(db)
+    return True
+
+
+def read_settings(path: str) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_settings(config: Dict[str, Any], path: str, backup: bool = False) -> None:
+    """Atomically write the global settings, leaving out anything stored in the database.
+
+    With backup, the file being replaced is kept next to it as path.bak.
+    """
+    settings = {key: value for key, value in config.items() if key not in DATABASE_KEYS}
+    # Named per process: the web app and the runner may both rewrite the file at startup
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(settings, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        if backup and os.path.exists(path):
+            shutil.copy2(path, f"{path}.bak")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_config(db: Session, path: str) -> Dict[str, Any]:
+    """Return the settings from config.json together with the sites and webhooks from the database.
+
+    This is the same shape config.json had before sites moved into the
+    database, and is also what the JSON export returns.
+    """
+    config = {key: value for key, value in read_settings(path).items() if key not in DATABASE_KEYS}
+    config["webhooks"] = load_webhooks(db)
+    config["sites"] = load_sites(db)
+    return config
+
+
+def config_version(path: str, session_factory=SessionLocal) -> tuple:
+    """Cheap version key for the full config: the settings file stat plus the change sequence."""
+    stat = os.stat(path)
+    db = session_factory()
+    try:
+        change_seq = get_change_seq(db)
+    finally:
+        db.close()
+    return (stat.st_mtime_ns, stat.st_size, change_seq)
+
+
+def import_sites(db: Session, sites: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Upsert sites by ID, keeping the position of sites that already exist.
+
+    Site names are unique, so a site whose name belongs to another existing
+    site updates that site instead and keeps its ID. Sites that would still
+    take a name twice are skipped. Returns the names of both kinds.
+    """
+    existing = dict(db.execute(select(models.Site.id, models.Site.name)).all())
+    ids_by_name = {name: site_id for site_id, name in existing.items()}
+    creates: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    matched_by_name: List[str] = []
+    skipped: List[str] = []
+    taken_ids: Set[str] = set()
+    taken_names: Set[str] = set()
+
+    for site in sites:
+        owner = ids_by_name.get(site["name"])
+        if owner is not None and owner != site["id"]:
+            if site["id"] in existing:
+                # Renaming one existing site to another one's name
+                skipped.append(site["name"])
+                continue
+            site = dict(site, id=owner)
+            matched_by_name.append(site["name"])
+        if site["id"] in taken_ids or site["name"] in taken_names:
+            skipped.append(site["name"])
+            continue
+        taken_ids.add(site["id"])
+        taken_names.add(site["name"])
+        (updates if site["id"] in existing else creates).append(site)
+
+    write_sites_bulk(db, creates, updates, [])
+    return {"matched_by_name": matched_by_name, "skipped": skipped}
+
+
+def import_config_file(path: str, session_factory=SessionLocal) -> None:
+    """One-shot import of the sites and webhooks still stored in config.json.
+
+    Sites are upserted by ID, so importing the same file twice (for example
+    when the web app and the runner start together) is harmless. Name
+    conflicts with existing sites are resolved by import_sites and logged.
+    Afterwards the file is rewritten with only the global settings, and the
+    imported file is kept as config.json.bak. Dropping a JSON export in place
+    of config.json imports it again on the next start.
+    """
+    try:
+        config = read_settings(path)
+    except FileNotFoundError:
+        return
+    if not any(key in config for key in DATABASE_KEYS):
+        return
+
+    ensure_site_ids(config)
+    sites = config.get("sites", [])
+    db = session_factory()
+    try:
+        conflicts = import_sites(db, sites)
+        if "webhooks" in config:
+            save_webhooks(db, config["webhooks"])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log.error("config_import_failed", path=path, error=str(e))
+        return
+    finally:
+        db.close()
+
+    write_settings(config, path, backup=True)
+    if conflicts["matched_by_name"]:
+        log.warning("config_import_matched_by_name", path=path, sites=conflicts["matched_by_name"])
+    if conflicts["skipped"]:
+        log.warning("config_import_skipped", path=path, sites=conflicts["skipped"], backup=f"{path}.bak")
+    log.info("config_imported", path=path, sites=len(sites) - len(conflicts["skipped"]), backup=f"{path}.bak")
@@ -0,0 +1,95 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import time
+from jsonlog import log
+
+SNAPSHOT_PATH = "data/state_snapshot.json"
+
+# Column order for each site row, rows are stored as lists to keep the file compact
+SNAPSHOT_FIELDS = [
+    "id",
+    "site_id",
+    "name",
+    "status",
+    "response_time",
+    "attempt_count",
+    "created_at",
+    "last_scan_time",
+    "ssl_days_remaining",
+]
+
+
+def publish_snapshot(store, version: int, path: str = SNAPSHOT_PATH) -> None:
+    """Atomically write the runner's current state for the web process to read."""
+    snapshot = {
+        "version": version,
+        "generated_at": time.time(),
+        "fields": SNAPSHOT_FIELDS,
+        "sites": [
+            [
+                str(state.log_id),
+                state.site_id,
+                state.name,
+                state.status,
+                state.response_time,
+                state.attempt_count,
+                state.created_at,
+                state.last_scan_time,
+                state.ssl_days_remaining,
+            ]
+            for state in store.sites.values()
+        ],
+    }
+
+    # Write to a temporary file and swap it in so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class SnapshotReader:
+    """Cached view of the runner's snapshot.
+
+    The file is only re-parsed when it has been replaced and carries a new
+    version, so repeated reads cost a single stat call.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.version: Optional[int] = None
+        self.generated_at: Optional[float] = None
+        self.sites: Dict[str, Dict[str, Any]] = {}
+        self._file_key = None
+
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest state for each site keyed by site ID."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.sites
+
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key == self._file_key:
+            return self.sites
+
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("snapshot_read_failed", error=str(e))
+            return self.sites
+
+        if snapshot["version"] != self.version:
+            fields = snapshot["fields"]
+            self.sites = {row[1]: dict(zip(fields, row)) for row in snapshot["sites"]}
+            self.version = snapshot["version"]
+            self.generated_at = snapshot["generated_at"]
+        # Set last, so a concurrent reader never skips a reload it still needs
+        self._file_key = file_key
+
+        return self.sites
+
+
+snapshot_reader = SnapshotReader()
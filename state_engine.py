@@ -0,0 +1,55 @@
+from typing import NamedTuple, Optional
+
+# What a probe result does to a site's state
+KEEP = "keep"         # the status is confirmed, the attempt count starts over
+ATTEMPT = "attempt"   # the result disagrees with the status, one more attempt is counted
+CHANGE = "change"     # the site moves to a new status
+
+
+class Thresholds(NamedTuple):
+    slow_threshold: float
+    expiring_token_threshold: int
+    attempts_before_trigger: int
+
+
+class Decision(NamedTuple):
+    action: str
+    status: str
+    attempt_count: int
+
+
+def transition(status: str, new_status: str) -> Decision:
+    if status == new_status:
+        return Decision(KEEP, status, 0)
+    return Decision(CHANGE, new_status, 0)
+
+
+def decide(
+    status: str,
+    attempt_count: int,
+    up: bool,
+    reachable: bool,
+    response_time: float,
+    thresholds: Thresholds,
+    ssl_days_remaining: Optional[int] = None
+) -> Decision:
+    """
+    The next state of a site after a probe. up is whether the trigger was met,
+    ssl_days_remaining is None for sites whose certificate is not monitored.
+    Nothing is read or written, so the runner and replays give the same result.
+    """
+    # An expiring certificate takes priority
+    if reachable and ssl_days_remaining is not None and ssl_days_remaining <= thresholds.expiring_token_threshold:
+        return transition(status, "token_alert")
+
+    # Slow responses are reported straight away
+    if reachable and up and response_time >= thresholds.slow_threshold:
+        return transition(status, "slow")
+
+    if (status == "up" and up) or (status == "down" and not up):
+        return Decision(KEEP, status, 0)
+
+    # Going up or down takes attempts_before_trigger disagreeing results first
+    if attempt_count >= thresholds.attempts_before_trigger:
+        return Decision(CHANGE, "up" if up else "down", 0)
+    return Decision(ATTEMPT, status, attempt_count + 1)
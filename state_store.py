@@ -0,0 +1,238 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import queue
+import threading
+import time
+import uuid
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from daily_stats import Increments, merge_increments, period_increments, write_increments
+import models.models as models
+from jsonlog import log
+
+
+class SiteState:
+    """Hot state for one site, mirroring its newest RunnerSiteLog row.
+
+    Times are stored as epoch floats rather than datetimes to keep each
+    record small enough to hold very large fleets in memory.
+    """
+    __slots__ = (
+        "log_id",
+        "site_id",
+        "name",
+        "status",
+        "response_time",
+        "attempt_count",
+        "created_at",
+        "last_scan_time",
+        "ssl_days_remaining",
+    )
+
+    def __init__(
+        self,
+        log_id: uuid.UUID,
+        site_id: str,
+        name: str,
+        status: str,
+        response_time: float,
+        attempt_count: int,
+        created_at: float,
+        last_scan_time: float,
+        ssl_days_remaining: Optional[int]
+    ):
+        self.log_id = log_id
+        self.site_id = site_id
+        self.name = name
+        self.status = status
+        self.response_time = response_time
+        self.attempt_count = attempt_count
+        self.created_at = created_at
+        self.last_scan_time = last_scan_time
+        self.ssl_days_remaining = ssl_days_remaining
+
+    @classmethod
+    def from_log(cls, row: models.RunnerSiteLog) -> "SiteState":
+        return cls(
+            row.id,
+            row.site_id,
+            row.name,
+            row.status,
+            row.response_time,
+            row.attempt_count,
+            row.created_at.timestamp(),
+            row.last_scan_time.timestamp(),
+            row.ssl_days_remaining
+        )
+
+    def as_row(self) -> Dict:
+        return {
+            "id": self.log_id,
+            "site_id": self.site_id,
+            "name": self.name,
+            "status": self.status,
+            "response_time": self.response_time,
+            "attempt_count": self.attempt_count,
+            "created_at": datetime.fromtimestamp(self.created_at),
+            "last_scan_time": datetime.fromtimestamp(self.last_scan_time),
+            "ssl_days_remaining": self.ssl_days_remaining,
+        }
+
+
+class StateStore:
+    """Authoritative in-memory state for the runner.
+
+    The store is warm-started from the database once, after which the runner
+    only reads from memory. Writes are queued and applied in batches by a
+    background thread, so a pass never waits on SQLite.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 1000):
+        # Keyed by site ID
+        self.sites: Dict[str, SiteState] = {}
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # Bumped on every change. Seeded from the clock so versions keep
+        # increasing across runner restarts.
+        self.version = time.time_ns() // 1000
+        self.published_version: Optional[int] = None
+
+    def load(self, db: Session) -> None:
+        """Load the newest log row for every site in a single query."""
+        latest = db.query(
+            models.RunnerSiteLog.site_id,
+            func.max(models.RunnerSiteLog.last_scan_time).label("last_scan_time")
+        ).filter(
+            models.RunnerSiteLog.site_id.isnot(None)
+        ).group_by(models.RunnerSiteLog.site_id).subquery()
+
+        logs = db.query(models.RunnerSiteLog).join(
+            latest,
+            (models.RunnerSiteLog.site_id == latest.c.site_id)
+            & (models.RunnerSiteLog.last_scan_time == latest.c.last_scan_time)
+        ).all()
+
+        for row in logs:
+            current = self.sites.get(row.site_id)
+            # change_state can leave two rows with the same last_scan_time, keep the newer one
+            if current is None or row.created_at.timestamp() > current.created_at:
+                self.sites[row.site_id] = SiteState.from_log(row)
+
+        log.info("state_loaded", sites=len(self.sites))
+
+    def get(self, site_id: str, name: str) -> SiteState:
+        """Return the state for a site, creating an unknown one if it is new."""
+        state = self.sites.get(site_id)
+        if state is None:
+            now = time.time()
+            state = SiteState(uuid.uuid4(), site_id, name, "unknown", 0.0, 0, now, now, 0)
+            self.sites[site_id] = state
+            self._queue.put(("insert", state.as_row()))
+            self.version += 1
+            log.info("site_log_created", site=name)
+        elif state.name != name:
+            # Renamed sites keep their state, later rows use the new name
+            state.name = name
+        return state
+
+    def save(self, state: SiteState) -> None:
+        """Queue an update of the site's current log row."""
+        self._queue.put(("update", state.as_row()))
+        self.version += 1
+
+    def change_status(
+        self,
+        state: SiteState,
+        new_status: str,
+        response_time: float,
+        ssl_days_remaining: Optional[int]
+    ) -> None:
+        """Close the site's current log row and start a new one with a new status."""
+        now = time.time()
+        state.last_scan_time = now
+        self.save(state)
+        # The closed period goes into the site's daily uptime counters
+        self._queue.put(("stats", period_increments(state.site_id, state.status, state.created_at, now, new_status)))
+
+        state.log_id = uuid.uuid4()
+        state.status = new_status
+        state.response_time = response_time
+        state.attempt_count = 0
+        state.created_at = now
+        state.last_scan_time = now
+        state.ssl_days_remaining = ssl_days_remaining
+        self._queue.put(("insert", state.as_row()))
+        self.version += 1
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        self._writer = threading.Thread(target=self._write_loop, name="state-writer", daemon=True)
+        self._writer.start()
+
+    def close(self) -> None:
+        """Flush everything still queued and stop the writer."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self) -> None:
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: List) -> None:
+        inserts: Dict[uuid.UUID, Dict] = {}
+        updates: Dict[uuid.UUID, Dict] = {}
+        stats: Increments = {}
+
+        # Only the latest values for each row matter, and a row that is inserted
+        # in this batch can take its later updates directly
+        for operation, row in batch:
+            if operation == "stats":
+                merge_increments(stats, row)
+            elif operation == "insert":
+                inserts[row["id"]] = row
+            elif row["id"] in inserts:
+                inserts[row["id"]] = row
+            else:
+                updates[row["id"]] = row
+
+        db = self.session_factory()
+        try:
+            if inserts:
+                db.execute(insert(models.RunnerSiteLog), list(inserts.values()))
+            if updates:
+                db.execute(update(models.RunnerSiteLog), list(updates.values()))
+            write_increments(db, stats)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.error("state_persist_failed", error=str(e))
+        finally:
+            db.close()
+
+
+def backfill_site_ids(db: Session, sites: List[Dict[str, Any]]) -> None:
+    """Attach site IDs to log rows written before logs were keyed by site ID."""
+    for site in sites:
+        db.query(models.RunnerSiteLog).filter(
+            models.RunnerSiteLog.site_id.is_(None),
+            models.RunnerSiteLog.name == site["name"]
+        ).update({models.RunnerSiteLog.site_id: site["id"]}, synchronize_session=False)
+    db.commit()
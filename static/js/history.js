@@ -22,6 +22,14 @@ function initExportFunctionality() {
 
 // Export table data as CSV
 function exportTableData() {
+    // Prefer the server-side export, which covers the full history instead of the rows on the page
+    const searchQuery = document.getElementById('searchQuery');
+    const params = buildExportParams(parseSearchQuery(searchQuery ? searchQuery.value : ''));
+    if (params) {
+        window.location.href = `/api/history/export?${params.toString()}`;
+        return;
+    }
+    
     // Get the table data
     const tableData = getTableData();
     
@@ -47,6 +55,48 @@ function exportTableData() {
     downloadFile(csvContent, filename, 'text/csv');
 }
 
+// Translate search filters into server export parameters.
+// Returns null when the search uses something the export cannot express
+// (OR, !=, substring matches, url or duration), the visible rows are exported instead.
+function buildExportParams(filters) {
+    const params = new URLSearchParams({ format: 'csv' });
+    const statusValues = { healthy: 'up', down: 'down', slow: 'slow', expiring: 'token_alert' };
+    
+    // Tag filters are combined into one tag expression, starting with the page's own
+    const tagTerms = [];
+    const pageTags = new URLSearchParams(window.location.search).get('tags');
+    if (pageTags) tagTerms.push(`(${pageTags})`);
+    
+    for (const filter of filters) {
+        if (filter.logicalOperator === 'OR') return null;
+        
+        const value = removeQuotes(filter.value);
+        let param = null;
+        let paramValue = value;
+        
+        if (filter.field === 'status' && filter.operator === '=' && statusValues[value.toLowerCase()]) {
+            param = 'status';
+            paramValue = statusValues[value.toLowerCase()];
+        } else if (filter.field === 'name' && filter.operator === '=' && filter.exact) {
+            param = 'site';
+        } else if (filter.field === 'tags' && filter.operator === '=' && filter.exact) {
+            tagTerms.push(`"${value.replace(/["\\]/g, '\\$&')}"`);
+            continue;
+        } else if (filter.field === 'start_time' && filter.operator === '>' && /^\d{4}-\d{2}-\d{2}$/.test(value)) {
+            param = 'start';
+        } else if (filter.field === 'end_time' && filter.operator === '<' && /^\d{4}-\d{2}-\d{2}$/.test(value)) {
+            param = 'end';
+        }
+        
+        // Each parameter can only be given once, repeated AND filters on one field are left to the page
+        if (param === null || params.has(param)) return null;
+        params.set(param, paramValue);
+    }
+    
+    if (tagTerms.length > 0) params.set('tags', tagTerms.join(' and '));
+    return params;
+}
+
 // Get data from the table, respecting filters
 function getTableData() {
     const rows = document.querySelectorAll('#logResults tr.log-row');
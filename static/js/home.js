@@ -21,6 +21,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Table sorting functionality
     initTableSorting();
     
+    // Uptime bars under each site name
+    loadUptimeBars();
+    
     // Auto-refresh setup
     setupAutoRefresh();
     
@@ -363,6 +366,67 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Draw the recent probe outcomes for every site in a single request
+function loadUptimeBars() {
+    const canvases = document.querySelectorAll('canvas.uptime-bar');
+    if (canvases.length === 0) return;
+    
+    // Only the sites on the page, when it is filtered by tags
+    const tags = new URLSearchParams(window.location.search).get('tags');
+    fetch(tags ? `/api/uptime?tags=${encodeURIComponent(tags)}` : '/api/uptime')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Server responded with status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            const rootStyle = getComputedStyle(document.documentElement);
+            // Indexed by outcome: none, up, slow, down
+            const colors = [
+                rootStyle.getPropertyValue('--border-color').trim(),
+                rootStyle.getPropertyValue('--success-color').trim(),
+                rootStyle.getPropertyValue('--warning-color').trim(),
+                rootStyle.getPropertyValue('--danger-color').trim()
+            ];
+            
+            canvases.forEach(canvas => {
+                const encoded = data.sites[canvas.dataset.siteId];
+                if (encoded) {
+                    drawUptimeBar(canvas, encoded, data.samples, colors);
+                }
+            });
+        })
+        .catch(error => {
+            console.error('Error loading uptime bars:', error);
+        });
+}
+
+function drawUptimeBar(canvas, encoded, totalSamples, colors) {
+    const binary = atob(encoded);
+    const context = canvas.getContext('2d');
+    const width = canvas.width;
+    const samplesPerPixel = totalSamples / width;
+    // Samples are right aligned so the newest is always at the right edge
+    const offset = totalSamples - binary.length;
+    
+    context.clearRect(0, 0, width, canvas.height);
+    for (let x = 0; x < width; x++) {
+        const start = Math.max(0, Math.floor(x * samplesPerPixel) - offset);
+        const end = Math.floor((x + 1) * samplesPerPixel) - offset;
+        
+        // Show the worst outcome that falls into this pixel
+        let worst = -1;
+        for (let i = start; i < end && i < binary.length; i++) {
+            worst = Math.max(worst, binary.charCodeAt(i) >> 4);
+        }
+        if (worst < 0) continue;
+        
+        context.fillStyle = colors[worst] || colors[0];
+        context.fillRect(x, 0, 1, canvas.height);
+    }
+}
+
 // Auto-refresh functionality
 function setupAutoRefresh() {
     const dashboardContainer = document.querySelector('.dashboard-container');
@@ -5,6 +5,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const webhookToggleBtn = document.getElementById('webhookToggleBtn');
     const webhookEnabledInput = document.getElementById('webhookEnabled');
     const webhookUrlInput = document.getElementById('webhookUrl');
+    // ID of the destination this page edits, empty until one exists
+    const webhookIdInput = document.getElementById('webhookId');
     const testWebhookBtn = document.getElementById('testWebhookBtn');
     const debugToggleBtn = document.getElementById('debugToggleBtn');
     const includeErrorDebuggingInput = document.getElementById('includeErrorDebugging');
@@ -148,11 +150,22 @@ document.addEventListener('DOMContentLoaded', function() {
             const slowThreshold = document.getElementById('slowThreshold');
             const expiringTokenThreshold = document.getElementById('expiringTokenThreshold');
             
-            if (!scanInterval.value || !defaultTimeout.value || !slowThreshold.value || !expiringTokenThreshold.value) {
+            const attemptBeforeTrigger = document.getElementById('attemptBeforeTrigger');
+            const scanLagBudget = document.getElementById('scanLagBudget');
+            
+            if (!scanInterval.value || !defaultTimeout.value || !slowThreshold.value || !expiringTokenThreshold.value || !attemptBeforeTrigger.value) {
                 window.showNotification('Please fill out all required fields', 'error');
                 return;
             }
             
+            // An empty or out of range budget would be sent as null and rejected by the server.
+            // The browser leaves the value empty for anything that is not a number.
+            if (!scanLagBudget.value || !scanLagBudget.checkValidity()) {
+                window.showNotification('Scan lag budget must be a whole number of seconds between ' + scanLagBudget.min + ' and ' + scanLagBudget.max, 'error');
+                scanLagBudget.focus();
+                return;
+            }
+            
             // Show loading state
             saveSettingsBtn.disabled = true;
             const originalBtnHTML = saveSettingsBtn.innerHTML;
@@ -165,8 +178,13 @@ document.addEventListener('DOMContentLoaded', function() {
                     default_timeout: parseInt(defaultTimeout.value),
                     default_slow_threshold: parseFloat(slowThreshold.value),
                     expiring_token_threshold: parseInt(expiringTokenThreshold.value),
-                    attempt_before_trigger: parseInt(document.getElementById('attemptBeforeTrigger').value),
-                    include_error_debugging: document.getElementById('includeErrorDebugging').value === 'true'
+                    attempt_before_trigger: parseInt(attemptBeforeTrigger.value),
+                    scan_lag_budget: parseInt(scanLagBudget.value),
+                    include_error_debugging: document.getElementById('includeErrorDebugging').value === 'true',
+                    canary_targets: document.getElementById('canaryTargets').value
+                        .split(',')
+                        .map(target => target.trim())
+                        .filter(target => target !== '')
                 };
                 
                 // Get webhook settings
@@ -343,7 +361,10 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => {
             if (!response.ok) {
-                throw new Error('Failed to save global settings');
+                // The server names the setting it rejected
+                return response.json().catch(() => ({})).then(data => {
+                    throw new Error(data.detail || 'Failed to save global settings');
+                });
             }
             return response.json();
         })
@@ -366,9 +387,11 @@ document.addEventListener('DOMContentLoaded', function() {
             webhook.type = validation.type;
         }
         
-        // Always use PUT to update the existing webhook object
-        return fetch('/api/webhooks/0', {
-            method: 'PUT',
+        // The destination shown when the page loaded is updated by its ID,
+        // so changes made meanwhile to other destinations cannot shift it
+        const webhookId = webhookIdInput.value;
+        return fetch(webhookId ? '/api/webhooks/' + webhookId : '/api/webhooks', {
+            method: webhookId ? 'PUT' : 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
@@ -377,33 +400,32 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => {
             if (!response.ok) {
                 return response.json().then(data => {
-                    throw new Error(data.detail || 'Failed to save webhook');
+                    throw new Error(response.status === 404 ? 'This webhook was deleted meanwhile, reload the page' : (data.detail || 'Failed to save webhook'));
                 });
             }
             return response.json();
+        })
+        .then(data => {
+            webhookIdInput.value = data.id;
+            return data;
         });
     }
     
     // Function to delete webhook if it exists
     function deleteWebhookIfExists() {
-        // Instead of deleting, update with empty values
-        const emptyWebhook = {
-            type: '',
-            url: '',
-            enabled: false
-        };
-        
-        return fetch('/api/webhooks/0', {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(emptyWebhook)
+        const webhookId = webhookIdInput.value;
+        if (!webhookId) {
+            return Promise.resolve({ message: 'No webhook to clear' });
+        }
+        return fetch('/api/webhooks/' + webhookId, {
+            method: 'DELETE'
         })
         .then(response => {
-            if (!response.ok) {
+            // 404 means it was already deleted
+            if (!response.ok && response.status !== 404) {
                 throw new Error('Failed to clear webhook');
             }
+            webhookIdInput.value = '';
             return { message: 'Webhook cleared successfully' };
         });
     }
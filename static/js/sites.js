@@ -23,6 +23,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const triggerTypeSelect = document.getElementById('triggerType');
     const triggerValueInput = document.getElementById('triggerValue');
     const triggerHelp = document.getElementById('triggerHelp');
+    const probeTypeSelect = document.getElementById('probeType');
+    const probeHelp = document.getElementById('probeHelp');
     
     // Test and Response Preview elements
     const testSiteBtn = document.getElementById('testSiteBtn');
@@ -113,22 +115,25 @@ document.addEventListener('DOMContentLoaded', function() {
             
             const action = item.getAttribute('data-action');
             const siteCard = item.closest('.site-card');
-            const siteIndex = siteCard.getAttribute('data-site-index');
+            const siteId = siteCard.getAttribute('data-site-id');
             
             // Handle the action (scan, edit, delete)
-            handleSiteAction(action, siteCard, siteIndex);
+            handleSiteAction(action, siteCard, siteId);
         });
     });
     
     function openAddSiteModal() {
         // Reset form for adding new site
         siteForm.reset();
-        document.getElementById('siteIndex').value = '';
+        document.getElementById('siteId').value = '';
         document.getElementById('modalTitle').textContent = 'Add New Site';
         
         // Set default values
+        probeTypeSelect.value = 'get';
+        document.getElementById('sitePriority').value = 'normal';
         triggerTypeSelect.value = 'status_code';
         triggerValueInput.value = '200';
+        updateProbeHelp();
         updateTriggerHelp();
         
         // Pre-populate URL field with https://
@@ -175,7 +180,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 url: url,
                 trigger_type: triggerType,
                 trigger_value: triggerValue,
-                timeout: timeout
+                timeout: timeout,
+                probe: probeTypeSelect.value
             };
             
             // Add optional parameters if they exist
@@ -336,6 +342,34 @@ document.addEventListener('DOMContentLoaded', function() {
         triggerTypeSelect.addEventListener('change', updateTriggerHelp);
     }
     
+    // Update help text based on probe type
+    if (probeTypeSelect && probeHelp) {
+        probeTypeSelect.addEventListener('change', updateProbeHelp);
+    }
+    
+    const probeDescriptions = {
+        get: 'Full GET request, downloads the response body',
+        head: 'HEAD request, checks the status code without a body',
+        headers: 'GET request that disconnects once the headers arrive',
+        tcp: 'TCP connect only, the site is up if the port accepts connections',
+        tls: 'TLS handshake only, also reads the certificate expiry',
+        dns: 'DNS resolution only, the site is up if the hostname resolves',
+        heartbeat: 'Not probed, the site is down if no check-in arrives within the scan interval plus timeout'
+    };
+    
+    function updateProbeHelp() {
+        probeHelp.textContent = probeDescriptions[probeTypeSelect.value] || '';
+        
+        // Only the full GET probe downloads a body that text triggers can search
+        const textOption = triggerTypeSelect.querySelector('option[value="text"]');
+        textOption.disabled = probeTypeSelect.value !== 'get';
+        if (textOption.disabled && triggerTypeSelect.value === 'text') {
+            triggerTypeSelect.value = 'status_code';
+            triggerValueInput.value = '200';
+            updateTriggerHelp();
+        }
+    }
+    
     function updateTriggerHelp() {
         if (triggerTypeSelect.value === 'status_code') {
             triggerHelp.textContent = 'HTTP status code (usually 200) to verify the site is up';
@@ -382,14 +416,14 @@ document.addEventListener('DOMContentLoaded', function() {
         if (actionButton) {
             const action = actionButton.getAttribute('data-action');
             const card = actionButton.closest('.site-card');
-            const siteIndex = card.getAttribute('data-site-index');
+            const siteId = card.getAttribute('data-site-id');
             
             console.log('Action button clicked:', action);
             console.log('Site card element:', card);
-            console.log('Site index:', siteIndex);
+            console.log('Site id:', siteId);
             
             // Handle the action
-            handleSiteAction(action, card, siteIndex);
+            handleSiteAction(action, card, siteId);
         }
     });
     
@@ -445,7 +479,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             // Get site index if editing
-            const siteIndex = document.getElementById("siteIndex").value;
+            const siteId = document.getElementById("siteId").value;
             
             // Hide error if visible
             errorAlert.style.display = "none";
@@ -474,6 +508,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     type: triggerTypeInput.value,
                     value: triggerValueInput.value
                 },
+                probe: document.getElementById("probeType").value,
+                priority: document.getElementById("sitePriority").value,
                 timeout: parseInt(timeoutInput.value, 10) || 0,
                 scan_interval: parseInt(scanIntervalInput.value, 10) || 0,
                 monitor_expiring_token: isMonitoringToken,
@@ -495,21 +531,15 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             let endpoint = '/api/sites';
-            if (siteIndex !== '') {
-                const siteIndexInt = parseInt(siteIndex, 10);
-                if (isNaN(siteIndexInt)) {
-                    console.error('Invalid site index:', siteIndex);
-                    alert('Error: Invalid site index');
-                    return;
-                }
-                endpoint = `/api/sites/${siteIndexInt}`;
+            if (siteId !== '') {
+                endpoint = `/api/sites/${encodeURIComponent(siteId)}`;
             }
             
             console.log('Submitting to URL:', endpoint);
             console.log('Form data:', siteData);
             
             fetch(endpoint, {
-                method: siteIndex === '' ? 'POST' : 'PUT',
+                method: siteId === '' ? 'POST' : 'PUT',
                 headers: {
                     'Content-Type': 'application/json'
                 },
@@ -524,7 +554,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(data => {
                 // Success notification
                 if (window.showNotification) {
-                    window.showNotification(`Site ${siteIndex === '' ? 'added' : 'updated'} successfully`, 'success');
+                    window.showNotification(`Site ${siteId === '' ? 'added' : 'updated'} successfully`, 'success');
                 }
                 
                 // Close modal and reload page to show changes
@@ -549,13 +579,10 @@ document.addEventListener('DOMContentLoaded', function() {
     // Handle delete confirmation
     if (confirmDeleteBtn) {
         confirmDeleteBtn.addEventListener('click', function() {
-            const siteIndexStr = document.getElementById('deleteIndex').value;
-            
-            // Make sure siteIndex is an integer
-            const siteIndexInt = parseInt(siteIndexStr, 10);
-            if (isNaN(siteIndexInt)) {
-                console.error('Invalid site index for deletion:', siteIndexStr);
-                alert('Error: Invalid site index');
+            const siteId = document.getElementById('deleteId').value;
+            if (!siteId) {
+                console.error('Missing site id for deletion');
+                alert('Error: Invalid site id');
                 return;
             }
             
@@ -564,9 +591,9 @@ document.addEventListener('DOMContentLoaded', function() {
             confirmDeleteBtn.disabled = true;
             confirmDeleteBtn.innerHTML = '<svg class="spinner" viewBox="0 0 50 50"><circle cx="25" cy="25" r="20"></circle></svg> Deleting...';
             
-            console.log('Deleting site with index:', siteIndexInt);
+            console.log('Deleting site with id:', siteId);
             
-            fetch(`/api/sites/${siteIndexInt}`, {
+            fetch(`/api/sites/${encodeURIComponent(siteId)}`, {
                 method: 'DELETE'
             })
             .then(response => {
@@ -717,14 +744,14 @@ document.addEventListener('DOMContentLoaded', function() {
         
         const siteCards = document.querySelectorAll('.site-card');
         siteCards.forEach(card => {
-            const siteIndex = card.getAttribute('data-site-index');
+            const siteId = card.getAttribute('data-site-id');
             
             // Edit buttons
             const editBtns = card.querySelectorAll('.btn-edit');
             editBtns.forEach(btn => {
                 btn.addEventListener('click', function(e) {
                     e.preventDefault();
-                    handleSiteAction('edit', card, siteIndex);
+                    handleSiteAction('edit', card, siteId);
                 });
             });
             
@@ -733,7 +760,7 @@ document.addEventListener('DOMContentLoaded', function() {
             deleteBtns.forEach(btn => {
                 btn.addEventListener('click', function(e) {
                     e.preventDefault();
-                    handleSiteAction('delete', card, siteIndex);
+                    handleSiteAction('delete', card, siteId);
                 });
             });
         });
@@ -898,22 +925,21 @@ function getCellValue(cell) {
 }
 
 // Function to handle site actions from either grid or list view
-function handleSiteAction(action, card, siteIndex) {
-    console.log('handleSiteAction called with:', action, siteIndex);
+function handleSiteAction(action, card, siteId) {
+    console.log('handleSiteAction called with:', action, siteId);
     
-    // Make sure siteIndex is an integer
-    const siteIndexInt = parseInt(siteIndex, 10);
-    if (isNaN(siteIndexInt)) {
-        console.error('Invalid site index:', siteIndex);
-        alert('Error: Invalid site index');
+    if (!siteId) {
+        console.error('Missing site id');
+        alert('Error: Invalid site id');
         return;
     }
     
     if (action === 'edit') {
         // Fetch site data for editing
-        console.log('Attempting to fetch site data from:', `/api/sites/${siteIndexInt}`);
+        const siteUrl = `/api/sites/${encodeURIComponent(siteId)}`;
+        console.log('Attempting to fetch site data from:', siteUrl);
         
-        fetch(`/api/sites/${siteIndexInt}`)
+        fetch(siteUrl)
             .then(response => {
                 console.log('Response status:', response.status);
                 if (!response.ok) {
@@ -924,13 +950,16 @@ function handleSiteAction(action, card, siteIndex) {
             .then(data => {
                 console.log('Received site data:', data);
                 // Populate form with site data
-                document.getElementById('siteIndex').value = siteIndexInt;
+                document.getElementById('siteId').value = siteId;
                 document.getElementById('siteName').value = data.name;
                 document.getElementById('siteUrl').value = data.url;
                 document.getElementById('timeout').value = data.timeout;
                 document.getElementById('scanInterval').value = data.scan_interval || 0;
+                document.getElementById('probeType').value = data.probe || 'get';
+                document.getElementById('sitePriority').value = data.priority || 'normal';
                 document.getElementById('triggerType').value = data.trigger.type;
                 document.getElementById('triggerValue').value = data.trigger.value;
+                document.getElementById('probeType').dispatchEvent(new Event('change'));
                 
                 // Handle token expiry field
                 const monitorTokenExpiry = document.getElementById('monitorTokenExpiry');
@@ -993,7 +1022,7 @@ function handleSiteAction(action, card, siteIndex) {
     }
     else if (action === 'delete') {
         // Set up delete confirmation
-        document.getElementById('deleteIndex').value = siteIndexInt;
+        document.getElementById('deleteId').value = siteId;
         deleteModal.style.display = 'flex';
     }
 }
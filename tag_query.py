@@ -0,0 +1,128 @@
+from typing import AbstractSet, Dict, FrozenSet, List, Tuple, Union
+import re
+
+# Tag expressions select sites by their tags:
+#   prod                      sites tagged prod
+#   prod and (eu or us)       "and"/"&" (or just a space) bind tighter than "or"/"|"/","
+#   team-a, team-b            a comma is "or", so a plain list matches any of the tags
+#   prod and not legacy       "not"/"!" negates, quote tags that contain spaces or operators
+TOKEN = re.compile(r'\s*(?:([()|&,!])|"((?:[^"\\]|\\.)*)"|([^\s()|&,!"]+))')
+KEYWORDS = {"and": "&", "or": "|", "not": "!"}
+
+Node = Union[Tuple[str, str], Tuple[str, "Node"], Tuple[str, List["Node"]]]
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """Split an expression into ("op", symbol) and ("tag", name) tokens."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character at position {position}")
+        symbol, quoted, word = match.groups()
+        if symbol is not None:
+            tokens.append(("op", symbol))
+        elif quoted is not None:
+            tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+        elif word.lower() in KEYWORDS:
+            tokens.append(("op", KEYWORDS[word.lower()]))
+        else:
+            tokens.append(("tag", word))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ("end", "")
+
+    def take(self, symbol: str) -> bool:
+        if self.peek() == ("op", symbol):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> Node:
+        node = self.parse_or()
+        if self.peek()[0] != "end":
+            raise ValueError(f"Unexpected '{self.peek()[1]}'")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.take("|") or self.take(","):
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and(self) -> Node:
+        children = [self.parse_not()]
+        while True:
+            if self.take("&"):
+                children.append(self.parse_not())
+            elif self.peek()[0] == "tag" or self.peek() in (("op", "("), ("op", "!")):
+                # Terms next to each other are combined with "and"
+                children.append(self.parse_not())
+            else:
+                break
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_not(self) -> Node:
+        if self.take("!"):
+            return ("not", self.parse_not())
+        if self.take("("):
+            node = self.parse_or()
+            if not self.take(")"):
+                raise ValueError("Missing ')'")
+            return node
+        kind, value = self.peek()
+        if kind != "tag":
+            raise ValueError("Expected a tag" if kind == "end" else f"Unexpected '{value}'")
+        self.position += 1
+        return ("tag", value)
+
+
+def parse_tag_query(text: str) -> Node:
+    """Parse a tag expression, raising ValueError if it is malformed."""
+    tokens = tokenize(text)
+    if not tokens:
+        raise ValueError("Empty tag expression")
+    return Parser(tokens).parse()
+
+
+def evaluate(node: Node, index: Dict[str, FrozenSet[str]], everything: AbstractSet[str]) -> AbstractSet[str]:
+    """Return the IDs matching a parsed expression, given the tag -> IDs index.
+
+    The work is proportional to the sizes of the tag sets involved: "and"
+    starts from its smallest operand and negated operands are subtracted
+    rather than complemented. Only an expression that is nothing but a
+    negation has to look at every site.
+    """
+    kind = node[0]
+    if kind == "tag":
+        return index.get(node[1], frozenset())
+    if kind == "not":
+        return everything - evaluate(node[1], index, everything)
+    if kind == "or":
+        result = set()
+        for child in node[1]:
+            result |= evaluate(child, index, everything)
+        return result
+
+    positive = [evaluate(child, index, everything) for child in node[1] if child[0] != "not"]
+    negative = [evaluate(child[1], index, everything) for child in node[1] if child[0] == "not"]
+    if positive:
+        positive.sort(key=len)
+        result = set(positive[0])
+        for other in positive[1:]:
+            result &= other
+    else:
+        result = set(everything)
+    for other in negative:
+        result -= other
+    return result
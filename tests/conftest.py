@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import database
+from database import Base
+import models.models  # noqa: F401, registers the tables on Base
+
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a fresh in-memory database with every table created."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    An empty data directory to work in. The app's engine was created with the
+    database path already made absolute, so it is pointed at this directory too.
+    """
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'data' / 'simple_site_monitor.db'}", connect_args={"check_same_thread": False})
+    original = database.engine
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    yield tmp_path / "data"
+    database.SessionLocal.configure(bind=original)
+    engine.dispose()
@@ -0,0 +1,170 @@
+"""
+Load test for the web app's routes: starts uvicorn on a throwaway copy of the
+data directory and measures how a cheap request fares beside growing numbers
+of clients on expensive ones.
+
+    python tests/load_routes.py [--clients 1,2,4,8,16] [--seconds 4] [--sites 1500]
+
+Three runs:
+- /api/stats over 90 days of daily stats for every site, with the latency of
+  /api/sites measured alongside
+- /api/test-site against a local server that takes a second to answer, again
+  with /api/sites alongside
+- a site's stats while another process write locks the database 100 ms out of
+  every 150, the way a large runner batch does
+
+Not collected by pytest, the numbers depend on the machine.
+"""
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PORT = 8766
+SLOW_PORT = 8767
+SLOW_SECONDS = 1.0
+
+LOCKER = """
+import sqlite3, time
+c = sqlite3.connect('data/simple_site_monitor.db', isolation_level=None)
+while True:
+    c.execute('BEGIN EXCLUSIVE'); time.sleep(0.1); c.execute('COMMIT'); time.sleep(0.05)
+"""
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(SLOW_SECONDS)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def prepare(workdir: str, sites: int) -> None:
+    """A data directory with one real site and daily stats for many more."""
+    for name in ("templates", "static"):
+        os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    os.mkdir(os.path.join(workdir, "data"))
+    with open(os.path.join(ROOT, "data", "config_sample.json")) as f:
+        config = json.load(f)
+    config["sites"] = [dict(config["sites"][0], name="Local", url=f"http://127.0.0.1:{SLOW_PORT}/")]
+    with open(os.path.join(workdir, "data", "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+    # database.py opens data/ relative to the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import insert
+    from database import engine
+    import models.models as models
+    models.Base.metadata.create_all(bind=engine)
+    rows = [
+        {
+            "site_id": f"s{index}", "day": (date.today() - timedelta(days=days)).isoformat(),
+            "up_seconds": 80000, "slow_seconds": 0, "down_seconds": 6400, "token_alert_seconds": 0,
+            "unknown_seconds": 0, "incidents": 2, "recoveries": 2, "repair_seconds": 6400,
+        }
+        for index in range(sites) for days in range(90)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(models.SiteDailyStats), rows)
+    engine.dispose()
+
+
+async def worker(client, method, path, until, latencies, body=None):
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        response = await client.request(method, path, json=body)
+        assert response.status_code == 200, (path, response.status_code)
+        latencies.append(time.perf_counter() - started)
+
+
+def p50(latencies):
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000 if latencies else float("nan")
+
+
+async def beside(client, clients, seconds, method, path, body=None):
+    """Requests per second of clients hitting path, and the /api/sites p50 meanwhile."""
+    print(f"{method} {path} clients  req/s   p50 ms | /api/sites p50 ms alongside")
+    for count in clients:
+        latencies, fast = [], []
+        until = time.perf_counter() + seconds
+        tasks = [worker(client, method, path, until, latencies, body) for _ in range(count)]
+        tasks.append(worker(client, "GET", "/api/sites", until, fast))
+        await asyncio.gather(*tasks)
+        print(f"{count:>{len(method) + len(path) + 9}}  {len(latencies) / seconds:6.1f}  {p50(latencies):7.1f} | {p50(fast):7.1f}")
+
+
+async def contention(client, clients, seconds, site_id):
+    locker = subprocess.Popen([sys.executable, "-c", LOCKER])
+    try:
+        print("site stats with writer contention: clients  req/s   p50 ms")
+        for count in clients:
+            latencies = []
+            until = time.perf_counter() + seconds
+            await asyncio.gather(*[worker(client, "GET", f"/api/sites/{site_id}/stats?days=7", until, latencies) for _ in range(count)])
+            print(f"{count:41}  {len(latencies) / seconds:6.1f}  {p50(latencies):7.1f}")
+    finally:
+        locker.terminate()
+
+
+async def run(clients, seconds):
+    limits = httpx.Limits(max_connections=64)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=60, limits=limits) as client:
+        for _ in range(100):
+            try:
+                sites = (await client.get("/api/sites")).json()
+                break
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError("the app did not start")
+        await client.get("/api/stats?days=90")
+
+        await beside(client, clients, seconds, "GET", "/api/stats?days=90")
+        test_body = {"url": f"http://127.0.0.1:{SLOW_PORT}/", "trigger_type": "status_code", "trigger_value": "200", "probe": "get", "timeout": 5}
+        await beside(client, clients, seconds, "POST", "/api/test-site", test_body)
+        await contention(client, clients, seconds, sites[0]["id"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure route throughput and latency under concurrent clients.")
+    parser.add_argument("--clients", default="1,2,4,8,16", help="Comma separated client counts")
+    parser.add_argument("--seconds", type=float, default=4, help="Duration of each step")
+    parser.add_argument("--sites", type=int, default=1500, help="Sites with 90 days of daily stats")
+    args = parser.parse_args()
+    clients = [int(value) for value in args.clients.split(",") if value.strip()]
+
+    slow_server = ThreadingHTTPServer(("127.0.0.1", SLOW_PORT), SlowHandler)
+    threading.Thread(target=slow_server.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp(prefix="ssm-load-")
+    server = None
+    try:
+        prepare(workdir, args.sites)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(APP_PORT), "--log-level", "warning"],
+            env=dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL="warning"),
+            stdout=subprocess.DEVNULL
+        )
+        asyncio.run(run(clients, args.seconds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        slow_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
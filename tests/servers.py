@@ -0,0 +1,220 @@
+"""Local stand-ins for monitored sites, each counting the connections and requests it served."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import select
+import socket
+import ssl
+import subprocess
+import threading
+import time
+
+ETAG = '"v1"'
+BODY = b"ok"
+
+
+def self_signed_cert(directory: str):
+    """A certificate for 127.0.0.1 and its key, made with the openssl command."""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", keyfile, "-out", certfile,
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True
+    )
+    return certfile, keyfile
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers every path with 200 and an ETag, or 304 when it is sent back, after the server's delay."""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.open_sockets.add(self.connection)
+
+    def finish(self):
+        super().finish()
+        with self.server.lock:
+            self.server.open_sockets.discard(self.connection)
+
+    def respond(self, body: bool):
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.delay)
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        if body:
+            self.wfile.write(BODY)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPServer(ThreadingHTTPServer):
+    """HTTP/1.1, over TLS when given a certificate."""
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0, certfile: str = None, keyfile: str = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.delay = delay
+        self.status = 200
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.open_sockets = set()
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            context.set_alpn_protocols(["http/1.1"])
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = "https"
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        # Kept-alive connections would otherwise go on answering
+        with self.lock:
+            for sock in self.open_sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class H2Server:
+    """
+    HTTP/2 over TLS with the h2 library, answering like Handler. Each connection
+    is served by one thread, and responses wait out the delay without holding
+    up the other streams of the connection.
+    """
+
+    def __init__(self, certfile: str, keyfile: str, delay: float = 0.0):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.context.set_alpn_protocols(["h2"])
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.running = True
+
+    @property
+    def url(self) -> str:
+        return f"https://127.0.0.1:{self.socket.getsockname()[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.accept, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.running = False
+        self.socket.close()
+
+    def accept(self):
+        while self.running:
+            try:
+                sock, _ = self.socket.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self.serve, args=(sock,), daemon=True).start()
+
+    def serve(self, sock):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        try:
+            sock = self.context.wrap_socket(sock, server_side=True)
+        except (ssl.SSLError, OSError):
+            sock.close()
+            return
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        connection.initiate_connection()
+        sock.sendall(connection.data_to_send())
+        # (due time, stream ID, method, request headers)
+        pending = []
+        try:
+            while self.running:
+                timeout = max(0.0, min(due for due, *_ in pending) - time.monotonic()) if pending else 1.0
+                # TLS may already hold decrypted data the socket does not show as readable
+                if sock.pending() or select.select([sock], [], [], timeout)[0]:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    for event in connection.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            with self.lock:
+                                self.requests += 1
+                            headers = dict(event.headers)
+                            pending.append((time.monotonic() + self.delay, event.stream_id, headers[":method"], headers))
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+
+                now = time.monotonic()
+                for item in [item for item in pending if item[0] <= now]:
+                    pending.remove(item)
+                    _, stream_id, method, headers = item
+                    try:
+                        self.respond(connection, stream_id, method, headers)
+                    except h2.exceptions.StreamClosedError:
+                        # The headers probe resets its stream once the headers arrive
+                        pass
+                sock.sendall(connection.data_to_send())
+        except (OSError, ssl.SSLError, h2.exceptions.ProtocolError):
+            return
+        finally:
+            sock.close()
+
+    @staticmethod
+    def respond(connection, stream_id, method, headers):
+        if headers.get("if-none-match") == ETAG:
+            connection.send_headers(stream_id, [(":status", "304"), ("etag", ETAG)], end_stream=True)
+            return
+        response_headers = [
+            (":status", "200"),
+            ("content-type", "text/plain"),
+            ("content-length", str(len(BODY))),
+            ("etag", ETAG),
+        ]
+        if method == "HEAD":
+            connection.send_headers(stream_id, response_headers, end_stream=True)
+        else:
+            connection.send_headers(stream_id, response_headers)
+            connection.send_data(stream_id, BODY, end_stream=True)
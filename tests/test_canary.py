@@ -0,0 +1,152 @@
+import importlib
+import json
+import os
+import socket
+import pytest
+from canary import ConnectivityCanary
+from servers import HTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def closed_port() -> int:
+    """A port nothing listens on: bound once to pick it, then released."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def target(port: int) -> str:
+    return f"127.0.0.1:{port}"
+
+
+def test_reachable_target_means_online():
+    with HTTPServer() as server:
+        canary = ConnectivityCanary()
+        assert canary.check([target(server.port)], timeout=1)
+        assert canary.online
+
+
+def test_unreachable_targets_mean_offline_until_one_answers():
+    canary = ConnectivityCanary(recheck_interval=0)
+    port = closed_port()
+    assert not canary.check([target(port), target(closed_port())], timeout=1)
+    assert not canary.online
+    assert canary.lost_at is not None
+
+    with HTTPServer(port=port):
+        assert canary.check([target(port)], timeout=1, force=True)
+    assert canary.online
+    assert canary.restored_at >= canary.lost_at
+
+
+def test_no_targets_disables_the_check():
+    canary = ConnectivityCanary()
+    assert canary.check([])
+    assert canary.online
+
+
+def test_recent_success_is_trusted():
+    canary = ConnectivityCanary(recheck_interval=60)
+    with HTTPServer() as server:
+        assert canary.check([target(server.port)], timeout=1)
+        checked_at = canary.checked_at
+    # The target is gone, but the last check is recent enough to skip probing it
+    assert canary.check([target(server.port)], timeout=1)
+    assert canary.checked_at == checked_at
+
+
+class RecordingNotifier:
+    """Stands in for the webhook destinations, keeping what would have been sent."""
+    active = True
+
+    def __init__(self):
+        self.alerts = []
+        self.events = []
+
+    def configure(self, registry):
+        pass
+
+    def route(self, alerts):
+        self.alerts.extend(alert["status"] for alert in alerts)
+        return []
+
+    def broadcast(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def runner_env(data_dir, monkeypatch):
+    """The runner module working in an empty data directory, with one site and one canary target on local ports."""
+    site_port, canary_port = closed_port(), closed_port()
+    with open(os.path.join(ROOT, "data", "config_sample.json")) as f:
+        config = json.load(f)
+    config.update(attempt_before_trigger=0, default_timeout=1, canary_timeout=1, canary_targets=[target(canary_port)])
+    config["sites"] = [dict(config["sites"][0], name="Local", url=f"http://127.0.0.1:{site_port}/", webhook=True)]
+    (data_dir / "config.json").write_text(json.dumps(config))
+
+    import runner
+    # Reloaded so it imports the temporary config file into the temporary database
+    runner = importlib.reload(runner)
+    notifier = RecordingNotifier()
+    monkeypatch.setattr(runner, "notifier", notifier)
+    monkeypatch.setattr(runner.idle, "wait", lambda seconds: None)
+
+    from heartbeat import HeartbeatTracker
+    from overload import LoadModel
+    from state_store import StateStore
+    from uptime import UptimeRecorder
+    store = StateStore()
+    store.start()
+    canary = ConnectivityCanary(recheck_interval=0)
+    args = (store, UptimeRecorder(), HeartbeatTracker(), canary, LoadModel())
+    yield runner, args, notifier, site_port, canary_port
+    store.close()
+
+
+def test_outage_of_the_runner_suppresses_alerts(runner_env):
+    runner, args, notifier, site_port, canary_port = runner_env
+    store, canary = args[0], args[3]
+
+    def status():
+        return next(iter(store.sites.values())).status
+
+    def run_pass():
+        # Make the site due again without waiting out its interval
+        for state in store.sites.values():
+            state.last_scan_time -= 3600
+        runner.runner(*args)
+
+    # Site and canary target up
+    with HTTPServer(port=site_port), HTTPServer(port=canary_port):
+        run_pass()
+    assert status() == "up"
+    assert notifier.alerts == ["up"]
+
+    # Both unreachable: the runner is offline, the site keeps its state and
+    # nothing is sent, as it could not be delivered
+    notifier.alerts.clear()
+    run_pass()
+    assert not canary.online
+    assert status() == "up"
+    assert notifier.alerts == []
+    assert notifier.events == []
+
+    # Passes while offline only retry the canary
+    run_pass()
+    assert status() == "up"
+    assert notifier.alerts == []
+    assert notifier.events == []
+
+    # Connectivity is back but the site is still down: that is a real outage.
+    # The one notification tells when connectivity was lost.
+    with HTTPServer(port=canary_port):
+        run_pass()
+    assert canary.online
+    assert [event.title for event in notifier.events] == ["Runner connectivity restored"]
+    assert notifier.events[0].message.startswith("Lost at ")
+    assert status() == "down"
+    assert notifier.alerts == ["down"]
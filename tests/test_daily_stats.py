@@ -0,0 +1,53 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from daily_stats import period_increments, split_by_day, summarize
+
+DAY = date(2025, 3, 10)
+MIDNIGHT = datetime.combine(DAY + timedelta(days=1), time()).timestamp()
+
+
+def test_mttr_and_mtbf_from_counters():
+    summary = summarize({
+        "up_seconds": 9000, "slow_seconds": 500, "token_alert_seconds": 500,
+        "down_seconds": 1000, "unknown_seconds": 4000,
+        "incidents": 4, "recoveries": 3, "repair_seconds": 900,
+    })
+    # Unknown time is neither serving nor down
+    assert summary["availability"] == pytest.approx(10000 / 11000 * 100, abs=1e-4)
+    # Only outages that ended count towards the repair time
+    assert summary["mttr_seconds"] == 300
+    assert summary["mtbf_seconds"] == 2500
+    assert summary["incidents"] == 4 and summary["recoveries"] == 3
+
+
+def test_no_incidents_or_observed_time():
+    summary = summarize({"unknown_seconds": 60})
+    assert summary["availability"] is None
+    assert summary["mttr_seconds"] is None
+    assert summary["mtbf_seconds"] is None
+    assert summarize({"up_seconds": 60})["availability"] == 100
+
+
+def test_outage_counts_an_incident_and_a_recovery_with_its_length():
+    start = MIDNIGHT - 7200
+    increments = period_increments("site", "up", start, start + 600, "down")
+    period_increments("site", "down", start + 600, start + 1500, "up", increments)
+    counters = increments[("site", DAY.isoformat())]
+    assert counters == {"up_seconds": 600, "incidents": 1, "down_seconds": 900, "recoveries": 1, "repair_seconds": 900}
+    assert summarize(counters)["mttr_seconds"] == 900
+
+
+def test_periods_are_split_at_midnight():
+    assert list(split_by_day(MIDNIGHT - 100, MIDNIGHT + 50)) == [
+        (DAY.isoformat(), 100),
+        ((DAY + timedelta(days=1)).isoformat(), 50),
+    ]
+    # An outage ending after midnight is counted on the day it ended
+    increments = period_increments("site", "down", MIDNIGHT - 100, MIDNIGHT + 50, "up")
+    assert increments[("site", DAY.isoformat())] == {"down_seconds": 100}
+    assert increments[("site", (DAY + timedelta(days=1)).isoformat())] == {"down_seconds": 50, "recoveries": 1, "repair_seconds": 150}
+
+
+def test_running_period_counts_only_its_time():
+    increments = period_increments("site", "down", MIDNIGHT - 100, MIDNIGHT - 40)
+    assert increments == {("site", DAY.isoformat()): {"down_seconds": 60}}
@@ -0,0 +1,68 @@
+import uuid
+import database
+from database import upgrade_schema
+from history_export import build_filters, iter_batches
+
+OLD_LOG_TABLE = """
+CREATE TABLE runner_run_log (
+    id UUID NOT NULL,
+    site_id VARCHAR,
+    name VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    response_time FLOAT NOT NULL,
+    attempt_count INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    last_scan_time DATETIME NOT NULL,
+    ssl_days_remaining INTEGER,
+    PRIMARY KEY (id)
+)
+"""
+
+
+def test_log_ids_stored_as_numbers_are_converted(data_dir):
+    kept = uuid.uuid4().hex
+    with database.engine.begin() as connection:
+        connection.exec_driver_sql(OLD_LOG_TABLE)
+        connection.exec_driver_sql("CREATE INDEX ix_runner_run_log_site_id ON runner_run_log (site_id)")
+        # The hex IDs SQLite read as an integer and as a real
+        for index, log_id in enumerate([kept, "00000000000000000000000000000042", "12e45678901234567890123456789012"]):
+            connection.exec_driver_sql(
+                "INSERT INTO runner_run_log VALUES (?, 'a', 'Site a', 'up', 0.1, 0, ?, ?, 0)",
+                (log_id, f"2026-01-01 00:00:0{index}.000000", f"2026-01-01 00:00:0{index}.000000")
+            )
+        assert connection.exec_driver_sql("SELECT typeof(id) FROM runner_run_log ORDER BY created_at").scalars().all() == ["text", "integer", "real"]
+
+    database.Base.metadata.create_all(database.engine)
+    upgrade_schema()
+    # Running it again finds nothing to convert
+    upgrade_schema()
+
+    with database.engine.begin() as connection:
+        assert connection.exec_driver_sql("SELECT type FROM pragma_table_info('runner_run_log') WHERE name = 'id'").scalar() == "CHAR(32)"
+        assert connection.exec_driver_sql("SELECT typeof(id) FROM runner_run_log").scalars().all() == ["text"] * 3
+        indexes = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'runner_run_log'").scalars())
+        assert {"ix_runner_run_log_site_id", "ix_runner_run_log_created_at"} <= indexes
+        assert not connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE name = 'runner_run_log_old'").all()
+
+    rows = [row for batch in iter_batches(build_filters(None), batch_size=2) for row in batch]
+    assert rows[0][0] == uuid.UUID(kept)
+    assert all(isinstance(row[0], uuid.UUID) for row in rows)
+    assert len({row[0] for row in rows}) == 3
+
+
+def test_webhook_ids_are_not_reused_after_the_upgrade(data_dir):
+    with database.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE webhook (id INTEGER NOT NULL, type VARCHAR NOT NULL, url VARCHAR NOT NULL, enabled BOOLEAN NOT NULL, "
+            "name VARCHAR, tags VARCHAR, statuses VARCHAR, PRIMARY KEY (id))"
+        )
+        connection.exec_driver_sql("INSERT INTO webhook VALUES (1, 'discord', 'https://a', 1, 'a', '', ''), (2, 'slack', 'https://b', 1, 'b', '', '')")
+
+    database.Base.metadata.create_all(database.engine)
+    upgrade_schema()
+
+    with database.engine.begin() as connection:
+        assert connection.exec_driver_sql("SELECT id, name FROM webhook ORDER BY id").all() == [(1, "a"), (2, "b")]
+        connection.exec_driver_sql("DELETE FROM webhook WHERE id = 2")
+        connection.exec_driver_sql("INSERT INTO webhook (type, url, enabled) VALUES ('discord', 'https://c', 1)")
+        assert connection.exec_driver_sql("SELECT max(id) FROM webhook").scalar() == 3
@@ -0,0 +1,49 @@
+import math
+import pytest
+from downsample import lttb, minmax, span_outcomes
+
+COUNT = 1000
+XS = list(range(COUNT))
+YS = [math.sin(x / 40) * 100 + (500 if x == 617 else 0) for x in XS]
+
+
+@pytest.mark.parametrize("points", [3, 10, 99, 500])
+def test_lttb_keeps_exactly_the_requested_points(points):
+    xs, ys = lttb(XS, YS, points)
+    assert len(xs) == len(ys) == points
+    assert xs[0] == XS[0] and xs[-1] == XS[-1]
+    assert xs == sorted(set(xs))
+    assert all(YS[x] == y for x, y in zip(xs, ys))
+
+
+def test_lttb_keeps_a_spike():
+    xs, _ = lttb(XS, YS, 50)
+    assert 617 in xs
+
+
+def test_lttb_returns_short_series_unchanged():
+    assert lttb(XS[:20], YS[:20], 20) == (XS[:20], YS[:20])
+    assert lttb([], [], 10) == ([], [])
+
+
+@pytest.mark.parametrize("buckets", [1, 7, 100, 5000])
+def test_minmax_keeps_at_most_two_points_per_bucket(buckets):
+    xs, ys = minmax(XS, YS, XS, YS, buckets)
+    assert len(xs) == len(ys) <= 2 * min(buckets, COUNT)
+    assert xs == sorted(xs)
+    # The extremes of the whole series always survive
+    assert max(ys) == max(YS) and min(ys) == min(YS)
+
+
+def test_minmax_uses_the_low_and_high_points_of_rollups():
+    # Each block has its minimum and maximum at different times
+    xs, ys = minmax([0, 10], [5, 1], [4, 14], [50, 90], 1)
+    assert list(zip(xs, ys)) == [(10, 1), (14, 90)]
+
+
+def test_outage_between_kept_points_still_shows():
+    starts = [0, 10, 20, 30, 40]
+    outcomes = bytes([0, 0, 3, 0, 0])
+    # Only the first and last items were kept, the outage at 20 falls in between
+    assert span_outcomes(starts, outcomes, [0, 40], 0) == [3, 0]
+    assert span_outcomes(starts, outcomes, [15], 0) == [3]
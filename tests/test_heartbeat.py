@@ -0,0 +1,54 @@
+from datetime import datetime
+import time
+from sqlalchemy import insert
+import models.models as models
+from heartbeat import HeartbeatBuffer, HeartbeatTracker
+
+
+def test_late_flush_with_an_older_ping_is_still_read(session_factory):
+    now = time.time()
+    tracker = HeartbeatTracker(session_factory)
+    first, second = HeartbeatBuffer(session_factory), HeartbeatBuffer(session_factory)
+
+    second.write({"b": [now, "up", 1]})
+    tracker.refresh()
+    assert set(tracker.pings) == {"b"}
+
+    # Pinged earlier on another worker, flushed after the runner read "b"
+    first.write({"a": [now - 5, "up", 1]})
+    tracker.refresh()
+    assert tracker.pings["a"] == (datetime.fromtimestamp(now - 5).timestamp(), "up")
+
+    # A web clock stepping back does not hide the next ping either
+    second.write({"b": [now - 60, "down", 1]})
+    tracker.refresh()
+    assert tracker.pings["b"][1] == "down"
+
+
+def test_each_write_gets_a_higher_seq(session_factory):
+    buffer = HeartbeatBuffer(session_factory)
+    now = time.time()
+    buffer.write({"a": [now, "up", 1], "b": [now, "up", 1]})
+    buffer.write({"a": [now, "up", 2]})
+
+    db = session_factory()
+    try:
+        rows = {row.site_id: row for row in db.query(models.Heartbeat)}
+    finally:
+        db.close()
+    assert rows["a"].seq > rows["b"].seq
+    assert rows["a"].ping_count == 3
+
+
+def test_rows_from_before_seq_are_read_once(session_factory):
+    with session_factory() as db:
+        db.execute(insert(models.Heartbeat), [{"site_id": "old", "status": "up", "last_ping": datetime.now(), "ping_count": 1, "seq": None}])
+        db.commit()
+    tracker = HeartbeatTracker(session_factory)
+    tracker.refresh()
+    assert "old" in tracker.pings
+    assert tracker.cursor == 0
+
+    HeartbeatBuffer(session_factory).write({"new": [time.time(), "up", 1]})
+    tracker.refresh()
+    assert "new" in tracker.pings
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import io
+import sqlite3
+import uuid
+import pytest
+from sqlalchemy import insert
+import models.models as models
+from history_export import EXPORT_SITE_CHUNK, build_filters, export_columnar, iter_batches, parse_time, read_columnar
+
+
+class Registry:
+    """Just what build_filters needs of a SiteRegistry: every site carries the tag "all"."""
+
+    def __init__(self, site_ids):
+        self.sites = [{"id": site_id, "name": f"Site {site_id}"} for site_id in site_ids]
+
+    def select(self, tags):
+        return self.sites if tags == "all" else []
+
+    def resolve(self, key):
+        return None
+
+
+def add_history(session_factory, site_ids, rows_per_site):
+    start = datetime(2026, 1, 1)
+    rows = [
+        {
+            "id": uuid.uuid4(), "site_id": site_id, "name": f"Site {site_id}", "status": "up",
+            "response_time": 0.1, "attempt_count": 0,
+            "created_at": start + timedelta(minutes=index * len(site_ids) + position),
+            "last_scan_time": start + timedelta(minutes=index * len(site_ids) + position + 1),
+            "ssl_days_remaining": 0,
+        }
+        for position, site_id in enumerate(site_ids) for index in range(rows_per_site)
+    ]
+    with session_factory() as db:
+        db.execute(insert(models.RunnerSiteLog), rows)
+        db.commit()
+    return rows
+
+
+@pytest.fixture
+def parameter_limit(session_factory):
+    """Builds differ in how many bound parameters a query may have, hold the test database to SQLite's old default of 999."""
+    with session_factory.kw["bind"].connect() as connection:
+        connection.connection.dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    return 999
+
+
+def exported(queries, session_factory, batch_size=100):
+    return [row for batch in iter_batches(queries, session_factory, batch_size) for row in batch]
+
+
+def test_tag_filter_beyond_the_parameter_limit(session_factory, parameter_limit):
+    site_ids = [f"s{index}" for index in range(parameter_limit * 2)]
+    rows = add_history(session_factory, site_ids[:50], 20)
+    add_history(session_factory, ["untagged"], 5)
+
+    queries = build_filters(Registry(site_ids), tags="all")
+    assert len(queries) == -(-len(site_ids) // EXPORT_SITE_CHUNK)
+
+    result = exported(queries, session_factory)
+    assert [row[0] for row in result] == [row["id"] for row in sorted(rows, key=lambda row: row["created_at"])]
+
+
+def test_chunks_merge_in_export_order(session_factory):
+    site_ids = [f"s{index}" for index in range(EXPORT_SITE_CHUNK * 2 + 10)]
+    add_history(session_factory, site_ids, 2)
+
+    queries = build_filters(Registry(site_ids), tags="all", statuses="healthy")
+    assert len(queries) == 3
+    result = exported(queries, session_factory, batch_size=250)
+    assert len(result) == len(site_ids) * 2
+    assert [row[6] for row in result] == sorted(row[6] for row in result)
+    assert len({row[0] for row in result}) == len(result)
+
+
+def test_tag_filter_includes_rows_without_site_id(session_factory):
+    rows = add_history(session_factory, ["a"], 2)
+    legacy = add_history(session_factory, [None], 2)
+    # Legacy rows are named after the site, as add_history names them after its ID
+    with session_factory() as db:
+        db.query(models.RunnerSiteLog).filter(models.RunnerSiteLog.site_id.is_(None)).update({models.RunnerSiteLog.name: "Site a"})
+        db.commit()
+    add_history(session_factory, ["b"], 2)
+
+    result = exported(build_filters(Registry(["a"]), tags="all"), session_factory)
+    assert {row[0] for row in result} == {row["id"] for row in rows + legacy}
+
+
+def test_tag_filter_matching_nothing(session_factory):
+    add_history(session_factory, ["a"], 3)
+    assert exported(build_filters(Registry(["a"]), tags="none"), session_factory) == []
+
+
+def test_columnar_round_trip(session_factory):
+    rows = add_history(session_factory, ["a", "b"], 3)
+    data = b"".join(export_columnar(iter_batches(build_filters(Registry(["a", "b"])), session_factory, 4)))
+    groups = list(read_columnar(io.BytesIO(data)))
+    assert [len(group["id"]) for group in groups] == [4, 2]
+    assert [value for group in groups for value in group["id"]] == [row["id"] for row in sorted(rows, key=lambda row: row["created_at"])]
+
+
+@pytest.mark.parametrize("value", ["inf", "1e300", "-1e20", "nan", "9999-12-31", "yesterday"])
+def test_unusable_times_are_value_errors(value):
+    with pytest.raises(ValueError):
+        parse_time(value, end_of_day=True)
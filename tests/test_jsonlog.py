@@ -0,0 +1,55 @@
+import io
+import json
+import sys
+import threading
+import pytest
+from jsonlog import JsonLogger
+
+THREADS = 8
+EVENTS = 2000
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Switching threads as often as possible makes unlocked updates lose counts
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def log_from_threads(logger: JsonLogger, event: str) -> None:
+    def work():
+        for _ in range(EVENTS):
+            logger.info(event)
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_sampling_counts_every_event_across_threads():
+    stream = io.StringIO()
+    logger = JsonLogger(stream=stream, level="info", sample_rates={"scan": 10})
+    log_from_threads(logger, "scan")
+    logger.close()
+    assert logger.sample_counts["scan"] == THREADS * EVENTS
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == THREADS * EVENTS // 10
+    assert all(line["sampled"] == 10 for line in lines)
+
+
+def test_dropped_lines_are_counted_across_threads():
+    stream = io.StringIO()
+    logger = JsonLogger(stream=stream, level="info", max_queue=10)
+    # A writer that has not started yet, so the queue fills up
+    logger.thread = threading.Thread(target=logger.run, daemon=True)
+    log_from_threads(logger, "scan")
+    assert logger.dropped == THREADS * EVENTS - 10
+
+    logger.thread.start()
+    logger.close()
+    dropped = [json.loads(line) for line in stream.getvalue().splitlines() if '"log_dropped"' in line]
+    assert dropped[0]["count"] == THREADS * EVENTS - 10
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import ssl
+import time
+import pytest
+import probes
+from multiplex import MultiplexProber, origin
+from probes import ResponseCache, run_probe
+from servers import H2Server, HTTPServer, self_signed_cert
+
+pytest.importorskip("httpx")
+pytest.importorskip("h2")
+
+# Each response takes this long, so probes sent one after the other add up
+DELAY = 0.2
+PROBES = 10
+
+
+@pytest.fixture(scope="module")
+def cert(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("needs the openssl command")
+    return self_signed_cert(str(tmp_path_factory.mktemp("cert")))
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(probes, "response_cache", ResponseCache())
+
+
+@pytest.fixture
+def prober(cert):
+    prober = MultiplexProber(verify=ssl.create_default_context(cafile=cert[0]))
+    yield prober
+    prober.close()
+
+
+def due_probes(url, probe_type="get", expect_text=None):
+    return [(index, probe_type, f"{url}/health/{index}", 5, expect_text) for index in range(PROBES)]
+
+
+def test_same_origin_probes_share_one_connection(cert, prober):
+    with H2Server(*cert, delay=DELAY) as server:
+        requests = due_probes(server.url) + [("head", "head", f"{server.url}/head", 5, None), ("headers", "headers", f"{server.url}/headers", 5, None)]
+        started = time.perf_counter()
+        results = prober.probe(requests)
+        elapsed = time.perf_counter() - started
+
+        assert set(results) == {request[0] for request in requests}
+        assert all(result.reachable and result.status_code == 200 for result in results.values())
+        assert all(result.response_time >= DELAY for result in results.values())
+        assert server.connections == 1
+        assert elapsed < DELAY * PROBES / 2
+        assert not prober.http1_origins
+
+
+def test_conditional_probes_over_http2(cert, prober):
+    with H2Server(*cert) as server:
+        requests = due_probes(server.url, expect_text="ok")
+        first = prober.probe(requests)
+        assert all(result.text_found and not result.not_modified for result in first.values())
+
+        second = prober.probe(requests)
+        assert all(result.not_modified and result.text_found for result in second.values())
+        assert server.connections == 1
+        assert len(probes.response_cache.entries) == PROBES
+
+
+def test_http1_origin_falls_back(cert, prober, monkeypatch):
+    monkeypatch.setenv("REQUESTS_CA_BUNDLE", cert[0])
+    with HTTPServer(certfile=cert[0], keyfile=cert[1]) as server:
+        requests = due_probes(server.url)
+        results = prober.probe(requests)
+        assert all(result.reachable and result.status_code == 200 for result in results.values())
+        assert origin(server.url) in prober.http1_origins
+        # Later passes leave the origin to the HTTP/1.1 probes
+        assert prober.groups(requests) == []
+        assert run_probe("get", requests[0][2], 5).status_code == 200
+
+
+def test_multiplexing_against_http1(cert, prober, monkeypatch):
+    """Connections and wall time for one origin's probes: HTTP/1.1 one by one, HTTP/1.1 in parallel, HTTP/2."""
+    monkeypatch.setenv("REQUESTS_CA_BUNDLE", cert[0])
+    with HTTPServer(DELAY, *cert) as sequential_server, HTTPServer(DELAY, *cert) as parallel_server, H2Server(*cert, delay=DELAY) as h2_server:
+        started = time.perf_counter()
+        for _, probe_type, url, timeout, _ in due_probes(sequential_server.url):
+            assert run_probe(probe_type, url, timeout).reachable
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(PROBES) as executor:
+            results = list(executor.map(lambda request: run_probe(request[1], request[2], request[3]), due_probes(parallel_server.url)))
+        parallel = time.perf_counter() - started
+        assert all(result.reachable for result in results)
+
+        started = time.perf_counter()
+        assert all(result.reachable for result in prober.probe(due_probes(h2_server.url)).values())
+        multiplexed = time.perf_counter() - started
+
+    print(
+        f"\n{PROBES} probes, {DELAY * 1000:.0f} ms each:"
+        f"\n  HTTP/1.1 sequential {sequential_server.connections:>3} connections {sequential * 1000:7.1f} ms"
+        f"\n  HTTP/1.1 parallel   {parallel_server.connections:>3} connections {parallel * 1000:7.1f} ms"
+        f"\n  HTTP/2 multiplexed  {h2_server.connections:>3} connections {multiplexed * 1000:7.1f} ms"
+    )
+    assert h2_server.connections == 1
+    assert parallel_server.connections > 1
+    assert multiplexed < sequential / 3
@@ -0,0 +1,82 @@
+import time
+from overload import LoadModel
+
+
+class Registry:
+    def __init__(self, sites):
+        self.version = 1
+        self.sites = sites
+
+
+def model(probe_seconds=0.01):
+    load = LoadModel(lag_budget=30)
+    load.prepare(Registry([{"name": f"s{i}", "scan_interval": 60, "probe": "get"} for i in range(10)]), 60)
+    load.record_probe(probe_seconds)
+    return load
+
+
+def test_restart_is_not_overload():
+    load = model()
+    now = time.time()
+    load.start_pass()
+    # Sites last scanned hours before the runner started are due, not late
+    for _ in range(10):
+        load.record_lag("normal", now - 7200, 60, now)
+    assert load.finish_pass() is None
+    assert not load.overloaded
+
+
+def test_time_offline_is_not_overload():
+    load = model()
+    now = time.time()
+    load.lag_since = now - 7200
+    load.resume(now - 1)
+    load.start_pass()
+    load.record_lag("normal", now - 3600, 60, now)
+    assert load.finish_pass() is None
+
+
+def test_late_probes_start_overload():
+    load = model()
+    now = time.time()
+    load.lag_since = now - 3600
+    load.start_pass()
+    load.record_lag("normal", now - 120, 60, now)
+    assert load.finish_pass() is True
+    assert load.lag["normal"] == 60
+
+
+def test_demand_beyond_capacity_stretches_low_and_normal_only():
+    load = LoadModel()
+    load.prepare(Registry(
+        [{"name": "c", "priority": "critical", "scan_interval": 10, "probe": "get"}]
+        + [{"name": f"l{i}", "priority": "low", "scan_interval": 10, "probe": "get"} for i in range(20)]
+    ), 60)
+    load.record_probe(0.5)
+    load.start_pass()
+    assert load.finish_pass() is True
+    assert load.stretch["critical"] == 1.0
+    assert load.stretch["low"] > 1.0
+
+
+def test_overload_keeps_non_critical_sites_out_of_the_http2_batch(data_dir, monkeypatch):
+    import runner
+    from state_store import StateStore
+    batched = []
+    monkeypatch.setattr(runner.multiplexer, "probe", lambda due: batched.extend(site_id for site_id, *_ in due) or {})
+    sites = [
+        {"id": priority, "name": priority, "priority": priority, "probe": "get", "url": f"https://example.com/{priority}",
+         "scan_interval": 60, "timeout": 5, "trigger": {"type": "status", "value": "200"}}
+        for priority in ("critical", "normal", "low")
+    ]
+    config = {"default_scan_interval": 60, "default_timeout": 5}
+    load = model()
+
+    runner.prefetch_probes(sites, StateStore(), config, load)
+    assert batched == ["critical", "normal", "low"]
+
+    # Probes the pass might shed are left to the pass
+    batched.clear()
+    load.overloaded = True
+    runner.prefetch_probes(sites, StateStore(), config, load)
+    assert batched == ["critical"]
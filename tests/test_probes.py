@@ -0,0 +1,77 @@
+import socket
+import threading
+import time
+import pytest
+import probes
+from probes import ResponseCache, run_probe
+from servers import HTTPServer
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    cache = ResponseCache()
+    monkeypatch.setattr(probes, "response_cache", cache)
+    return cache
+
+
+def test_dns_probe_gives_up_after_the_timeout(monkeypatch):
+    release = threading.Event()
+
+    def hanging_lookup(*args, **kwargs):
+        release.wait(10)
+        raise socket.gaierror("resolver gave up")
+
+    monkeypatch.setattr(probes.socket, "getaddrinfo", hanging_lookup)
+    started = time.perf_counter()
+    result = run_probe("dns", "https://hanging.example", 0.2)
+    elapsed = time.perf_counter() - started
+    release.set()
+
+    assert not result.reachable
+    assert "timed out" in result.detail
+    assert elapsed < 1
+
+
+def test_dns_probe_resolves():
+    result = run_probe("dns", "http://localhost:8080", 5)
+    assert result.reachable
+    assert "localhost resolved to" in result.detail
+
+
+def test_conditional_get_reuses_the_last_result_on_a_304(response_cache):
+    with HTTPServer() as server:
+        url = server.url + "/"
+        first = run_probe("get", url, 5, conditional=True, expect_text="ok")
+        assert first.status_code == 200 and first.text_found and not first.not_modified
+
+        second = run_probe("get", url, 5, conditional=True, expect_text="ok")
+        assert second.not_modified
+        assert second.reachable and second.status_code == 200
+        assert second.content_type == "text/plain"
+        assert second.text_found is True
+        assert second.text is None
+        assert server.requests == 2
+
+
+def test_new_text_trigger_downloads_the_body_again(response_cache):
+    with HTTPServer() as server:
+        url = server.url + "/"
+        run_probe("get", url, 5, conditional=True, expect_text="ok")
+        # No validators are sent, a 304 would leave nothing to search
+        result = run_probe("get", url, 5, conditional=True, expect_text="missing")
+        assert not result.not_modified
+        assert result.text_found is False
+        assert response_cache.get(url).matches == {"ok": True, "missing": False}
+
+
+def test_error_response_forgets_the_cached_result(response_cache):
+    with HTTPServer() as server:
+        url = server.url + "/"
+        run_probe("get", url, 5, conditional=True)
+        assert response_cache.get(url) is not None
+        server.status = 503
+        # The validators are still sent, the server answers in full this time
+        response_cache.get(url).etag = '"stale"'
+        result = run_probe("get", url, 5, conditional=True)
+        assert result.status_code == 503 and not result.not_modified
+        assert response_cache.get(url) is None
@@ -0,0 +1,63 @@
+from registry import RegistryCache
+
+
+class Versions:
+    """A config version source counting how often it is read."""
+
+    def __init__(self):
+        self.version = 1
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return self.version
+
+
+def test_max_age_reuses_a_recent_version_check(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("registry.time.monotonic", lambda: now[0])
+    versions = Versions()
+    cache = RegistryCache(lambda: {"sites": []}, versions)
+
+    registry = cache.get(max_age=5)
+    assert versions.reads == 1
+
+    # The config changes, but the last check is recent enough
+    versions.version = 2
+    now[0] += 4
+    assert cache.get(max_age=5) is registry
+    assert versions.reads == 1
+
+    now[0] += 2
+    assert cache.get(max_age=5).version == 2
+    assert versions.reads == 2
+
+
+def test_without_max_age_every_get_checks_the_version():
+    versions = Versions()
+    cache = RegistryCache(lambda: {"sites": []}, versions)
+    cache.get()
+    cache.get()
+    assert versions.reads == 2
+
+
+def test_default_max_age_and_invalidate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("registry.time.monotonic", lambda: now[0])
+    versions = Versions()
+    cache = RegistryCache(lambda: {"sites": []}, versions, max_age=2)
+
+    cache.get()
+    now[0] += 1
+    cache.get()
+    assert versions.reads == 1
+
+    # A change made by this process is seen at once
+    versions.version = 2
+    cache.invalidate()
+    assert cache.get().version == 2
+    assert versions.reads == 2
+
+    # An explicit max_age of 0 always checks
+    cache.get(max_age=0)
+    assert versions.reads == 3
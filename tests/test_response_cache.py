@@ -0,0 +1,88 @@
+import asyncio
+import gzip
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import response_cache
+from response_cache import CachedBody, ResponseCache, cached_response, make_etag
+
+BODY = {"sites": ["x" * 40] * 40}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """An app serving one cached route, counting how often it is rendered."""
+    monkeypatch.setattr(response_cache, "response_cache", ResponseCache())
+    app = FastAPI()
+    app.state.version = 1
+    app.state.renders = 0
+
+    @app.get("/data")
+    def data(request: Request):
+        def render():
+            app.state.renders += 1
+            return JSONResponse(BODY)
+        return cached_response(request, "data", app.state.version, render)
+
+    return app
+
+
+def get(app, **headers):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/data", headers=headers)
+    return asyncio.run(run())
+
+
+def test_matching_etag_gets_an_empty_304(app):
+    first = get(app)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag == make_etag("data", 1)
+
+    second = get(app, **{"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    # Strong and weak forms of the tag, and lists of tags, match too
+    assert get(app, **{"If-None-Match": etag.removeprefix("W/")}).status_code == 304
+    assert get(app, **{"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert app.state.renders == 1
+
+
+def test_new_version_gets_a_new_etag_and_body(app):
+    etag = get(app).headers["etag"]
+    app.state.version = 2
+    response = get(app, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json() == BODY
+    assert app.state.renders == 2
+
+
+def test_compressed_and_plain_bodies_share_the_cache(app):
+    compressed = get(app, **{"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == BODY
+    plain = get(app, **{"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == BODY
+    assert compressed.headers["etag"] == plain.headers["etag"]
+    assert app.state.renders == 1
+
+
+def test_cache_evicts_least_recently_used_entries():
+    cache = ResponseCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, CachedBody(b"body", None, make_etag(key, 1)))
+    cache.get("a")
+    cache.put("c", CachedBody(b"body", None, make_etag("c", 1)))
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.total_bytes == 8
+
+
+def test_small_bodies_are_not_compressed():
+    assert CachedBody(b"small", None, '"x"').encoded == {}
+    large = CachedBody(b"x" * 1024, None, '"x"')
+    assert gzip.decompress(large.encoded["gzip"]) == b"x" * 1024
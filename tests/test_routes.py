@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import time
+import httpx
+import database
+import pytest
+from fastapi import FastAPI
+import routes.history
+import routes.home
+
+SLOW_SECONDS = 1.0
+
+
+class SlowResponse:
+    status_code = 204
+
+
+@pytest.fixture
+def app(monkeypatch):
+    def slow_post(*args, **kwargs):
+        time.sleep(SLOW_SECONDS)
+        return SlowResponse()
+
+    monkeypatch.setattr(routes.home.requests, "post", slow_post)
+    app = FastAPI()
+    app.include_router(routes.home.router)
+    return app
+
+
+def test_slow_webhook_test_does_not_block_other_requests(app):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            slow = asyncio.ensure_future(client.post("/api/test-webhook", json={"url": "https://hooks.slack.com/services/T/B/X", "type": "slack"}))
+            # Let the slow request reach its handler first
+            await asyncio.sleep(0.1)
+            fast = await client.post("/api/validate-webhook", json={"url": "https://discord.com/api/webhooks/1/x"})
+            fast_elapsed = time.perf_counter() - started
+            return await slow, fast, fast_elapsed
+
+    slow, fast, fast_elapsed = asyncio.run(run())
+    assert slow.status_code == 200 and slow.json()["success"]
+    assert fast.json() == {"valid": True, "type": "discord"}
+    assert fast_elapsed < SLOW_SECONDS / 2
+
+
+def test_out_of_range_export_times_are_rejected(monkeypatch):
+    monkeypatch.setattr(routes.history, "get_site_registry", lambda: None)
+    app = FastAPI()
+    app.include_router(routes.history.router)
+
+    async def get(path):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+
+    for query in ("start=inf", "end=1e300", "start=-1e20"):
+        response = asyncio.run(get(f"/api/history/export?{query}"))
+        assert response.status_code == 400, query
+
+
+def request_all(app, requests):
+    """Send the (method, path, body) requests one after the other and return the responses."""
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await client.request(method, path, json=body) for method, path, body in requests]
+    return asyncio.run(run())
+
+
+def test_webhooks_are_addressed_by_stable_ids(data_dir):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "data", "config_sample.json")) as f:
+        config = json.load(f)
+    config.pop("webhooks")
+    (data_dir / "config.json").write_text(json.dumps(config))
+    database.Base.metadata.create_all(database.engine)
+    app = FastAPI()
+    app.include_router(routes.home.router)
+
+    def webhook(name):
+        return {"name": name, "type": "discord", "url": f"https://discord.com/api/webhooks/{name}/x"}
+
+    first, second = [response.json()["id"] for response in request_all(app, [("POST", "/api/webhooks", webhook("a")), ("POST", "/api/webhooks", webhook("b"))])]
+    deleted, updated, third, stale = request_all(app, [
+        ("DELETE", f"/api/webhooks/{second}", None),
+        # Deleting the other destination did not move this one
+        ("PUT", f"/api/webhooks/{first}", {"enabled": False}),
+        ("POST", "/api/webhooks", webhook("c")),
+        # A client still holding the deleted ID does not reach the new destination
+        ("PUT", f"/api/webhooks/{second}", {"enabled": False}),
+    ])
+    assert deleted.status_code == 200 and updated.status_code == 200
+    assert third.json()["id"] not in (first, second)
+    assert stale.status_code == 404
+
+    listed = request_all(app, [("GET", "/api/webhooks", None)])[0].json()
+    assert [(item["id"], item["name"], item["enabled"]) for item in listed] == [(first, "a", False), (third.json()["id"], "c", True)]
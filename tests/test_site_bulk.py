@@ -0,0 +1,66 @@
+import json
+import pytest
+import site_bulk
+import site_store
+
+
+def site(name, **fields):
+    return dict({"name": name, "url": f"https://{name}.example.com", "trigger_type": "status_code", "trigger_value": "200"}, **fields)
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    result = site_bulk.apply_site_rows(db, [site("existing", tags="a;b")])
+    assert result["applied"]
+    db.commit()
+    yield db
+    db.close()
+
+
+def names(db):
+    return sorted(row["name"] for row in site_store.load_sites(db))
+
+
+def test_rows_are_applied_and_matched_by_name(db):
+    result = site_bulk.apply_site_rows(db, [site("existing", scan_interval="30"), site("new"), {"op": "delete", "name": "missing"}])
+    db.commit()
+    assert result["applied"]
+    assert (result["created"], result["updated"], result["deleted"], result["failed"]) == (1, 1, 0, 1)
+    assert [r["ok"] for r in result["results"]] == [True, True, False]
+    assert result["results"][2]["error"] == "Site not found"
+    assert names(db) == ["existing", "new"]
+    existing = next(row for row in site_store.load_sites(db) if row["name"] == "existing")
+    assert existing["scan_interval"] == 30
+
+
+def test_atomic_batch_with_a_failing_row_writes_nothing(db):
+    result = site_bulk.apply_site_rows(db, [site("new"), site("bad", trigger_value="abc")], atomic=True)
+    db.commit()
+    assert not result["applied"]
+    assert result["failed"] == 1
+    # The valid row is still reported, it is only not written
+    assert result["results"][0] == {"row": 1, "ok": True, "action": "created", "id": result["results"][0]["id"], "name": "new"}
+    assert names(db) == ["existing"]
+
+
+def test_dry_run_only_validates(db):
+    result = site_bulk.apply_site_rows(db, [site("new"), {"op": "delete", "name": "existing"}], dry_run=True)
+    db.commit()
+    assert not result["applied"]
+    assert (result["created"], result["deleted"], result["failed"]) == (1, 1, 0)
+    assert names(db) == ["existing"]
+
+
+def test_conflicts_within_a_batch_fail_the_later_row(db):
+    result = site_bulk.apply_site_rows(db, [site("existing"), site("existing", url="https://other.example.com")])
+    assert [r["ok"] for r in result["results"]] == [True, False]
+    assert result["results"][1]["error"] == "Site appears more than once in this batch"
+
+
+def test_invalid_json_lines_become_row_errors(db):
+    rows = site_bulk.parse_rows(json.dumps(site("new")) + "\n\n{not json\n", "ndjson")
+    result = site_bulk.apply_site_rows(db, rows, atomic=True)
+    assert [r["ok"] for r in result["results"]] == [True, False]
+    assert result["results"][1]["error"].startswith("Invalid JSON")
+    assert not result["applied"]
@@ -0,0 +1,94 @@
+import json
+import os
+import pytest
+import site_store
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.json"
+    with open(os.path.join(ROOT, "data", "config_sample.json")) as f:
+        path.write_text(f.read())
+    return path
+
+
+def test_import_keeps_the_imported_file_as_a_backup(config_path, session_factory):
+    original = config_path.read_text()
+    site_store.import_config_file(str(config_path), session_factory)
+
+    settings = json.loads(config_path.read_text())
+    assert "sites" not in settings and "webhooks" not in settings
+    assert (config_path.parent / "config.json.bak").read_text() == original
+    assert sorted(os.listdir(config_path.parent)) == ["config.json", "config.json.bak"]
+
+    db = session_factory()
+    try:
+        assert len(site_store.load_sites(db)) == len(json.loads(original)["sites"])
+    finally:
+        db.close()
+
+
+def test_failed_write_leaves_the_file_in_place(config_path, session_factory, monkeypatch):
+    original = config_path.read_text()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(site_store.json, "dump", fail)
+    with pytest.raises(OSError):
+        site_store.import_config_file(str(config_path), session_factory)
+    assert config_path.read_text() == original
+    assert os.listdir(config_path.parent) == ["config.json"]
+
+
+def write_sites(path, sites):
+    config = json.loads(path.read_text())
+    template = json.load(open(os.path.join(ROOT, "data", "config_sample.json")))["sites"][0]
+    config["sites"] = [dict(template, **site) for site in sites]
+    path.write_text(json.dumps(config))
+
+
+def stored_sites(session_factory):
+    db = session_factory()
+    try:
+        return {site["name"]: site for site in site_store.load_sites(db)}
+    finally:
+        db.close()
+
+
+def test_name_conflicts_do_not_fail_the_import(config_path, session_factory):
+    write_sites(config_path, [{"id": "a", "name": "Alpha", "url": "https://a.example"}, {"id": "b", "name": "Beta"}])
+    site_store.import_config_file(str(config_path), session_factory)
+
+    write_sites(config_path, [
+        # Same name, new ID: updates the existing site and keeps its ID
+        {"id": "a2", "name": "Alpha", "url": "https://a2.example"},
+        # An existing site renamed to another existing site's name
+        {"id": "b", "name": "Alpha"},
+        # The same new name twice
+        {"id": "c", "name": "Gamma"},
+        {"id": "d", "name": "Gamma"},
+    ])
+    site_store.import_config_file(str(config_path), session_factory)
+
+    sites = stored_sites(session_factory)
+    assert sorted(sites) == ["Alpha", "Beta", "Gamma"]
+    assert sites["Alpha"]["id"] == "a"
+    assert sites["Alpha"]["url"] == "https://a2.example"
+    assert sites["Gamma"]["id"] == "c"
+    assert "sites" not in json.loads(config_path.read_text())
+
+
+def test_import_sites_reports_conflicts(session_factory):
+    db = session_factory()
+    try:
+        site_store.import_sites(db, [dict(json.load(open(os.path.join(ROOT, "data", "config_sample.json")))["sites"][0], id="a")])
+        db.commit()
+        template = site_store.load_sites(db)[0]
+        result = site_store.import_sites(db, [dict(template, id="new"), dict(template, id="other", name="Other"), dict(template, id="again", name="Other")])
+        db.commit()
+    finally:
+        db.close()
+    assert result == {"matched_by_name": ["Google"], "skipped": ["Other"]}
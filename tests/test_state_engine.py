@@ -0,0 +1,113 @@
+import itertools
+import random
+import pytest
+from state_engine import ATTEMPT, CHANGE, KEEP, Decision, Thresholds, decide
+
+THRESHOLDS = Thresholds(slow_threshold=2.0, expiring_token_threshold=10, attempts_before_trigger=2)
+
+
+def runner_before_extraction(status, attempt_count, up, reachable, response_time, thresholds, ssl_days_remaining, monitor_expiring_token):
+    """
+    The runner's branches before they moved into decide(), kept as they were.
+    change_state and update_last_scan_time both leave the attempt count at 0.
+    """
+    # SSL token alert takes priority
+    if monitor_expiring_token and reachable and ssl_days_remaining is not None and ssl_days_remaining <= thresholds.expiring_token_threshold:
+        if status != "token_alert":
+            return Decision(CHANGE, "token_alert", 0)
+        return Decision(KEEP, status, 0)
+
+    # Check for slow response
+    if reachable and response_time >= thresholds.slow_threshold and up:
+        if status != "slow":
+            return Decision(CHANGE, "slow", 0)
+        return Decision(KEEP, status, 0)
+
+    # Handle up/down status
+    if status == "up" and up:
+        return Decision(KEEP, status, 0)
+    if status == "down" and not up:
+        return Decision(KEEP, status, 0)
+    if attempt_count >= thresholds.attempts_before_trigger:
+        return Decision(CHANGE, "up" if up else "down", 0)
+    return Decision(ATTEMPT, status, attempt_count + 1)
+
+
+def both(status, attempt_count, up, reachable, response_time, thresholds, ssl_days_remaining, monitor_expiring_token):
+    new = decide(status, attempt_count, up, reachable, response_time, thresholds, ssl_days_remaining if monitor_expiring_token else None)
+    old = runner_before_extraction(status, attempt_count, up, reachable, response_time, thresholds, ssl_days_remaining, monitor_expiring_token)
+    return new, old
+
+
+def test_matches_the_runner_on_every_boundary():
+    grid = itertools.product(
+        ("up", "slow", "down", "token_alert", "unknown"),
+        range(5),                          # attempt count
+        (True, False),                     # up
+        (True, False),                     # reachable
+        (0.1, 1.999, 2.0, 5.0),            # response time around the slow threshold
+        (None, -1, 0, 10, 11, 365),        # certificate days around the expiry threshold
+        (True, False),                     # certificate monitored
+        range(4),                          # attempts before trigger
+    )
+    for status, attempts, up, reachable, response_time, ssl_days, monitored, trigger in grid:
+        thresholds = THRESHOLDS._replace(attempts_before_trigger=trigger)
+        new, old = both(status, attempts, up, reachable, response_time, thresholds, ssl_days, monitored)
+        assert new == old, (status, attempts, up, reachable, response_time, ssl_days, monitored, trigger)
+
+
+def test_matches_the_runner_on_random_inputs():
+    rng = random.Random(47)
+    for _ in range(20000):
+        thresholds = Thresholds(rng.uniform(0.1, 5), rng.randint(0, 30), rng.randint(0, 5))
+        args = (
+            rng.choice(("up", "slow", "down", "token_alert", "unknown")),
+            rng.randint(0, 6),
+            rng.random() < 0.7,
+            rng.random() < 0.8,
+            rng.uniform(0, 6),
+            thresholds,
+            rng.choice((None, rng.randint(-5, 60))),
+            rng.random() < 0.5,
+        )
+        new, old = both(*args)
+        assert new == old, args
+
+
+@pytest.mark.parametrize("status, attempts, up, reachable, response_time, ssl_days, expected", [
+    # An expiring certificate wins over a slow response and over an outage
+    ("up", 0, True, True, 5.0, 3, Decision(CHANGE, "token_alert", 0)),
+    ("down", 0, False, True, 0.1, 3, Decision(CHANGE, "token_alert", 0)),
+    ("token_alert", 1, True, True, 5.0, 3, Decision(KEEP, "token_alert", 0)),
+    # ...but not when the site cannot be reached to read it
+    ("up", 0, False, False, 0.0, 3, Decision(ATTEMPT, "up", 1)),
+    # Slow is reported at once, and only for a met trigger on a reachable site
+    ("up", 0, True, True, 2.0, None, Decision(CHANGE, "slow", 0)),
+    ("down", 0, True, True, 2.0, None, Decision(CHANGE, "slow", 0)),
+    ("slow", 2, True, True, 3.0, None, Decision(KEEP, "slow", 0)),
+    ("up", 0, False, True, 5.0, None, Decision(ATTEMPT, "up", 1)),
+    # A fast response after slow counts as an attempt before going back up
+    ("slow", 0, True, True, 0.1, None, Decision(ATTEMPT, "slow", 1)),
+    ("slow", 2, True, True, 0.1, None, Decision(CHANGE, "up", 0)),
+    # Confirmed status resets the count
+    ("up", 2, True, True, 0.1, None, Decision(KEEP, "up", 0)),
+    ("down", 1, False, False, 0.0, None, Decision(KEEP, "down", 0)),
+    # A certificate far from expiry changes nothing
+    ("up", 0, True, True, 0.1, 11, Decision(KEEP, "up", 0)),
+])
+def test_precedence(status, attempts, up, reachable, response_time, ssl_days, expected):
+    assert decide(status, attempts, up, reachable, response_time, THRESHOLDS, ssl_days) == expected
+
+
+def test_going_down_takes_attempts_before_trigger_plus_one_failures():
+    status, attempts = "up", 0
+    actions = []
+    for _ in range(THRESHOLDS.attempts_before_trigger + 1):
+        decision = decide(status, attempts, False, False, 0.0, THRESHOLDS)
+        actions.append(decision.action)
+        status, attempts = decision.status, decision.attempt_count
+    assert actions == [ATTEMPT] * THRESHOLDS.attempts_before_trigger + [CHANGE]
+    assert status == "down"
+
+    # One good probe in between starts the count over
+    assert decide("up", 1, True, True, 0.1, THRESHOLDS) == Decision(KEEP, "up", 0)
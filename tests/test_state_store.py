@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import uuid
+import models.models as models
+from state_store import StateStore
+
+
+def add_log(db, site_id, status, created_at, last_scan_time):
+    db.add(models.RunnerSiteLog(
+        id=uuid.uuid4(),
+        site_id=site_id,
+        name=f"Site {site_id}",
+        status=status,
+        response_time=0.2,
+        attempt_count=0,
+        created_at=created_at,
+        last_scan_time=last_scan_time,
+        ssl_days_remaining=0
+    ))
+
+
+def test_load_empty_database(session_factory):
+    store = StateStore(session_factory)
+    with session_factory() as db:
+        store.load(db)
+    assert store.sites == {}
+
+
+def test_load_keeps_newest_row_per_site(session_factory):
+    now = datetime.now().replace(microsecond=0)
+    with session_factory() as db:
+        add_log(db, "a", "down", now - timedelta(hours=2), now - timedelta(hours=1))
+        add_log(db, "a", "up", now - timedelta(hours=1), now)
+        # Same last_scan_time as the row it replaced, the newer row wins
+        add_log(db, "b", "up", now - timedelta(hours=3), now)
+        add_log(db, "b", "slow", now, now)
+        db.commit()
+
+    store = StateStore(session_factory)
+    with session_factory() as db:
+        store.load(db)
+
+    assert set(store.sites) == {"a", "b"}
+    assert store.sites["a"].status == "up"
+    assert store.sites["a"].last_scan_time == now.timestamp()
+    assert store.sites["b"].status == "slow"
+
+
+def test_writes_round_trip(session_factory):
+    store = StateStore(session_factory)
+    store.start()
+    state = store.get("a", "Site a")
+    store.change_status(state, "up", 0.1, None)
+    store.close()
+
+    reloaded = StateStore(session_factory)
+    with session_factory() as db:
+        reloaded.load(db)
+    assert reloaded.sites["a"].status == "up"
+    assert reloaded.sites["a"].log_id == state.log_id
@@ -0,0 +1,47 @@
+import pytest
+from tag_query import evaluate, parse_tag_query
+
+INDEX = {
+    "prod": frozenset({"a", "b", "c"}),
+    "eu": frozenset({"a", "d"}),
+    "us": frozenset({"b"}),
+    "legacy": frozenset({"c"}),
+    "team a": frozenset({"d"}),
+}
+EVERYTHING = frozenset({"a", "b", "c", "d", "e"})
+
+
+def matches(text):
+    return set(evaluate(parse_tag_query(text), INDEX, EVERYTHING))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("prod", {"a", "b", "c"}),
+    ("prod and (eu or us)", {"a", "b"}),
+    ("prod & eu | us", {"a", "b"}),
+    ("prod eu", {"a"}),
+    ("eu, us", {"a", "b", "d"}),
+    ("prod and not legacy", {"a", "b"}),
+    ("!prod", {"d", "e"}),
+    ("not not prod", {"a", "b", "c"}),
+    ('"team a" or us', {"b", "d"}),
+    ("PROD AND EU", set()),
+    ("prod AND eu", {"a"}),
+    ("unknown", set()),
+])
+def test_expressions(text, expected):
+    assert matches(text) == expected
+
+
+def test_and_binds_tighter_than_or():
+    assert parse_tag_query("a or b and c") == ("or", [("tag", "a"), ("and", [("tag", "b"), ("tag", "c")])])
+
+
+def test_quoted_tags_unescape():
+    assert parse_tag_query(r'"say \"hi\""') == ("tag", 'say "hi"')
+
+
+@pytest.mark.parametrize("text", ["", "   ", "prod and", "(prod", "prod)", "or prod", "not", '"open', "prod ,, eu"])
+def test_malformed_expressions_raise(text):
+    with pytest.raises(ValueError):
+        parse_tag_query(text)
@@ -0,0 +1,170 @@
+from typing import Dict, Optional
+from bisect import bisect_right
+import os
+import struct
+import time
+from jsonlog import log
+
+UPTIME_PATH = "data/uptime.bin"
+UPTIME_MAGIC = b"SSMU"
+DEFAULT_SAMPLES = 1440
+
+# Each sample is one byte: the probe outcome in the high nibble and a
+# quantized response time in the low nibble
+OUTCOME_NONE = 0
+OUTCOME_UP = 1
+OUTCOME_SLOW = 2
+OUTCOME_DOWN = 3
+OUTCOMES = {
+    OUTCOME_NONE: "none",
+    OUTCOME_UP: "up",
+    OUTCOME_SLOW: "slow",
+    OUTCOME_DOWN: "down",
+}
+
+# Upper bounds (in ms) of latency buckets 0-14, bucket 15 is anything slower
+LATENCY_BUCKETS_MS = [25, 50, 75, 100, 150, 200, 300, 400, 500, 750, 1000, 1500, 2000, 3000, 5000]
+
+
+def encode_sample(outcome: int, response_time: float) -> int:
+    """Pack an outcome and a response time in seconds into a single byte."""
+    bucket = bisect_right(LATENCY_BUCKETS_MS, response_time * 1000)
+    return (outcome << 4) | bucket
+
+
+class UptimeRing:
+    """Fixed-size ring of packed samples for one site."""
+    __slots__ = ("samples", "head", "count")
+
+    def __init__(self, size: int):
+        self.samples = bytearray(size)
+        self.head = 0
+        self.count = 0
+
+    def append(self, sample: int) -> None:
+        self.samples[self.head] = sample
+        self.head = (self.head + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+
+    def ordered(self) -> bytes:
+        """Return the stored samples from oldest to newest."""
+        if self.count < len(self.samples):
+            return bytes(self.samples[:self.count])
+        return bytes(self.samples[self.head:] + self.samples[:self.head])
+
+
+def write_uptime(rings: Dict[str, bytes], size: int, path: str = UPTIME_PATH) -> None:
+    """Atomically write each site's ordered samples, keyed by site ID, to the uptime file."""
+    parts = [UPTIME_MAGIC, struct.pack("<HI", size, len(rings))]
+    for site_id, samples in rings.items():
+        encoded_id = site_id.encode("utf-8")
+        parts.append(struct.pack("<HH", len(encoded_id), len(samples)))
+        parts.append(encoded_id)
+        parts.append(samples)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b"".join(parts))
+    os.replace(tmp_path, path)
+
+
+def read_uptime(path: str = UPTIME_PATH) -> Dict[str, bytes]:
+    """Read the uptime file into a dict of site ID to ordered samples."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:4] != UPTIME_MAGIC:
+        raise ValueError("Not an uptime file")
+
+    _, site_count = struct.unpack_from("<HI", data, 4)
+    offset = 10
+    rings = {}
+    for _ in range(site_count):
+        id_length, sample_count = struct.unpack_from("<HH", data, offset)
+        offset += 4
+        site_id = data[offset:offset + id_length].decode("utf-8")
+        offset += id_length
+        rings[site_id] = data[offset:offset + sample_count]
+        offset += sample_count
+    return rings
+
+
+class UptimeRecorder:
+    """Runner-side ring buffers, persisted to the uptime file at most every few seconds.
+
+    With a sample log, every sample is also kept with its time and appended
+    to the log whenever the file is published.
+    """
+
+    def __init__(self, size: int = DEFAULT_SAMPLES, path: str = UPTIME_PATH, publish_interval: float = 10, sample_log=None):
+        self.size = size
+        self.path = path
+        self.publish_interval = publish_interval
+        self.sample_log = sample_log
+        self.rings: Dict[str, UptimeRing] = {}
+        self.dirty = False
+        self.last_published = 0.0
+
+    def load(self) -> None:
+        """Warm start from the last published file so restarts keep recent history."""
+        try:
+            stored = read_uptime(self.path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, struct.error) as e:
+            log.error("uptime_read_failed", error=str(e))
+            return
+
+        for site_id, samples in stored.items():
+            ring = UptimeRing(self.size)
+            for sample in samples[-self.size:]:
+                ring.append(sample)
+            self.rings[site_id] = ring
+
+    def record(self, site_id: str, outcome: int, response_time: float) -> None:
+        ring = self.rings.get(site_id)
+        if ring is None:
+            ring = UptimeRing(self.size)
+            self.rings[site_id] = ring
+        ring.append(encode_sample(outcome, response_time))
+        if self.sample_log is not None:
+            self.sample_log.record(site_id, outcome, response_time)
+        self.dirty = True
+
+    def publish(self, force: bool = False) -> None:
+        now = time.time()
+        if not self.dirty or (not force and now - self.last_published < self.publish_interval):
+            return
+        write_uptime({site_id: ring.ordered() for site_id, ring in self.rings.items()}, self.size, self.path)
+        if self.sample_log is not None:
+            self.sample_log.flush()
+        self.dirty = False
+        self.last_published = now
+
+
+class UptimeReader:
+    """Cached view of the uptime file, re-read only when the runner replaces it."""
+
+    def __init__(self, path: str = UPTIME_PATH):
+        self.path = path
+        self.rings: Dict[str, bytes] = {}
+        # Stat key of the file the rings were read from, doubles as their version
+        self.version: Optional[tuple] = None
+
+    def read(self) -> Dict[str, bytes]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.rings
+
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key != self.version:
+            try:
+                self.rings = read_uptime(self.path)
+                self.version = file_key
+            except (OSError, ValueError, struct.error) as e:
+                log.error("uptime_read_failed", error=str(e))
+        return self.rings
+
+
+uptime_reader = UptimeReader()